@@ -0,0 +1,167 @@
+from fastapi import APIRouter, Depends, HTTPException, UploadFile, File
+from fastapi.responses import StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select
+import asyncio
+import json
+from datetime import datetime, timezone
+from app.core.database import get_db, AsyncSessionLocal, BatchJob, BatchItem, Workspace, User
+from app.core.auth import get_current_user
+from app.core.config import settings
+from app.core.rate_limit import check_rate_limit
+from app.services.batch import parse_questions, create_job, start_job, cancel_job, FINISHED_STATUSES
+
+router = APIRouter()
+
+RESULTS_PAGE_SIZE = 500
+READ_CHUNK_BYTES = 64 * 1024
+
+
+def _job_dict(job: BatchJob) -> dict:
+    return {
+        "id": job.id,
+        "workspace_id": job.workspace_id,
+        "filename": job.filename,
+        "status": job.status,
+        "total": job.total,
+        "completed": job.completed,
+        "n_results": job.n_results,
+        "error_message": job.error_message,
+        "created_at": job.created_at,
+        "finished_at": job.finished_at,
+    }
+
+
+async def _read_capped(file: UploadFile) -> bytes:
+    """Read the upload in chunks, rejecting it as soon as it passes BATCH_MAX_FILE_MB."""
+    max_bytes = settings.BATCH_MAX_FILE_MB * 1024 * 1024
+    data = bytearray()
+    while chunk := await file.read(READ_CHUNK_BYTES):
+        data += chunk
+        if len(data) > max_bytes:
+            raise HTTPException(status_code=400, detail=f"File too large. Max {settings.BATCH_MAX_FILE_MB}MB")
+    return bytes(data)
+
+
+async def _get_job(db: AsyncSession, job_id: str, user: User) -> BatchJob:
+    job = await db.get(BatchJob, job_id)
+    if not job or job.user_id != user.id:
+        raise HTTPException(status_code=404, detail="Batch job not found")
+    return job
+
+
+@router.post("/{workspace_id}")
+async def submit_batch(
+    workspace_id: str,
+    file: UploadFile = File(...),
+    n_results: int = 5,
+    user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db),
+):
+    """Submit a file of questions (.txt, one per line, or .jsonl with "question"/"id")."""
+    await check_rate_limit(user.id)
+
+    ws = await db.get(Workspace, workspace_id)
+    if not ws or ws.user_id != user.id:
+        raise HTTPException(status_code=404, detail="Workspace not found")
+
+    data = await _read_capped(file)
+    try:
+        questions = parse_questions(data, file.filename or "")
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if not questions:
+        raise HTTPException(status_code=400, detail="No questions found in file")
+    if len(questions) > settings.BATCH_MAX_QUESTIONS:
+        raise HTTPException(status_code=400, detail=f"Too many questions. Max {settings.BATCH_MAX_QUESTIONS}")
+
+    job = await create_job(db, user.id, workspace_id, file.filename, questions, n_results)
+    start_job(job.id)
+    return _job_dict(job)
+
+
+@router.get("/jobs/{job_id}")
+async def get_batch_job(
+    job_id: str,
+    user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db),
+):
+    return _job_dict(await _get_job(db, job_id, user))
+
+
+@router.post("/jobs/{job_id}/cancel")
+async def cancel_batch_job(
+    job_id: str,
+    user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db),
+):
+    job = await _get_job(db, job_id, user)
+    if job.status in FINISHED_STATUSES:
+        raise HTTPException(status_code=400, detail=f"Job already {job.status}")
+    if not cancel_job(job_id):
+        # Not running in this process (e.g. queued before a restart)
+        job.status = "cancelled"
+        job.finished_at = datetime.now(timezone.utc)
+        await db.commit()
+    return {"cancelled": True}
+
+
+@router.get("/jobs/{job_id}/results")
+async def stream_batch_results(
+    job_id: str,
+    after: int = -1,
+    follow: bool = False,
+    user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db),
+):
+    """Stream answered questions as JSONL in question order.
+
+    `after` skips results up to that index, so a client can resume a broken
+    download. With `follow=true` the stream stays open until the job finishes.
+    """
+    await _get_job(db, job_id, user)
+
+    async def generate():
+        last_idx = after
+        while True:
+            async with AsyncSessionLocal() as session:
+                # Read the status first: once it is finished, every answer is committed
+                job = await session.get(BatchJob, job_id)
+                finished = job is None or job.status in FINISHED_STATUSES
+                result = await session.execute(
+                    select(BatchItem)
+                    .where(
+                        BatchItem.job_id == job_id,
+                        BatchItem.idx > last_idx,
+                        (BatchItem.answer.is_not(None)) | (BatchItem.error.is_not(None)),
+                    )
+                    .order_by(BatchItem.idx)
+                    .limit(RESULTS_PAGE_SIZE)
+                )
+                items = result.scalars().all()
+
+            emitted = 0
+            for item in items:
+                # Answers arrive out of order; while following, stop at the
+                # first gap so the cursor never skips a pending question
+                if follow and not finished and item.idx != last_idx + 1:
+                    break
+                last_idx = item.idx
+                emitted += 1
+                yield json.dumps({
+                    "idx": item.idx,
+                    "id": item.external_id,
+                    "question": item.question,
+                    "answer": item.answer,
+                    "sources": json.loads(item.sources) if item.sources else [],
+                    "error": item.error,
+                    "duration_ms": item.duration_ms,
+                }) + "\n"
+
+            if not follow or finished:
+                if len(items) < RESULTS_PAGE_SIZE:
+                    return
+            elif emitted < RESULTS_PAGE_SIZE:
+                await asyncio.sleep(1)
+
+    return StreamingResponse(generate(), media_type="application/x-ndjson")
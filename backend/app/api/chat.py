@@ -1,28 +1,136 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Response
+from fastapi.responses import StreamingResponse
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, func
-from pydantic import BaseModel
+from sqlalchemy import select, func, update
+from pydantic import BaseModel, Field
+from typing import Optional
+from datetime import datetime
+import json
 import time
-from app.core.database import get_db, QueryLog, Workspace, User
+from app.core.database import get_db, AsyncSessionLocal, QueryLog, Workspace, Document, User
 from app.core.auth import get_current_user
 from app.core.rate_limit import check_rate_limit
-from app.services.rag import run_rag
+from app.core.pagination import clamp_limit, paginate_newest_first, page_rows
+from app.core.tracing import trace, query_attrs
+from app.core.config import settings
+from app.services.rag import run_rag, run_federated_rag
+from app.services.singleflight import flight_key, join, run_coalesced
+from app.services.vector_gc import backfill_filter_metadata
+from app.services.vector_store import build_where
 
 router = APIRouter()
 
 
+class QueryFilters(BaseModel):
+    doc_ids: Optional[list[str]] = None
+    file_types: Optional[list[str]] = None
+    uploaded_after: Optional[datetime] = None
+    uploaded_before: Optional[datetime] = None
+    # Glob pattern matched case-insensitively against filenames, e.g. "*contract*2025*"
+    filename: Optional[str] = None
+
+
 class QueryRequest(BaseModel):
     query: str
     n_results: int = 5
+    filters: Optional[QueryFilters] = None
 
 
-@router.post("/{workspace_id}")
-async def query_workspace(
-    workspace_id: str,
-    req: QueryRequest,
+class FederatedQueryRequest(QueryRequest):
+    workspace_ids: list[str] = Field(..., min_length=1)
+
+
+def _glob_to_like(pattern: str) -> str:
+    escaped = pattern.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    return escaped.replace("*", "%").replace("?", "_")
+
+
+async def resolve_filters(db: AsyncSession, workspace_id: str, filters: Optional[QueryFilters]) -> Optional[dict]:
+    """Build the vector-store where clause for a request's filters.
+
+    Filename patterns are resolved to document ids against the SQL catalog,
+    then pushed down alongside the other filters as a single pre-filter.
+    """
+    if filters is None:
+        return None
+    if filters.file_types or filters.uploaded_after or filters.uploaded_before:
+        ws = await db.get(Workspace, workspace_id)
+        if ws is not None and not ws.filters_backfilled:
+            # Chunks stored before these fields existed would never match
+            await backfill_filter_metadata(workspace_id)
+    doc_ids = filters.doc_ids
+    if filters.filename:
+        result = await db.execute(
+            select(Document.id).where(
+                Document.workspace_id == workspace_id,
+                Document.filename.like(_glob_to_like(filters.filename), escape="\\"),
+            )
+        )
+        matched = set(result.scalars().all())
+        doc_ids = list(matched & set(doc_ids) if doc_ids is not None else matched)
+    return build_where(
+        doc_ids=doc_ids,
+        file_types=filters.file_types,
+        created_after=filters.uploaded_after,
+        created_before=filters.uploaded_before,
+    )
+
+
+@router.post("/federated")
+async def query_workspaces(
+    req: FederatedQueryRequest,
     user: User = Depends(get_current_user),
     db: AsyncSession = Depends(get_db),
 ):
+    """Ask one question across several workspaces with a single LLM call.
+
+    The query is logged under the first workspace in the list.
+    """
+    await check_rate_limit(user.id)
+
+    workspace_ids = list(dict.fromkeys(req.workspace_ids))
+    if len(workspace_ids) > settings.FEDERATED_MAX_WORKSPACES:
+        raise HTTPException(
+            status_code=400,
+            detail=f"At most {settings.FEDERATED_MAX_WORKSPACES} workspaces per query",
+        )
+    result = await db.execute(
+        select(Workspace.id).where(Workspace.id.in_(workspace_ids), Workspace.user_id == user.id)
+    )
+    if len(set(result.scalars().all())) != len(workspace_ids):
+        raise HTTPException(status_code=404, detail="Workspace not found")
+
+    if not req.query.strip():
+        raise HTTPException(status_code=400, detail="Query cannot be empty")
+
+    with trace("chat_federated", workspace_ids=workspace_ids, **query_attrs(req.query)) as t:
+        where = {ws: await resolve_filters(db, ws, req.filters) for ws in workspace_ids}
+        result = await run_federated_rag(workspace_ids, req.query, n_results=req.n_results, where=where)
+    duration_ms = t.duration_ms
+
+    log = QueryLog(
+        user_id=user.id,
+        workspace_id=workspace_ids[0],
+        query=req.query,
+        answer=result["answer"],
+        sources_count=len(result["sources"]),
+        duration_ms=round(duration_ms, 2),
+    )
+    db.add(log)
+    user.total_queries += 1
+    await db.commit()
+
+    return {
+        "answer": result["answer"],
+        "sources": result["sources"],
+        "skipped": result["skipped"],
+        "duration_ms": round(duration_ms, 2),
+        "queue_ms": result.get("queue_ms"),
+        "generation_ms": result.get("generation_ms"),
+    }
+
+
+async def _check_chat_request(db: AsyncSession, workspace_id: str, req: QueryRequest, user: User):
     await check_rate_limit(user.id)
 
     ws = await db.get(Workspace, workspace_id)
@@ -32,9 +140,32 @@ async def query_workspace(
     if not req.query.strip():
         raise HTTPException(status_code=400, detail="Query cannot be empty")
 
-    start = time.time()
-    result = await run_rag(workspace_id, req.query, n_results=req.n_results)
-    duration_ms = (time.time() - start) * 1000
+
+def _rag_executor(workspace_id: str, req: QueryRequest, where: Optional[dict]):
+    def execute(flight):
+        return run_rag(
+            workspace_id, req.query, n_results=req.n_results, where=where,
+            on_event=flight.publish, stream=flight.stream,
+        )
+    return execute
+
+
+@router.post("/{workspace_id}")
+async def query_workspace(
+    workspace_id: str,
+    req: QueryRequest,
+    user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db),
+):
+    """Answer a question. Identical concurrent questions share one execution."""
+    await _check_chat_request(db, workspace_id, req, user)
+
+    with trace("chat", workspace_id=workspace_id, **query_attrs(req.query)) as t:
+        where = await resolve_filters(db, workspace_id, req.filters)
+        key = flight_key(workspace_id, req.query, req.n_results, where)
+        result, coalesced = await run_coalesced(key, _rag_executor(workspace_id, req, where))
+        t.attrs["coalesced"] = coalesced
+    duration_ms = t.duration_ms
 
     # Log query
     log = QueryLog(
@@ -53,13 +184,76 @@ async def query_workspace(
         "answer": result["answer"],
         "sources": result["sources"],
         "duration_ms": round(duration_ms, 2),
+        "queue_ms": result.get("queue_ms"),
+        "generation_ms": result.get("generation_ms"),
+        "coalesced": coalesced,
     }
 
 
+@router.post("/{workspace_id}/stream")
+async def stream_query_workspace(
+    workspace_id: str,
+    req: QueryRequest,
+    user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db),
+):
+    """Answer a question as a JSONL event stream.
+
+    Events are {"type": "sources"}, then "token" pieces of the answer, then
+    "done" (or "error"). A caller that joins an identical in-flight question
+    receives the events already sent, then follows along live.
+    """
+    await _check_chat_request(db, workspace_id, req, user)
+    start = time.perf_counter()
+    where = await resolve_filters(db, workspace_id, req.filters)
+    key = flight_key(workspace_id, req.query, req.n_results, where)
+    flight, coalesced = join(key, _rag_executor(workspace_id, req, where), stream=True)
+    queue = flight.subscribe()
+    user_id = user.id
+
+    async def generate():
+        try:
+            while True:
+                event = await queue.get()
+                if event["type"] == "done":
+                    duration_ms = round((time.perf_counter() - start) * 1000, 2)
+                    # The request's session is closed once streaming starts
+                    async with AsyncSessionLocal() as session:
+                        session.add(QueryLog(
+                            user_id=user_id,
+                            workspace_id=workspace_id,
+                            query=req.query,
+                            answer=event["answer"],
+                            sources_count=len(event["sources"]),
+                            duration_ms=duration_ms,
+                        ))
+                        await session.execute(
+                            update(User).where(User.id == user_id).values(total_queries=User.total_queries + 1)
+                        )
+                        await session.commit()
+                    event = {
+                        "type": "done",
+                        "answer": event["answer"],
+                        "duration_ms": duration_ms,
+                        "queue_ms": event["queue_ms"],
+                        "generation_ms": event["generation_ms"],
+                        "coalesced": coalesced,
+                    }
+                yield json.dumps(event) + "\n"
+                if event["type"] in ("done", "error"):
+                    return
+        finally:
+            flight.unsubscribe(queue)
+
+    return StreamingResponse(generate(), media_type="application/x-ndjson")
+
+
 @router.get("/{workspace_id}/history")
 async def get_history(
     workspace_id: str,
+    response: Response,
     limit: int = 20,
+    cursor: Optional[str] = None,
     user: User = Depends(get_current_user),
     db: AsyncSession = Depends(get_db),
 ):
@@ -67,13 +261,14 @@ async def get_history(
     if not ws or ws.user_id != user.id:
         raise HTTPException(status_code=404, detail="Workspace not found")
 
+    limit = clamp_limit(limit)
     result = await db.execute(
-        select(QueryLog)
-        .where(QueryLog.workspace_id == workspace_id)
-        .order_by(QueryLog.created_at.desc())
-        .limit(limit)
+        paginate_newest_first(
+            select(QueryLog).where(QueryLog.workspace_id == workspace_id),
+            QueryLog, cursor, limit,
+        )
     )
-    logs = result.scalars().all()
+    logs = page_rows(result.scalars().all(), limit, response)
     return [
         {
             "id": l.id,
@@ -1,85 +1,127 @@
-from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, BackgroundTasks
+from fastapi import APIRouter, Depends, HTTPException, BackgroundTasks, Request, Response
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select
+from sqlalchemy import select, update, func
+from pathlib import Path
+from typing import Optional
 from app.core.database import get_db, Document, Workspace, User
 from app.core.auth import get_current_user
 from app.core.config import settings
+from app.core.pagination import clamp_limit, paginate_newest_first, page_rows
+from app.core.metrics import INGEST_IN_FLIGHT, DOCUMENTS_INGESTED, CHUNKS_INGESTED
+from app.core.tracing import trace, span
 from app.services.document_processor import process_document
-from app.services.vector_store import add_documents, delete_document_chunks
+from app.services.vector_store import add_documents, delete_document_chunks, hnsw_metadata
+from app.services.upload_spool import spool_upload, discard, file_extension
+import asyncio
 import logging
 
 logger = logging.getLogger(__name__)
 router = APIRouter()
 
 
-async def _process_and_embed(doc_id: str, file_bytes: bytes, file_type: str, workspace_id: str, filename: str):
-    """Background task: process document and add to vector store."""
+async def _process_and_embed(doc_id: str, spool_path: Path, file_type: str, workspace_id: str, filename: str):
+    """Background task: process a spooled upload, add it to the vector store, remove the spool file."""
     from app.core.database import AsyncSessionLocal
-    async with AsyncSessionLocal() as db:
-        try:
-            chunks = process_document(file_bytes, file_type)
-            add_documents(workspace_id, chunks, doc_id, filename)
-
-            doc = await db.get(Document, doc_id)
-            if doc:
-                doc.status = "ready"
-                doc.chunk_count = len(chunks)
-                await db.commit()
-        except Exception as e:
-            logger.error(f"Document processing error: {e}")
-            doc = await db.get(Document, doc_id)
-            if doc:
-                doc.status = "error"
-                doc.error_message = str(e)
-                await db.commit()
-
-
-@router.post("/{workspace_id}/upload")
+    with INGEST_IN_FLIGHT.track_inprogress(), trace("ingest", doc_id=doc_id, workspace_id=workspace_id):
+        async with AsyncSessionLocal() as db:
+            try:
+                with span("extract_chunks"):
+                    chunks = process_document(spool_path, file_type)
+                ws = await db.get(Workspace, workspace_id)
+                params = hnsw_metadata(ws.hnsw_m, ws.hnsw_ef_construction, ws.hnsw_ef_search) if ws else None
+                doc = await db.get(Document, doc_id)
+                # Off the event loop: it embeds, and waits out any rebuild of the workspace
+                await asyncio.to_thread(
+                    add_documents,
+                    workspace_id, chunks, doc_id, filename,
+                    hnsw_params=params,
+                    file_type=file_type,
+                    created_at=doc.created_at if doc else None,
+                )
+
+                if doc:
+                    doc.status = "ready"
+                    doc.chunk_count = len(chunks)
+                    await db.commit()
+                DOCUMENTS_INGESTED.labels("ready").inc()
+                CHUNKS_INGESTED.inc(len(chunks))
+            except Exception as e:
+                logger.error(f"Document processing error: {e}")
+                DOCUMENTS_INGESTED.labels("error").inc()
+                doc = await db.get(Document, doc_id)
+                if doc:
+                    doc.status = "error"
+                    doc.error_message = str(e)
+                    await db.commit()
+            finally:
+                discard(spool_path)
+
+
+# The body is parsed by spool_upload rather than FastAPI, so describe it for the docs
+_UPLOAD_BODY = {
+    "requestBody": {
+        "required": True,
+        "content": {
+            "multipart/form-data": {
+                "schema": {
+                    "type": "object",
+                    "properties": {"file": {"type": "string", "format": "binary"}},
+                    "required": ["file"],
+                }
+            }
+        },
+    }
+}
+
+
+@router.post("/{workspace_id}/upload", openapi_extra=_UPLOAD_BODY)
 async def upload_document(
     workspace_id: str,
+    request: Request,
     background_tasks: BackgroundTasks,
-    file: UploadFile = File(...),
     user: User = Depends(get_current_user),
     db: AsyncSession = Depends(get_db),
 ):
-    # Verify workspace ownership
+    # Verify workspace ownership before reading the body
     ws = await db.get(Workspace, workspace_id)
     if not ws or ws.user_id != user.id:
         raise HTTPException(status_code=404, detail="Workspace not found")
 
-    # Validate file
-    ext = file.filename.rsplit(".", 1)[-1].lower() if "." in file.filename else ""
-    if ext not in settings.ALLOWED_EXTENSIONS:
-        raise HTTPException(status_code=400, detail=f"File type .{ext} not allowed. Allowed: {settings.ALLOWED_EXTENSIONS}")
-
-    file_bytes = await file.read()
-    if len(file_bytes) > settings.MAX_FILE_SIZE_MB * 1024 * 1024:
-        raise HTTPException(status_code=400, detail=f"File too large. Max {settings.MAX_FILE_SIZE_MB}MB")
-
-    # Save document record
-    doc = Document(
-        workspace_id=workspace_id,
-        user_id=user.id,
-        filename=file.filename,
-        file_type=ext,
-        file_size=len(file_bytes),
-        status="processing",
-    )
-    db.add(doc)
-
-    # Update user stats
-    user.total_docs += 1
-    await db.commit()
-    await db.refresh(doc)
-
-    # Process in background
+    # Stream to disk; type and size are validated as the upload arrives
+    upload = await spool_upload(request, "file", settings.ALLOWED_EXTENSIONS)
+    ext = file_extension(upload.filename)
+
+    try:
+        # Save document record
+        doc = Document(
+            workspace_id=workspace_id,
+            user_id=user.id,
+            filename=upload.filename,
+            file_type=ext,
+            file_size=upload.size,
+            content_hash=upload.sha256,
+            status="processing",
+        )
+        db.add(doc)
+
+        # Update user stats
+        user.total_docs += 1
+        await db.commit()
+        await db.refresh(doc)
+    except BaseException:
+        discard(upload.path)
+        raise
+
+    # Process in background; the task removes the spool file
     background_tasks.add_task(
-        _process_and_embed, doc.id, file_bytes, ext, workspace_id, file.filename
+        _process_and_embed, doc.id, upload.path, ext, workspace_id, upload.filename
     )
 
     return {
         "id": doc.id,
         "filename": doc.filename,
+        "file_size": doc.file_size,
+        "content_hash": doc.content_hash,
         "status": doc.status,
         "created_at": doc.created_at,
     }
@@ -88,6 +130,9 @@ async def upload_document(
 @router.get("/{workspace_id}")
 async def list_documents(
     workspace_id: str,
+    response: Response,
+    limit: Optional[int] = None,
+    cursor: Optional[str] = None,
     user: User = Depends(get_current_user),
     db: AsyncSession = Depends(get_db),
 ):
@@ -95,18 +140,23 @@ async def list_documents(
     if not ws or ws.user_id != user.id:
         raise HTTPException(status_code=404, detail="Workspace not found")
 
+    # Without limit or cursor the whole list is returned, as the UI expects
+    if limit is not None or cursor:
+        limit = clamp_limit(limit)
     result = await db.execute(
-        select(Document)
-        .where(Document.workspace_id == workspace_id)
-        .order_by(Document.created_at.desc())
+        paginate_newest_first(
+            select(Document).where(Document.workspace_id == workspace_id),
+            Document, cursor, limit,
+        )
     )
-    docs = result.scalars().all()
+    docs = page_rows(result.scalars().all(), limit, response)
     return [
         {
             "id": d.id,
             "filename": d.filename,
             "file_type": d.file_type,
             "file_size": d.file_size,
+            "content_hash": d.content_hash,
             "chunk_count": d.chunk_count,
             "status": d.status,
             "error_message": d.error_message,
@@ -127,7 +177,12 @@ async def delete_document(
     if not doc or doc.user_id != user.id:
         raise HTTPException(status_code=404, detail="Document not found")
 
-    delete_document_chunks(workspace_id, doc_id)
+    deleted = await asyncio.to_thread(delete_document_chunks, doc.workspace_id, doc_id)
+    await db.execute(
+        update(Workspace)
+        .where(Workspace.id == doc.workspace_id)
+        .values(deleted_chunks=func.coalesce(Workspace.deleted_chunks, 0) + deleted)
+    )
     await db.delete(doc)
     await db.commit()
     return {"deleted": True}
@@ -14,7 +14,7 @@ async def get_stats(
 ):
     # Total workspaces
     ws_result = await db.execute(
-        select(func.count(Workspace.id)).where(Workspace.user_id == user.id)
+        select(func.count(Workspace.id)).where(Workspace.user_id == user.id, Workspace.status.is_(None))
     )
     total_workspaces = ws_result.scalar() or 0
 
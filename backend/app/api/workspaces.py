@@ -1,12 +1,21 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, BackgroundTasks, Request
+from fastapi.responses import StreamingResponse
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, func
-from pydantic import BaseModel
+from sqlalchemy import select, func, delete, update
+from pydantic import BaseModel, Field
 from typing import Optional
+import asyncio
 import uuid
 from app.core.database import get_db, Workspace, Document, User
 from app.core.auth import get_current_user
-from app.services.vector_store import get_workspace_doc_count
+from app.services.vector_store import (
+    get_workspace_doc_count,
+    drop_collection,
+    hnsw_metadata,
+    rebuild_collection,
+    search_backend,
+)
+from app.services.snapshot import export_snapshot, import_snapshot
 
 router = APIRouter()
 
@@ -16,6 +25,21 @@ class WorkspaceCreate(BaseModel):
     description: Optional[str] = None
 
 
+class IndexParams(BaseModel):
+    m: Optional[int] = Field(None, ge=4, le=64)
+    ef_construction: Optional[int] = Field(None, ge=10, le=1000)
+    ef_search: Optional[int] = Field(None, ge=1, le=1000)
+
+
+def _index_params(ws: Workspace) -> dict:
+    meta = hnsw_metadata(ws.hnsw_m, ws.hnsw_ef_construction, ws.hnsw_ef_search)
+    return {
+        "m": meta["hnsw:M"],
+        "ef_construction": meta["hnsw:construction_ef"],
+        "ef_search": meta["hnsw:search_ef"],
+    }
+
+
 @router.post("/")
 async def create_workspace(
     req: WorkspaceCreate,
@@ -40,7 +64,7 @@ async def list_workspaces(
 ):
     result = await db.execute(
         select(Workspace)
-        .where(Workspace.user_id == user.id)
+        .where(Workspace.user_id == user.id, Workspace.status.is_(None))
         .order_by(Workspace.created_at.desc())
     )
     workspaces = result.scalars().all()
@@ -64,6 +88,57 @@ async def list_workspaces(
     return out
 
 
+# The archive is read from the raw request body, so describe it for the docs
+_SNAPSHOT_BODY = {
+    "requestBody": {
+        "required": True,
+        "content": {"application/gzip": {"schema": {"type": "string", "format": "binary"}}},
+    }
+}
+
+
+@router.post("/import", openapi_extra=_SNAPSHOT_BODY)
+async def import_workspace(
+    request: Request,
+    name: Optional[str] = None,
+    user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db),
+):
+    """Create a workspace from a snapshot archive without re-embedding anything."""
+    ws, doc_count, chunk_count = await import_snapshot(request.stream(), user, db, name)
+    return {
+        "id": ws.id,
+        "name": ws.name,
+        "description": ws.description,
+        "doc_count": doc_count,
+        "chunk_count": chunk_count,
+        "created_at": ws.created_at,
+    }
+
+
+@router.get("/{workspace_id}/snapshot")
+async def export_workspace(
+    workspace_id: str,
+    user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db),
+):
+    """Stream the workspace's ready documents, chunks and embeddings as one archive."""
+    ws = await db.get(Workspace, workspace_id)
+    if not ws or ws.user_id != user.id:
+        raise HTTPException(status_code=404, detail="Workspace not found")
+    result = await db.execute(
+        select(Document)
+        .where(Document.workspace_id == workspace_id, Document.status == "ready")
+        .order_by(Document.created_at)
+    )
+    documents = result.scalars().all()
+    return StreamingResponse(
+        export_snapshot(ws, list(documents)),
+        media_type="application/gzip",
+        headers={"Content-Disposition": f'attachment; filename="workspace-{workspace_id}.snapshot.gz"'},
+    )
+
+
 @router.delete("/{workspace_id}")
 async def delete_workspace(
     workspace_id: str,
@@ -73,6 +148,86 @@ async def delete_workspace(
     ws = await db.get(Workspace, workspace_id)
     if not ws or ws.user_id != user.id:
         raise HTTPException(status_code=404, detail="Workspace not found")
+    await db.execute(delete(Document).where(Document.workspace_id == workspace_id))
     await db.delete(ws)
     await db.commit()
+    await asyncio.to_thread(drop_collection, workspace_id)
     return {"deleted": True}
+
+
+@router.get("/{workspace_id}/index")
+async def get_index_params(
+    workspace_id: str,
+    user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db),
+):
+    ws = await db.get(Workspace, workspace_id)
+    if not ws or ws.user_id != user.id:
+        raise HTTPException(status_code=404, detail="Workspace not found")
+    return {
+        **_index_params(ws),
+        "chunk_count": get_workspace_doc_count(workspace_id),
+        "search_backend": search_backend(workspace_id),
+    }
+
+
+@router.put("/{workspace_id}/index")
+async def update_index_params(
+    workspace_id: str,
+    req: IndexParams,
+    background_tasks: BackgroundTasks,
+    user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db),
+):
+    """Tune HNSW recall/latency for one workspace.
+
+    The collection is rebuilt from its stored embeddings in the background so
+    the new parameters take effect; nothing is re-embedded.
+    """
+    ws = await db.get(Workspace, workspace_id)
+    if not ws or ws.user_id != user.id:
+        raise HTTPException(status_code=404, detail="Workspace not found")
+
+    ws.hnsw_m = req.m
+    ws.hnsw_ef_construction = req.ef_construction
+    ws.hnsw_ef_search = req.ef_search
+    await db.commit()
+
+    rebuild = get_workspace_doc_count(workspace_id) > 0
+    if rebuild:
+        background_tasks.add_task(_rebuild_index, workspace_id)
+    return {**_index_params(ws), "rebuild_scheduled": rebuild}
+
+
+@router.post("/{workspace_id}/compact")
+async def compact_index(
+    workspace_id: str,
+    background_tasks: BackgroundTasks,
+    user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db),
+):
+    """Rebuild the workspace index to drop tombstones left by deleted documents."""
+    ws = await db.get(Workspace, workspace_id)
+    if not ws or ws.user_id != user.id:
+        raise HTTPException(status_code=404, detail="Workspace not found")
+    background_tasks.add_task(_rebuild_index, workspace_id)
+    return {"compaction_scheduled": True, "deleted_chunks": ws.deleted_chunks or 0}
+
+
+async def _rebuild_index(workspace_id: str):
+    """Background task: rebuild with the workspace's current params and reset its tombstone count."""
+    from app.core.database import AsyncSessionLocal
+    async with AsyncSessionLocal() as db:
+        ws = await db.get(Workspace, workspace_id)
+        if not ws:
+            return
+        metadata = hnsw_metadata(ws.hnsw_m, ws.hnsw_ef_construction, ws.hnsw_ef_search)
+        tombstones = ws.deleted_chunks or 0
+        await asyncio.to_thread(rebuild_collection, workspace_id, metadata)
+        # Deletes counted while the rebuild ran still need a future compaction
+        await db.execute(
+            update(Workspace)
+            .where(Workspace.id == workspace_id)
+            .values(deleted_chunks=Workspace.deleted_chunks - tombstones)
+        )
+        await db.commit()
@@ -6,6 +6,17 @@ class Settings(BaseSettings):
     # Database
     DATABASE_URL: str = "sqlite+aiosqlite:///./rag_platform.db"
 
+    # SQLite tuning (applied per connection, ignored for other databases)
+    SQLITE_WAL: bool = True
+    SQLITE_SYNCHRONOUS: str = "NORMAL"  # OFF | NORMAL | FULL
+    SQLITE_BUSY_TIMEOUT_MS: int = 5000
+    SQLITE_CACHE_SIZE_KB: int = 20000
+    SQLITE_MMAP_SIZE_MB: int = 256
+
+    # Pagination
+    DEFAULT_PAGE_SIZE: int = 50
+    MAX_PAGE_SIZE: int = 200
+
     # JWT
     SECRET_KEY: str = "change-me-in-production-use-a-long-random-string"
     ALGORITHM: str = "HS256"
@@ -13,6 +24,22 @@ class Settings(BaseSettings):
 
     # ChromaDB
     CHROMA_PERSIST_DIR: str = "./chroma_db"
+    # Default HNSW parameters; workspaces can override them individually
+    HNSW_M: int = 16
+    HNSW_EF_CONSTRUCTION: int = 100
+    HNSW_EF_SEARCH: int = 10
+    # Search backend: "auto" searches small workspaces with the in-process
+    # NumPy index and large ones with Chroma; "chroma" or "numpy" forces one
+    VECTOR_SEARCH_BACKEND: str = "auto"
+    NATIVE_INDEX_MAX_CHUNKS: int = 20000
+    NATIVE_IVF_MIN_CHUNKS: int = 5000  # below this, native search is exact brute force
+    NATIVE_IVF_NPROBE: int = 8
+    NATIVE_INDEX_CACHE_MB: int = 512
+
+    # Vector-store GC / compaction
+    GC_INTERVAL_MINUTES: int = 0  # 0 disables the scheduled run
+    GC_COMPACT_RATIO: float = 0.2  # rebuild when deleted / (live + deleted) exceeds this
+    GC_COMPACT_MIN_DELETED: int = 500
 
     # Embeddings
     EMBEDDING_MODEL: str = "all-MiniLM-L6-v2"
@@ -24,10 +51,46 @@ class Settings(BaseSettings):
     # File upload
     MAX_FILE_SIZE_MB: int = 20
     ALLOWED_EXTENSIONS: list = ["pdf", "txt", "md", "docx"]
+    # Uploads are streamed here and removed once processed
+    UPLOAD_SPOOL_DIR: str = "./upload_spool"
+    UPLOAD_SPOOL_CHUNK_KB: int = 1024
+
+    # Workspace snapshots (export/import)
+    SNAPSHOT_MAX_MB: int = 4096  # uncompressed size limit for an imported archive
+    SNAPSHOT_COMPRESS_LEVEL: int = 6
+
+    # Federated (multi-workspace) search
+    FEDERATED_MAX_WORKSPACES: int = 10
+    FEDERATED_MAX_CONCURRENCY: int = 4
+    FEDERATED_TIMEOUT_SECONDS: float = 5.0
+
+    # Share one execution between identical concurrent chat queries
+    SINGLE_FLIGHT_ENABLED: bool = True
+
+    # Batch question jobs
+    BATCH_MAX_QUESTIONS: int = 20000
+    BATCH_MAX_FILE_MB: int = 10
+    BATCH_EMBED_SIZE: int = 256  # questions embedded and searched per window
+    BATCH_LLM_CONCURRENCY: int = 8
 
     # LLM - using Groq (free)
     GROQ_API_KEY: str = ""
     GROQ_MODEL: str = "llama-3.3-70b-versatile"
+    # Any OpenAI-compatible endpoint works (e.g. the benchmark stub)
+    LLM_BASE_URL: str = "https://api.groq.com/openai/v1"
+    LLM_TIMEOUT_SECONDS: float = 30
+    # Admission control: concurrent completions, queue bound and how long
+    # interactive requests may wait for a slot before failing with 503
+    LLM_MAX_IN_FLIGHT: int = 8
+    LLM_QUEUE_SIZE: int = 64
+    LLM_QUEUE_DEADLINE_SECONDS: float = 10.0
+    LLM_BREAKER_FAILURES: int = 5  # consecutive failures that open the circuit
+    LLM_BREAKER_COOLDOWN_SECONDS: float = 30.0
+
+    # Observability
+    METRICS_ENABLED: bool = True
+    SLOW_QUERY_MS: float = 0  # log per-stage breakdown above this; 0 disables
+    SLOW_QUERY_LOG_TEXT: bool = False  # include (truncated) query text in slow-query logs
 
     APP_ENV: str = "development"
 
@@ -1,9 +1,10 @@
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession, async_sessionmaker
 from sqlalchemy.orm import DeclarativeBase
-from sqlalchemy import Column, String, DateTime, Integer, Boolean, Text, Float
+from sqlalchemy import Column, String, DateTime, Integer, Boolean, Text, Float, Index, event, inspect, text
 from datetime import datetime, timezone
 import uuid
 from app.core.config import settings
+from app.core.metrics import DB_CONNECTIONS_IN_USE
 
 
 class Base(DeclarativeBase):
@@ -30,6 +31,16 @@ class Workspace(Base):
     name = Column(String, nullable=False)
     description = Column(Text, nullable=True)
     created_at = Column(DateTime, default=lambda: datetime.now(timezone.utc))
+    # Per-workspace HNSW overrides; NULL means use the global default
+    hnsw_m = Column(Integer, nullable=True)
+    hnsw_ef_construction = Column(Integer, nullable=True)
+    hnsw_ef_search = Column(Integer, nullable=True)
+    # Chunks deleted since the index was last rebuilt (HNSW keeps tombstones)
+    deleted_chunks = Column(Integer, default=0)
+    # "importing" while a snapshot import is loading; NULL once the workspace is usable
+    status = Column(String, nullable=True)
+    # NULL on rows that predate filter metadata until their chunks are backfilled
+    filters_backfilled = Column(Boolean, default=True)
 
 
 class Document(Base):
@@ -40,11 +51,16 @@ class Document(Base):
     filename = Column(String, nullable=False)
     file_type = Column(String, nullable=False)
     file_size = Column(Integer, nullable=True)
+    content_hash = Column(String, nullable=True)  # SHA-256 of the uploaded bytes
     chunk_count = Column(Integer, default=0)
     status = Column(String, default="processing")  # processing | ready | error
     error_message = Column(Text, nullable=True)
     created_at = Column(DateTime, default=lambda: datetime.now(timezone.utc))
 
+    __table_args__ = (
+        Index("ix_documents_workspace_created", "workspace_id", "created_at"),
+    )
+
 
 class QueryLog(Base):
     __tablename__ = "query_logs"
@@ -57,14 +73,91 @@ class QueryLog(Base):
     duration_ms = Column(Float, nullable=True)
     created_at = Column(DateTime, default=lambda: datetime.now(timezone.utc))
 
+    __table_args__ = (
+        Index("ix_query_logs_workspace_created", "workspace_id", "created_at"),
+        Index("ix_query_logs_user_created", "user_id", "created_at"),
+    )
+
+
+class BatchJob(Base):
+    __tablename__ = "batch_jobs"
+    id = Column(String, primary_key=True, default=lambda: str(uuid.uuid4()))
+    user_id = Column(String, nullable=False, index=True)
+    workspace_id = Column(String, nullable=False, index=True)
+    filename = Column(String, nullable=True)
+    n_results = Column(Integer, default=5)
+    status = Column(String, default="queued")  # queued | running | completed | failed | cancelled
+    total = Column(Integer, default=0)
+    completed = Column(Integer, default=0)
+    error_message = Column(Text, nullable=True)
+    created_at = Column(DateTime, default=lambda: datetime.now(timezone.utc))
+    finished_at = Column(DateTime, nullable=True)
+
+
+class BatchItem(Base):
+    __tablename__ = "batch_items"
+    job_id = Column(String, primary_key=True)
+    idx = Column(Integer, primary_key=True)
+    external_id = Column(String, nullable=True)
+    question = Column(Text, nullable=False)
+    answer = Column(Text, nullable=True)  # NULL until answered; used to resume
+    sources = Column(Text, nullable=True)  # JSON
+    error = Column(Text, nullable=True)
+    duration_ms = Column(Float, nullable=True)
+
 
 engine = create_async_engine(settings.DATABASE_URL, echo=False)
 AsyncSessionLocal = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
 
 
+@event.listens_for(engine.sync_engine, "checkout")
+def _on_checkout(dbapi_connection, connection_record, connection_proxy):
+    DB_CONNECTIONS_IN_USE.inc()
+
+
+@event.listens_for(engine.sync_engine, "checkin")
+def _on_checkin(dbapi_connection, connection_record):
+    DB_CONNECTIONS_IN_USE.dec()
+
+
+if engine.dialect.name == "sqlite":
+    @event.listens_for(engine.sync_engine, "connect")
+    def _set_sqlite_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        if settings.SQLITE_WAL:
+            cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute(f"PRAGMA synchronous={settings.SQLITE_SYNCHRONOUS}")
+        cursor.execute(f"PRAGMA busy_timeout={int(settings.SQLITE_BUSY_TIMEOUT_MS)}")
+        # Negative cache_size is in KiB rather than pages
+        cursor.execute(f"PRAGMA cache_size=-{int(settings.SQLITE_CACHE_SIZE_KB)}")
+        cursor.execute(f"PRAGMA mmap_size={int(settings.SQLITE_MMAP_SIZE_MB) * 1024 * 1024}")
+        cursor.execute("PRAGMA temp_store=MEMORY")
+        cursor.close()
+
+
+def _migrate(conn):
+    """Bring an existing database up to the current models.
+
+    create_all only creates missing tables, so columns and indexes added to
+    tables that already exist are applied here. Only additive changes are
+    supported: new nullable/defaulted columns and new indexes.
+    """
+    inspector = inspect(conn)
+    for table in Base.metadata.sorted_tables:
+        existing = {c["name"] for c in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name in existing:
+                continue
+            col_type = column.type.compile(dialect=conn.dialect)
+            conn.execute(text(f'ALTER TABLE {table.name} ADD COLUMN "{column.name}" {col_type}'))
+        for index in table.indexes:
+            index.create(bind=conn, checkfirst=True)
+
+
 async def init_db():
     async with engine.begin() as conn:
         await conn.run_sync(Base.metadata.create_all)
+        await conn.run_sync(_migrate)
 
 
 async def get_db():
@@ -0,0 +1,57 @@
+from prometheus_client import Counter, Gauge, Histogram
+
+# Latency buckets in seconds, covering sub-ms cache hits up to LLM timeouts
+_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+HTTP_REQUEST_SECONDS = Histogram(
+    "rag_http_request_duration_seconds",
+    "HTTP request latency by route template",
+    ["method", "route", "status"],
+    buckets=_BUCKETS,
+)
+
+STAGE_SECONDS = Histogram(
+    "rag_stage_duration_seconds",
+    "Latency of individual pipeline stages (embedding, search, prompt, LLM, ...)",
+    ["stage"],
+    buckets=_BUCKETS,
+)
+
+STAGE_ERRORS = Counter(
+    "rag_stage_errors_total",
+    "Pipeline stages that raised an exception",
+    ["stage"],
+)
+
+RAG_QUERIES = Counter("rag_queries_total", "RAG queries executed")
+LLM_ERRORS = Counter("rag_llm_errors_total", "LLM calls that failed")
+RAG_COALESCED = Counter(
+    "rag_coalesced_requests_total",
+    "Chat requests by single-flight role (leader runs the query, follower shares it)",
+    ["role"],
+)
+LLM_SHED = Counter("rag_llm_shed_total", "LLM calls rejected by admission control", ["reason"])
+LLM_QUEUE_DEPTH = Gauge("rag_llm_queue_depth", "Requests waiting for an LLM slot")
+LLM_CALLS_IN_FLIGHT = Gauge("rag_llm_calls_in_flight", "LLM completions currently running")
+LLM_CIRCUIT_OPEN = Gauge("rag_llm_circuit_open", "1 while the LLM circuit breaker is open")
+SLOW_QUERIES = Counter("rag_slow_queries_total", "Traces slower than SLOW_QUERY_MS", ["trace"])
+
+DOCUMENTS_INGESTED = Counter("rag_documents_ingested_total", "Documents processed", ["status"])
+CHUNKS_INGESTED = Counter("rag_chunks_ingested_total", "Chunks embedded and stored")
+
+VECTOR_SEARCHES = Counter("rag_vector_searches_total", "Vector searches by index type", ["index"])
+
+RAG_IN_FLIGHT = Gauge("rag_queries_in_flight", "RAG queries currently executing")
+INGEST_IN_FLIGHT = Gauge("rag_ingest_in_flight", "Documents currently being processed")
+DB_CONNECTIONS_IN_USE = Gauge("rag_db_connections_in_use", "Database connections checked out of the pool")
+
+BATCH_QUESTIONS = Counter("rag_batch_questions_total", "Batch job questions processed", ["status"])
+BATCH_JOBS_RUNNING = Gauge("rag_batch_jobs_running", "Batch jobs currently running")
+
+GC_RUNS = Counter("rag_gc_runs_total", "Vector-store garbage collection runs")
+GC_RECLAIMED_BYTES = Counter("rag_gc_reclaimed_bytes_total", "Disk space reclaimed by vector-store GC")
+GC_DROPPED_COLLECTIONS = Counter("rag_gc_dropped_collections_total", "Orphaned collections dropped")
+GC_DELETED_CHUNKS = Counter("rag_gc_deleted_chunks_total", "Orphaned chunks deleted")
+GC_COMPACTIONS = Counter("rag_gc_compactions_total", "Collections rebuilt to drop HNSW tombstones")
+
+MODEL_LOAD_SECONDS = Gauge("rag_embedding_model_load_seconds", "Time taken to load the embedding model")
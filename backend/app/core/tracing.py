@@ -0,0 +1,81 @@
+import json
+import logging
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Optional
+from app.core.config import settings
+from app.core.metrics import STAGE_SECONDS, STAGE_ERRORS, SLOW_QUERIES
+
+logger = logging.getLogger("app.slow_query")
+
+
+class Trace:
+    """Per-request collection of stage timings, in milliseconds."""
+
+    def __init__(self, name: str, **attrs):
+        self.name = name
+        self.attrs = attrs
+        self.stages: dict[str, float] = {}
+        self._start = time.perf_counter()
+        self.duration_ms: float = 0.0
+
+    def record(self, stage: str, elapsed_ms: float):
+        self.stages[stage] = self.stages.get(stage, 0.0) + elapsed_ms
+
+    def finish(self) -> float:
+        self.duration_ms = (time.perf_counter() - self._start) * 1000
+        return self.duration_ms
+
+    def breakdown(self) -> dict:
+        return {k: round(v, 2) for k, v in self.stages.items()}
+
+
+def query_attrs(query: str) -> dict:
+    """Trace attributes for a user query; its text is only logged when opted in."""
+    return {"query": query[:200]} if settings.SLOW_QUERY_LOG_TEXT else {}
+
+
+_current_trace: ContextVar[Optional[Trace]] = ContextVar("current_trace", default=None)
+
+
+def current_trace() -> Optional[Trace]:
+    return _current_trace.get()
+
+
+@contextmanager
+def span(stage: str):
+    """Time a pipeline stage, export it to Prometheus and attach it to the active trace."""
+    start = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        STAGE_ERRORS.labels(stage).inc()
+        raise
+    finally:
+        elapsed = time.perf_counter() - start
+        STAGE_SECONDS.labels(stage).observe(elapsed)
+        trace = _current_trace.get()
+        if trace is not None:
+            trace.record(stage, elapsed * 1000)
+
+
+@contextmanager
+def trace(name: str, **attrs):
+    """Open a trace for one request; logs the stage breakdown if it is slow."""
+    t = Trace(name, **attrs)
+    token = _current_trace.set(t)
+    try:
+        yield t
+    finally:
+        _current_trace.reset(token)
+        t.finish()
+        threshold = settings.SLOW_QUERY_MS
+        if threshold and t.duration_ms >= threshold:
+            SLOW_QUERIES.labels(name).inc()
+            logger.warning(
+                "Slow %s: %.1fms %s",
+                name,
+                t.duration_ms,
+                json.dumps({**t.attrs, "stages_ms": t.breakdown()}, default=str),
+            )
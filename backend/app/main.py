@@ -1,10 +1,16 @@
-from fastapi import FastAPI
+from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
 from pathlib import Path
 from contextlib import asynccontextmanager
+import asyncio
+import time
 from app.core.database import init_db
-from app.api import auth, workspaces, documents, chat, stats, health
+from app.core.config import settings
+from app.core.metrics import HTTP_REQUEST_SECONDS
+from app.core.pagination import NEXT_CURSOR_HEADER
+from app.api import auth, workspaces, documents, chat, stats, health, metrics, batch
+from app.services import batch as batch_jobs
 import logging
 
 logging.basicConfig(level=logging.INFO)
@@ -15,11 +21,26 @@ logger = logging.getLogger(__name__)
 async def lifespan(app: FastAPI):
     logger.info("Starting RAG Platform...")
     await init_db()
+    from app.services.upload_spool import clear_spool
+    clear_spool()
+    from app.services.snapshot import clear_failed_imports
+    await clear_failed_imports()
     # Pre-load embedding model
     from app.services.embeddings import get_embedding_model
     get_embedding_model()
+    gc_task = None
+    if settings.GC_INTERVAL_MINUTES > 0:
+        from app.services.vector_gc import gc_loop
+        gc_task = asyncio.create_task(gc_loop())
+    await batch_jobs.resume_jobs()
+    from app.services.vector_gc import backfill_all_filter_metadata
+    backfill_task = asyncio.create_task(backfill_all_filter_metadata())
     logger.info("RAG Platform ready")
     yield
+    backfill_task.cancel()
+    if gc_task:
+        gc_task.cancel()
+    await batch_jobs.stop_all()
 
 
 app = FastAPI(
@@ -35,15 +56,38 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=[NEXT_CURSOR_HEADER],
 )
 
+
+@app.middleware("http")
+async def record_request_latency(request: Request, call_next):
+    start = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        route = request.scope.get("route")
+        # Label by route template so per-ID paths don't explode cardinality
+        if route is not None and request.url.path != "/metrics":
+            HTTP_REQUEST_SECONDS.labels(request.method, route.path, str(status)).observe(
+                time.perf_counter() - start
+            )
+
+
 app.include_router(health.router, prefix="/api", tags=["health"])
 app.include_router(auth.router, prefix="/api/auth", tags=["auth"])
 app.include_router(workspaces.router, prefix="/api/workspaces", tags=["workspaces"])
 app.include_router(documents.router, prefix="/api/documents", tags=["documents"])
 app.include_router(chat.router, prefix="/api/chat", tags=["chat"])
 app.include_router(stats.router, prefix="/api/stats", tags=["stats"])
+app.include_router(batch.router, prefix="/api/batch", tags=["batch"])
+if settings.METRICS_ENABLED:
+    app.include_router(metrics.router, tags=["metrics"])
 
 # Serve the built frontend — must be added LAST so /api/* is matched first
 frontend_dist = Path(__file__).resolve().parent.parent / "static"
-app.mount("/", StaticFiles(directory=frontend_dist, html=True), name="static")
\ No newline at end of file
+if frontend_dist.is_dir():
+    app.mount("/", StaticFiles(directory=frontend_dist, html=True), name="static")
\ No newline at end of file
@@ -0,0 +1,301 @@
+"""Batch question jobs for offline evaluation.
+
+A job's questions are stored as BatchItem rows up front. The runner walks the
+unanswered items in windows of BATCH_EMBED_SIZE: each window is embedded in
+one call and searched in one vectorized Chroma query, while the previous
+window's LLM calls are still in flight (at most BATCH_LLM_CONCURRENCY at a
+time). Every answer is committed as soon as it arrives, so a job interrupted
+by a restart resumes from the first unanswered question.
+"""
+import asyncio
+import json
+import logging
+from datetime import datetime, timezone
+from typing import Optional
+from sqlalchemy import select, update, insert
+from app.core.config import settings
+from app.core.database import AsyncSessionLocal, BatchJob, BatchItem, Workspace
+from app.core.metrics import BATCH_QUESTIONS, BATCH_JOBS_RUNNING
+from app.core.tracing import span
+from app.services.embeddings import embed_texts
+from app.services.llm_admission import LLMOverloaded, BATCH
+from app.services.rag import generate_answer
+from app.services.vector_store import search_embeddings
+
+logger = logging.getLogger(__name__)
+
+FINISHED_STATUSES = ("completed", "failed", "cancelled")
+NO_DOCUMENTS_ANSWER = "No documents found in this workspace. Please upload some documents first."
+
+_tasks: dict[str, asyncio.Task] = {}
+_cancel_requested: set[str] = set()
+
+
+def parse_questions(raw: bytes, filename: str) -> list[tuple[Optional[str], str]]:
+    """Parse an uploaded question file into (external_id, question) pairs.
+
+    .jsonl files hold one object per line with "question" (or "query") and an
+    optional "id"; anything else is read as plain text, one question per line.
+    """
+    text = raw.decode("utf-8", errors="replace")
+    questions = []
+    is_jsonl = filename.lower().endswith((".jsonl", ".ndjson"))
+    for line_no, line in enumerate(text.splitlines(), start=1):
+        line = line.strip()
+        if not line:
+            continue
+        if not is_jsonl:
+            questions.append((None, line))
+            continue
+        try:
+            obj = json.loads(line)
+        except json.JSONDecodeError as e:
+            raise ValueError(f"Line {line_no}: invalid JSON ({e.msg})")
+        if isinstance(obj, str):
+            questions.append((None, obj))
+            continue
+        if not isinstance(obj, dict):
+            raise ValueError(f"Line {line_no}: expected an object or a string")
+        question = obj.get("question") or obj.get("query")
+        if not question or not str(question).strip():
+            raise ValueError(f"Line {line_no}: missing 'question'")
+        ext_id = obj.get("id")
+        questions.append((str(ext_id) if ext_id is not None else None, str(question)))
+    return questions
+
+
+async def create_job(
+    db,
+    user_id: str,
+    workspace_id: str,
+    filename: str,
+    questions: list[tuple[Optional[str], str]],
+    n_results: int,
+) -> BatchJob:
+    job = BatchJob(
+        user_id=user_id,
+        workspace_id=workspace_id,
+        filename=filename,
+        n_results=n_results,
+        total=len(questions),
+    )
+    db.add(job)
+    await db.flush()
+    rows = [
+        {"job_id": job.id, "idx": i, "external_id": ext_id, "question": q}
+        for i, (ext_id, q) in enumerate(questions)
+    ]
+    for i in range(0, len(rows), 1000):
+        await db.execute(insert(BatchItem), rows[i:i + 1000])
+    await db.commit()
+    await db.refresh(job)
+    return job
+
+
+def start_job(job_id: str):
+    if job_id in _tasks:
+        return
+    task = asyncio.create_task(_run_job(job_id))
+    _tasks[job_id] = task
+    task.add_done_callback(lambda _: _tasks.pop(job_id, None))
+
+
+def cancel_job(job_id: str) -> bool:
+    task = _tasks.get(job_id)
+    if task is None:
+        return False
+    _cancel_requested.add(job_id)
+    task.cancel()
+    return True
+
+
+async def resume_jobs():
+    """Restart jobs left queued or running by a previous process."""
+    async with AsyncSessionLocal() as db:
+        result = await db.execute(select(BatchJob.id).where(BatchJob.status.in_(("queued", "running"))))
+        job_ids = result.scalars().all()
+    for job_id in job_ids:
+        logger.info(f"Resuming batch job {job_id}")
+        start_job(job_id)
+
+
+async def stop_all():
+    """Cancel running jobs on shutdown without marking them cancelled, so they resume."""
+    tasks = list(_tasks.values())
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+
+
+async def _set_status(job_id: str, status: str, error: Optional[str] = None):
+    async with AsyncSessionLocal() as db:
+        job = await db.get(BatchJob, job_id)
+        if job is None:
+            return
+        job.status = status
+        job.error_message = error
+        if status in FINISHED_STATUSES:
+            job.finished_at = datetime.now(timezone.utc)
+        await db.commit()
+
+
+async def _record_answer(job_id: str, idx: int, answer: Optional[str], sources: list, error: Optional[str], duration_ms: float):
+    async with AsyncSessionLocal() as db:
+        await db.execute(
+            update(BatchItem)
+            .where(BatchItem.job_id == job_id, BatchItem.idx == idx)
+            .values(
+                answer=answer,
+                sources=json.dumps(sources),
+                error=error,
+                duration_ms=round(duration_ms, 2),
+            )
+        )
+        await db.execute(
+            update(BatchJob).where(BatchJob.id == job_id).values(completed=BatchJob.completed + 1)
+        )
+        await db.commit()
+
+
+async def _retrieve_windows(job: BatchJob, queue: asyncio.Queue):
+    """Producer: embed and search unanswered questions one window at a time.
+
+    A window whose search fails is recorded as errors rather than answered
+    without context; a deleted workspace fails the job.
+    """
+    try:
+        await _produce_windows(job, queue)
+    except Exception:
+        await queue.put(None)  # let the consumer stop; _run_job re-raises via the producer
+        raise
+
+
+async def _produce_windows(job: BatchJob, queue: asyncio.Queue):
+    last_idx = -1
+    while True:
+        async with AsyncSessionLocal() as db:
+            result = await db.execute(
+                select(BatchItem.idx, BatchItem.question)
+                .where(
+                    BatchItem.job_id == job.id,
+                    BatchItem.idx > last_idx,
+                    BatchItem.answer.is_(None),
+                    BatchItem.error.is_(None),
+                )
+                .order_by(BatchItem.idx)
+                .limit(settings.BATCH_EMBED_SIZE)
+            )
+            items = result.all()
+        if not items:
+            break
+        last_idx = items[-1].idx
+        questions = [item.question for item in items]
+        with span("batch_embed"):
+            embeddings = await asyncio.to_thread(embed_texts, questions, settings.BATCH_EMBED_SIZE)
+        with span("batch_search"):
+            try:
+                results = await asyncio.to_thread(
+                    search_embeddings, job.workspace_id, embeddings, job.n_results, raise_errors=True
+                )
+            except Exception as e:
+                logger.error(f"Batch job {job.id} retrieval failed for questions {items[0].idx}-{last_idx}: {e}")
+                await _record_errors(job.id, [item.idx for item in items], f"Retrieval failed: {e}")
+                continue
+        # The collection of a deleted workspace reads as empty; don't answer
+        # "no documents" for it
+        async with AsyncSessionLocal() as db:
+            if await db.get(Workspace, job.workspace_id) is None:
+                raise RuntimeError("Workspace was deleted")
+        await queue.put(list(zip(items, results)))
+    await queue.put(None)
+
+
+async def _record_errors(job_id: str, idxs: list[int], error: str):
+    async with AsyncSessionLocal() as db:
+        await db.execute(
+            update(BatchItem)
+            .where(BatchItem.job_id == job_id, BatchItem.idx.in_(idxs))
+            .values(error=error, sources=json.dumps([]))
+        )
+        await db.execute(
+            update(BatchJob).where(BatchJob.id == job_id).values(completed=BatchJob.completed + len(idxs))
+        )
+        await db.commit()
+    BATCH_QUESTIONS.labels("error").inc(len(idxs))
+
+
+async def _answer(job_id: str, idx: int, question: str, chunks: list[dict]):
+    loop = asyncio.get_running_loop()
+    start = loop.time()
+    answer, sources, error = None, [], None
+    try:
+        if chunks:
+            while True:
+                try:
+                    result = await generate_answer(question, chunks, priority=BATCH)
+                    break
+                except LLMOverloaded as e:
+                    # Shed in favour of interactive traffic or circuit open; back off
+                    await asyncio.sleep(e.retry_after)
+            answer, sources = result["answer"], result["sources"]
+        else:
+            answer = NO_DOCUMENTS_ANSWER
+    except Exception as e:
+        error = getattr(e, "detail", None) or str(e)
+    BATCH_QUESTIONS.labels("error" if error else "answered").inc()
+    await _record_answer(job_id, idx, answer, sources, error, (loop.time() - start) * 1000)
+
+
+async def _run_job(job_id: str):
+    async with AsyncSessionLocal() as db:
+        job = await db.get(BatchJob, job_id)
+        if job is None or job.status in FINISHED_STATUSES:
+            return
+        job.status = "running"
+        await db.commit()
+
+    queue: asyncio.Queue = asyncio.Queue(maxsize=2)
+    producer = asyncio.create_task(_retrieve_windows(job, queue))
+    sem = asyncio.Semaphore(settings.BATCH_LLM_CONCURRENCY)
+    in_flight: set[asyncio.Task] = set()
+    failures: list[Exception] = []
+
+    async def bounded(item, chunks):
+        # Finished tasks leave in_flight before the final gather, so their
+        # exceptions are collected here instead.
+        try:
+            await _answer(job_id, item.idx, item.question, chunks)
+        except Exception as e:
+            logger.error(f"Batch job {job_id} question {item.idx} was not recorded: {e}")
+            failures.append(e)
+        finally:
+            sem.release()
+
+    with BATCH_JOBS_RUNNING.track_inprogress():
+        try:
+            while (window := await queue.get()) is not None:
+                for item, chunks in window:
+                    await sem.acquire()
+                    task = asyncio.create_task(bounded(item, chunks))
+                    in_flight.add(task)
+                    task.add_done_callback(in_flight.discard)
+            await producer
+            await asyncio.gather(*in_flight)
+            if failures:
+                raise RuntimeError(f"{len(failures)} questions were not recorded: {failures[0]}")
+            await _set_status(job_id, "completed")
+            logger.info(f"Batch job {job_id} completed")
+        except asyncio.CancelledError:
+            producer.cancel()
+            for task in in_flight:
+                task.cancel()
+            await asyncio.gather(producer, *in_flight, return_exceptions=True)
+            if job_id in _cancel_requested:
+                _cancel_requested.discard(job_id)
+                await _set_status(job_id, "cancelled")
+            raise
+        except Exception as e:
+            logger.error(f"Batch job {job_id} failed: {e}")
+            producer.cancel()
+            await asyncio.gather(producer, *in_flight, return_exceptions=True)
+            await _set_status(job_id, "failed", str(e))
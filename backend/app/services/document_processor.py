@@ -1,6 +1,7 @@
 import io
 import re
-from typing import Generator
+from pathlib import Path
+from typing import Generator, Union
 import logging
 
 logger = logging.getLogger(__name__)
@@ -8,6 +9,14 @@ logger = logging.getLogger(__name__)
 CHUNK_SIZE = 500      # words per chunk
 CHUNK_OVERLAP = 50   # words overlap between chunks
 
+# Raw bytes, or the path of a file on disk (e.g. a spooled upload)
+Source = Union[bytes, str, Path]
+
+
+def _as_file(source: Source):
+    # pypdf and python-docx accept a path and read from it lazily
+    return io.BytesIO(source) if isinstance(source, bytes) else str(source)
+
 
 def chunk_text(text: str, chunk_size: int = CHUNK_SIZE, overlap: int = CHUNK_OVERLAP) -> list[str]:
     """Split text into overlapping chunks by word count."""
@@ -29,10 +38,10 @@ def chunk_text(text: str, chunk_size: int = CHUNK_SIZE, overlap: int = CHUNK_OVE
     return chunks
 
 
-def extract_text_from_pdf(file_bytes: bytes) -> str:
+def extract_text_from_pdf(source: Source) -> str:
     try:
         import pypdf
-        reader = pypdf.PdfReader(io.BytesIO(file_bytes))
+        reader = pypdf.PdfReader(_as_file(source))
         text = ""
         for page in reader.pages:
             text += page.extract_text() + "\n"
@@ -42,30 +51,32 @@ def extract_text_from_pdf(file_bytes: bytes) -> str:
         raise ValueError(f"Could not extract text from PDF: {e}")
 
 
-def extract_text_from_docx(file_bytes: bytes) -> str:
+def extract_text_from_docx(source: Source) -> str:
     try:
         import docx
-        doc = docx.Document(io.BytesIO(file_bytes))
+        doc = docx.Document(_as_file(source))
         return "\n".join(para.text for para in doc.paragraphs if para.text.strip())
     except Exception as e:
         logger.error(f"DOCX extraction error: {e}")
         raise ValueError(f"Could not extract text from DOCX: {e}")
 
 
-def extract_text(file_bytes: bytes, file_type: str) -> str:
+def extract_text(source: Source, file_type: str) -> str:
     ft = file_type.lower().strip(".")
     if ft == "pdf":
-        return extract_text_from_pdf(file_bytes)
+        return extract_text_from_pdf(source)
     elif ft in ("txt", "md"):
-        return file_bytes.decode("utf-8", errors="replace")
+        if isinstance(source, bytes):
+            return source.decode("utf-8", errors="replace")
+        return Path(source).read_text(encoding="utf-8", errors="replace")
     elif ft == "docx":
-        return extract_text_from_docx(file_bytes)
+        return extract_text_from_docx(source)
     else:
         raise ValueError(f"Unsupported file type: {file_type}")
 
 
-def process_document(file_bytes: bytes, file_type: str) -> list[str]:
-    text = extract_text(file_bytes, file_type)
+def process_document(source: Source, file_type: str) -> list[str]:
+    text = extract_text(source, file_type)
     chunks = chunk_text(text)
     logger.info(f"Processed document: {len(chunks)} chunks from {len(text)} chars")
     return chunks
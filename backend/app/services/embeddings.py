@@ -1,6 +1,8 @@
 from sentence_transformers import SentenceTransformer
 from app.core.config import settings
+from app.core.metrics import MODEL_LOAD_SECONDS
 import logging
+import time
 
 logger = logging.getLogger(__name__)
 
@@ -11,14 +13,17 @@ def get_embedding_model() -> SentenceTransformer:
     global _model
     if _model is None:
         logger.info(f"Loading embedding model: {settings.EMBEDDING_MODEL}")
+        start = time.perf_counter()
         _model = SentenceTransformer(settings.EMBEDDING_MODEL)
-        logger.info("Embedding model loaded")
+        elapsed = time.perf_counter() - start
+        MODEL_LOAD_SECONDS.set(elapsed)
+        logger.info(f"Embedding model loaded in {elapsed:.2f}s")
     return _model
 
 
-def embed_texts(texts: list[str]) -> list[list[float]]:
+def embed_texts(texts: list[str], batch_size: int = 32) -> list[list[float]]:
     model = get_embedding_model()
-    embeddings = model.encode(texts, show_progress_bar=False)
+    embeddings = model.encode(texts, batch_size=batch_size, show_progress_bar=False)
     return embeddings.tolist()
 
 
@@ -0,0 +1,211 @@
+"""Admission control in front of the LLM provider.
+
+At most LLM_MAX_IN_FLIGHT completions run at once. Further requests wait in
+a bounded priority queue where interactive chat is served ahead of batch
+work. A request that cannot start before its deadline is rejected up front
+with 503 and Retry-After, so it does not sit in the queue and then time out.
+A full queue sheds its lowest-priority waiter, or the newcomer if nothing
+ranks below it.
+
+A circuit breaker opens after LLM_BREAKER_FAILURES consecutive provider
+failures and rejects everything for LLM_BREAKER_COOLDOWN_SECONDS. After the
+cooldown a single probe is let through; its outcome closes or re-opens it.
+"""
+import asyncio
+import heapq
+import itertools
+import math
+import time
+from contextlib import asynccontextmanager
+from typing import Optional
+from fastapi import HTTPException
+from app.core.config import settings
+from app.core.metrics import LLM_SHED, LLM_QUEUE_DEPTH, LLM_CALLS_IN_FLIGHT, LLM_CIRCUIT_OPEN
+from app.core.tracing import span
+
+INTERACTIVE = 0
+BATCH = 1
+
+_EWMA_ALPHA = 0.2
+
+
+class LLMOverloaded(HTTPException):
+    """Raised instead of calling the LLM when it cannot be admitted in time."""
+
+    def __init__(self, reason: str, retry_after: float):
+        self.reason = reason
+        self.retry_after = max(1, math.ceil(retry_after))
+        super().__init__(
+            status_code=503,
+            detail=f"LLM is overloaded ({reason}), retry in {self.retry_after}s",
+            headers={"Retry-After": str(self.retry_after)},
+        )
+
+
+def _granted(future: asyncio.Future) -> bool:
+    return future.done() and not future.cancelled() and future.exception() is None
+
+
+class Admission:
+    """Timing of one admitted call, in milliseconds."""
+
+    def __init__(self):
+        self.queue_ms = 0.0
+        self.generation_ms = 0.0
+
+
+class AdmissionController:
+    def __init__(
+        self,
+        max_in_flight: int,
+        queue_size: int,
+        breaker_failures: int,
+        breaker_cooldown: float,
+    ):
+        self.max_in_flight = max_in_flight
+        self.queue_size = queue_size
+        self.breaker_failures = breaker_failures
+        self.breaker_cooldown = breaker_cooldown
+        self._in_flight = 0
+        self._waiters: list[tuple[int, int, asyncio.Future]] = []
+        self._seq = itertools.count()
+        self._avg_generation_s = 1.0
+        self._failures = 0
+        self._opened_at: Optional[float] = None
+        self._probing = False
+
+    def _estimate_wait(self, priority: int) -> float:
+        ahead = sum(1 for p, _, _ in self._waiters if p <= priority)
+        return (ahead // self.max_in_flight + 1) * self._avg_generation_s
+
+    def _shed(self, reason: str, retry_after: float) -> LLMOverloaded:
+        LLM_SHED.labels(reason).inc()
+        return LLMOverloaded(reason, retry_after)
+
+    def _check_breaker(self) -> bool:
+        """Raise if the breaker rejects this call; returns True if the call is the half-open probe."""
+        if self._opened_at is None:
+            return False
+        remaining = self._opened_at + self.breaker_cooldown - time.monotonic()
+        if remaining > 0:
+            raise self._shed("circuit_open", remaining)
+        if self._probing:
+            raise self._shed("circuit_open", self._avg_generation_s)
+        self._probing = True
+        return True
+
+    def _remove_waiter(self, entry: tuple):
+        try:
+            self._waiters.remove(entry)
+        except ValueError:
+            return
+        heapq.heapify(self._waiters)
+        LLM_QUEUE_DEPTH.set(len(self._waiters))
+
+    async def _acquire(self, priority: int, deadline: Optional[float]):
+        if self._in_flight < self.max_in_flight and not self._waiters:
+            self._in_flight += 1
+            return
+
+        estimate = self._estimate_wait(priority)
+        if deadline is not None and estimate > deadline:
+            raise self._shed("deadline", estimate)
+        if len(self._waiters) >= self.queue_size:
+            worst = max(self._waiters)  # lowest priority, most recent
+            if worst[0] <= priority:
+                raise self._shed("queue_full", estimate)
+            self._remove_waiter(worst)
+            worst[2].set_exception(self._shed("queue_full", estimate))
+
+        future = asyncio.get_running_loop().create_future()
+        entry = (priority, next(self._seq), future)
+        heapq.heappush(self._waiters, entry)
+        LLM_QUEUE_DEPTH.set(len(self._waiters))
+        try:
+            await asyncio.wait_for(future, deadline)
+        except asyncio.TimeoutError:
+            self._remove_waiter(entry)
+            if _granted(future):
+                # The slot was handed over just as the deadline fired; keep it
+                return
+            raise self._shed("deadline", self._estimate_wait(priority))
+        except asyncio.CancelledError:
+            self._remove_waiter(entry)
+            if _granted(future):
+                # The slot was handed over just as we were cancelled
+                self._release()
+            raise
+
+    def _release(self):
+        # Hand the slot straight to the best waiter so nothing can jump the queue
+        while self._waiters:
+            _, _, future = heapq.heappop(self._waiters)
+            if not future.done():
+                LLM_QUEUE_DEPTH.set(len(self._waiters))
+                future.set_result(None)
+                return
+        LLM_QUEUE_DEPTH.set(0)
+        self._in_flight -= 1
+
+    def _record(self, ok: bool, probe: bool, elapsed: float):
+        if probe:
+            self._probing = False
+        if ok:
+            self._failures = 0
+            self._opened_at = None
+            self._avg_generation_s += _EWMA_ALPHA * (elapsed - self._avg_generation_s)
+        else:
+            self._failures += 1
+            if probe or self._failures >= self.breaker_failures:
+                self._opened_at = time.monotonic()
+        LLM_CIRCUIT_OPEN.set(0 if self._opened_at is None else 1)
+
+    @asynccontextmanager
+    async def slot(self, priority: int = INTERACTIVE):
+        """Hold one LLM slot for the duration of the block.
+
+        Interactive calls queue for at most LLM_QUEUE_DEADLINE_SECONDS; batch
+        calls wait as long as it takes. Exceptions raised inside the block
+        count as provider failures for the circuit breaker.
+        """
+        deadline = settings.LLM_QUEUE_DEADLINE_SECONDS if priority == INTERACTIVE else None
+        admission = Admission()
+        probe = self._check_breaker()
+        start = time.perf_counter()
+        try:
+            with span("llm_queue"):
+                await self._acquire(priority, deadline)
+        except BaseException:
+            if probe:
+                self._probing = False
+            raise
+        admission.queue_ms = (time.perf_counter() - start) * 1000
+
+        LLM_CALLS_IN_FLIGHT.inc()
+        start = time.perf_counter()
+        ok = None
+        try:
+            yield admission
+            ok = True
+        except Exception:
+            ok = False
+            raise
+        finally:
+            elapsed = time.perf_counter() - start
+            admission.generation_ms = elapsed * 1000
+            LLM_CALLS_IN_FLIGHT.dec()
+            self._release()
+            if ok is None:
+                # Cancelled by the caller; says nothing about the provider
+                if probe:
+                    self._probing = False
+            else:
+                self._record(ok, probe, elapsed)
+
+
+llm_admission = AdmissionController(
+    max_in_flight=settings.LLM_MAX_IN_FLIGHT,
+    queue_size=settings.LLM_QUEUE_SIZE,
+    breaker_failures=settings.LLM_BREAKER_FAILURES,
+    breaker_cooldown=settings.LLM_BREAKER_COOLDOWN_SECONDS,
+)
@@ -1,7 +1,14 @@
 import httpx
 import json
+from fastapi import HTTPException
 from app.core.config import settings
-from app.services.vector_store import query_documents
+from app.core.metrics import RAG_QUERIES, RAG_IN_FLIGHT, LLM_ERRORS
+from app.core.tracing import span
+from app.services.embeddings import embed_query
+from app.services.llm_admission import llm_admission, LLMOverloaded, INTERACTIVE
+from app.services.vector_store import query_documents, search_embedding, get_workspace_doc_count
+from typing import Callable, Optional
+import asyncio
 import logging
 
 logger = logging.getLogger(__name__)
@@ -16,24 +23,154 @@ Rules:
 - Use markdown formatting for better readability"""
 
 
-async def run_rag(workspace_id: str, query: str, n_results: int = 5) -> dict:
+class LLMError(HTTPException):
+    """The LLM provider failed or timed out; surfaced as 502 rather than as an answer."""
+
+    def __init__(self, detail: str):
+        super().__init__(status_code=502, detail=f"LLM provider error: {detail}")
+
+
+async def run_rag(
+    workspace_id: str,
+    query: str,
+    n_results: int = 5,
+    where: Optional[dict] = None,
+    on_event: Optional[Callable[[dict], None]] = None,
+    stream: bool = False,
+) -> dict:
+    """Answer a question from one workspace.
+
+    on_event receives a "sources" event once retrieval is done and, when
+    stream is set, a "token" event for every piece of the answer.
+    """
+    RAG_QUERIES.inc()
+    with RAG_IN_FLIGHT.track_inprogress():
+        return await _run_rag(workspace_id, query, n_results, where, on_event, stream)
+
+
+async def _run_rag(
+    workspace_id: str,
+    query: str,
+    n_results: int,
+    where: Optional[dict],
+    on_event: Optional[Callable[[dict], None]],
+    stream: bool,
+) -> dict:
     # 1. Retrieve relevant chunks
-    chunks = query_documents(workspace_id, query, n_results=n_results)
+    chunks = query_documents(workspace_id, query, n_results=n_results, where=where)
 
     if not chunks:
+        if where:
+            return {"answer": "No documents match the selected filters.", "sources": []}
         return {
             "answer": "No documents found in this workspace. Please upload some documents first.",
             "sources": [],
         }
 
+    on_token = None
+    if on_event is not None:
+        on_event({"type": "sources", "sources": _format_sources(chunks)})
+        if stream:
+            def on_token(text: str):
+                on_event({"type": "token", "text": text})
+
+    return await generate_answer(query, chunks, on_token=on_token)
+
+
+async def run_federated_rag(
+    workspace_ids: list[str],
+    query: str,
+    n_results: int = 5,
+    where: Optional[dict[str, Optional[dict]]] = None,
+) -> dict:
+    """Answer one question from several workspaces with a single embed and LLM call.
+
+    Collections are searched concurrently (FEDERATED_MAX_CONCURRENCY at a
+    time, FEDERATED_TIMEOUT_SECONDS each) and merged into a global top-k.
+    Scores are cosine similarities from the same embedding model, so they are
+    directly comparable across collections. Workspaces that time out or fail
+    are reported in "skipped" rather than failing the whole request; a timed
+    out search keeps its slot until its thread returns.
+    """
+    RAG_QUERIES.inc()
+    with RAG_IN_FLIGHT.track_inprogress():
+        where = where or {}
+        live = [ws for ws in workspace_ids if get_workspace_doc_count(ws) > 0]
+        if not live:
+            return {
+                "answer": "No documents found in the selected workspaces. Please upload some documents first.",
+                "sources": [],
+                "skipped": [],
+            }
+
+        with span("embed_query"):
+            query_embedding = await asyncio.to_thread(embed_query, query)
+
+        sem = asyncio.Semaphore(settings.FEDERATED_MAX_CONCURRENCY)
+
+        def release(future: asyncio.Future):
+            sem.release()
+            if not future.cancelled():
+                future.exception()  # retrieved here when nobody awaits it after a timeout
+
+        async def search(workspace_id: str) -> list[dict]:
+            await sem.acquire()
+            # A timeout cannot stop the search thread, so the slot is only
+            # released once the thread itself returns.
+            future = asyncio.ensure_future(asyncio.to_thread(
+                search_embedding, workspace_id, query_embedding, n_results, where.get(workspace_id),
+                raise_errors=True,
+            ))
+            future.add_done_callback(release)
+            chunks = await asyncio.wait_for(asyncio.shield(future), timeout=settings.FEDERATED_TIMEOUT_SECONDS)
+            for chunk in chunks:
+                chunk["workspace_id"] = workspace_id
+            return chunks
+
+        with span("vector_search"):
+            results = await asyncio.gather(*(search(ws) for ws in live), return_exceptions=True)
+
+        merged, skipped = [], []
+        for workspace_id, result in zip(live, results):
+            if isinstance(result, BaseException):
+                reason = "timeout" if isinstance(result, asyncio.TimeoutError) else str(result)
+                logger.warning(f"Federated search skipped workspace {workspace_id}: {reason}")
+                skipped.append({"workspace_id": workspace_id, "reason": reason})
+            else:
+                merged.extend(result)
+        merged.sort(key=lambda c: c["score"], reverse=True)
+        chunks = merged[:n_results]
+
+        if not chunks:
+            return {"answer": "No matching documents found in the selected workspaces.", "sources": [], "skipped": skipped}
+
+        result = await generate_answer(query, chunks)
+        result["skipped"] = skipped
+        return result
+
+
+async def generate_answer(
+    query: str,
+    chunks: list[dict],
+    on_token: Optional[Callable[[str], None]] = None,
+    priority: int = INTERACTIVE,
+) -> dict:
+    """Build the prompt, call the LLM and format sources.
+
+    With on_token, the completion is streamed and each delta is passed to it.
+    The call goes through admission control, which raises LLMOverloaded
+    (a 503) when no slot frees up in time or the circuit is open; time spent
+    waiting for a slot is reported as queue_ms, separately from
+    generation_ms. Provider errors and timeouts raise LLMError (a 502).
+    """
     # 2. Build context
-    context_parts = []
-    for i, chunk in enumerate(chunks):
-        context_parts.append(f"[Source {i+1} - {chunk['filename']}]\n{chunk['text']}")
-    context = "\n\n---\n\n".join(context_parts)
+    with span("build_prompt"):
+        context_parts = []
+        for i, chunk in enumerate(chunks):
+            context_parts.append(f"[Source {i+1} - {chunk['filename']}]\n{chunk['text']}")
+        context = "\n\n---\n\n".join(context_parts)
 
-    # 3. Call Groq LLM
-    prompt = f"""Context from documents:
+        prompt = f"""Context from documents:
 
 {context}
 
@@ -43,44 +180,99 @@ Question: {query}
 
 Answer based on the context above:"""
 
+    # 3. Call Groq LLM
     try:
-        async with httpx.AsyncClient(timeout=30) as client:
-            response = await client.post(
-                "https://api.groq.com/openai/v1/chat/completions",
-                headers={
-                    "Authorization": f"Bearer {settings.GROQ_API_KEY}",
-                    "Content-Type": "application/json",
-                },
-                json={
-                    "model": settings.GROQ_MODEL,
-                    "messages": [
-                        {"role": "system", "content": SYSTEM_PROMPT},
-                        {"role": "user", "content": prompt},
-                    ],
-                    "max_tokens": 1024,
-                    "temperature": 0.1,
-                },
-            )
-            response.raise_for_status()
-            data = response.json()
-            answer = data["choices"][0]["message"]["content"]
+        async with llm_admission.slot(priority) as admission:
+            with span("llm_generate"):
+                if on_token is None:
+                    answer = await _call_llm(prompt)
+                else:
+                    answer = await _stream_llm(prompt, on_token)
+    except LLMOverloaded:
+        raise
+    except httpx.TimeoutException as e:
+        logger.error(f"LLM timeout: {e!r}")
+        LLM_ERRORS.inc()
+        raise LLMError("timed out") from e
     except Exception as e:
         logger.error(f"LLM error: {e}")
-        answer = f"Error generating answer: {str(e)}"
+        LLM_ERRORS.inc()
+        raise LLMError(str(e)) from e
 
     # 4. Format sources
+    with span("format_sources"):
+        sources = _format_sources(chunks)
+
+    return {
+        "answer": answer,
+        "sources": sources,
+        "queue_ms": round(admission.queue_ms, 2),
+        "generation_ms": round(admission.generation_ms, 2),
+    }
+
+
+def _llm_request(prompt: str, stream: bool = False) -> dict:
+    return {
+        "url": f"{settings.LLM_BASE_URL.rstrip('/')}/chat/completions",
+        "headers": {
+            "Authorization": f"Bearer {settings.GROQ_API_KEY}",
+            "Content-Type": "application/json",
+        },
+        "json": {
+            "model": settings.GROQ_MODEL,
+            "messages": [
+                {"role": "system", "content": SYSTEM_PROMPT},
+                {"role": "user", "content": prompt},
+            ],
+            "max_tokens": 1024,
+            "temperature": 0.1,
+            "stream": stream,
+        },
+    }
+
+
+async def _call_llm(prompt: str) -> str:
+    async with httpx.AsyncClient(timeout=settings.LLM_TIMEOUT_SECONDS) as client:
+        response = await client.post(**_llm_request(prompt))
+        response.raise_for_status()
+        data = response.json()
+        return data["choices"][0]["message"]["content"]
+
+
+async def _stream_llm(prompt: str, on_token: Callable[[str], None]) -> str:
+    """Stream a completion (OpenAI-compatible SSE) and return the full text."""
+    parts = []
+    async with httpx.AsyncClient(timeout=settings.LLM_TIMEOUT_SECONDS) as client:
+        async with client.stream("POST", **_llm_request(prompt, stream=True)) as response:
+            response.raise_for_status()
+            async for line in response.aiter_lines():
+                if not line.startswith("data:"):
+                    continue
+                data = line[len("data:"):].strip()
+                if data == "[DONE]":
+                    break
+                delta = json.loads(data)["choices"][0].get("delta", {}).get("content")
+                if delta:
+                    parts.append(delta)
+                    on_token(delta)
+    return "".join(parts)
+
+
+def _format_sources(chunks: list[dict]) -> list[dict]:
     seen = set()
     sources = []
     for chunk in chunks:
         key = (chunk["doc_id"], chunk["chunk_index"])
         if key not in seen:
             seen.add(key)
-            sources.append({
+            source = {
                 "filename": chunk["filename"],
                 "doc_id": chunk["doc_id"],
                 "chunk_index": chunk["chunk_index"],
                 "score": chunk["score"],
                 "preview": chunk["text"][:200] + "..." if len(chunk["text"]) > 200 else chunk["text"],
-            })
-
-    return {"answer": answer, "sources": sources}
+            }
+            if "workspace_id" in chunk:
+                source["workspace_id"] = chunk["workspace_id"]
+            sources.append(source)
+    return sources
@@ -0,0 +1,119 @@
+"""Single-flight coalescing of identical concurrent RAG queries.
+
+Requests that arrive while an identical query is already running await that
+execution instead of starting their own embed, search and LLM call. Queries
+are identical when they share a workspace, normalized question text,
+n_results, filters and corpus version, so an upload or delete mid-flight
+starts a new execution rather than joining a stale one. Nothing is cached:
+a flight is forgotten as soon as it finishes.
+
+The shared execution runs in its own task, so a caller disconnecting does
+not cancel it for the others. Streaming callers subscribe to its events and
+get a replay of everything published before they joined.
+"""
+import asyncio
+import json
+import logging
+from typing import Awaitable, Callable, Optional
+from app.core.config import settings
+from app.core.metrics import RAG_COALESCED
+from app.services.vector_store import get_corpus_version
+
+logger = logging.getLogger(__name__)
+
+
+class Flight:
+    """One shared execution and the events it has published so far."""
+
+    def __init__(self, stream: bool):
+        self.stream = stream
+        self.events: list[dict] = []
+        self.subscribers: set[asyncio.Queue] = set()
+        self.future: asyncio.Future = asyncio.get_running_loop().create_future()
+        # Nobody may await the result (e.g. only streaming callers), so mark
+        # a failure as retrieved to keep asyncio from logging it.
+        self.future.add_done_callback(lambda f: f.cancelled() or f.exception())
+
+    def publish(self, event: dict):
+        self.events.append(event)
+        for queue in self.subscribers:
+            queue.put_nowait(event)
+
+    def subscribe(self) -> asyncio.Queue:
+        queue: asyncio.Queue = asyncio.Queue()
+        for event in self.events:
+            queue.put_nowait(event)
+        self.subscribers.add(queue)
+        return queue
+
+    def unsubscribe(self, queue: asyncio.Queue):
+        self.subscribers.discard(queue)
+
+
+_flights: dict[tuple, Flight] = {}
+_tasks: set[asyncio.Task] = set()
+
+
+def flight_key(workspace_id: str, query: str, n_results: int, where: Optional[dict]) -> tuple:
+    normalized = " ".join(query.casefold().split())
+    filters = json.dumps(where, sort_keys=True) if where else ""
+    return (workspace_id, normalized, n_results, filters, get_corpus_version(workspace_id))
+
+
+async def _run(key: tuple, flight: Flight, execute: Callable[[Flight], Awaitable[dict]]):
+    try:
+        result = await execute(flight)
+    except Exception as e:
+        if getattr(e, "retry_after", None):
+            logger.warning(f"Shared query shed: {e}")
+        else:
+            logger.error(f"Shared query failed: {e}")
+        event = {"type": "error", "detail": getattr(e, "detail", str(e))}
+        if getattr(e, "retry_after", None):
+            event["retry_after"] = e.retry_after
+        flight.publish(event)
+        flight.future.set_exception(e)
+    else:
+        if not any(event["type"] == "token" for event in flight.events):
+            # Non-streamed or canned answers reach subscribers in one piece
+            flight.publish({"type": "token", "text": result["answer"]})
+        flight.publish({
+            "type": "done",
+            "answer": result["answer"],
+            "sources": result["sources"],
+            "queue_ms": result.get("queue_ms"),
+            "generation_ms": result.get("generation_ms"),
+        })
+        flight.future.set_result(result)
+    finally:
+        if _flights.get(key) is flight:
+            del _flights[key]
+
+
+def join(key: tuple, execute: Callable[[Flight], Awaitable[dict]], stream: bool = False) -> tuple[Flight, bool]:
+    """Return the in-flight execution for key, starting one if there is none.
+
+    The second value is True when the caller joined an existing execution.
+    execute receives the Flight and should publish its progress to it; it
+    is only called for the caller that starts the flight.
+    """
+    flight = _flights.get(key) if settings.SINGLE_FLIGHT_ENABLED else None
+    if flight is not None:
+        RAG_COALESCED.labels("follower").inc()
+        return flight, True
+
+    RAG_COALESCED.labels("leader").inc()
+    flight = Flight(stream)
+    if settings.SINGLE_FLIGHT_ENABLED:
+        _flights[key] = flight
+    task = asyncio.create_task(_run(key, flight, execute))
+    _tasks.add(task)
+    task.add_done_callback(_tasks.discard)
+    return flight, False
+
+
+async def run_coalesced(key: tuple, execute: Callable[[Flight], Awaitable[dict]]) -> tuple[dict, bool]:
+    """Await the shared result for key; returns (result, coalesced)."""
+    flight, coalesced = join(key, execute)
+    # Shield so one caller going away does not cancel the others' result
+    return await asyncio.shield(flight.future), coalesced
@@ -0,0 +1,395 @@
+"""Workspace snapshots: export a workspace to one archive, import it as a new one.
+
+An archive is a gzip stream of newline-terminated JSON records:
+
+    {"type": "manifest", "format": 1, "embedding_model": ..., "dim": 384, "workspace": {...}}
+    {"type": "document", "id": ..., "filename": ..., ...}          one per ready document
+    {"type": "chunks", "count": n, "doc_ids": [...], "chunk_index": [...], "texts": [...]}
+    <n * dim little-endian float32 embeddings>                     raw, right after its header
+    ...
+    {"type": "end", "documents": d, "chunks": c}
+
+Every record delimits itself, so archives are written and read as streams
+without holding a workspace in memory. Import bulk-loads the stored
+embeddings into the new workspace's collection without running the
+embedding model, so it refuses archives made with a different model.
+"""
+import asyncio
+import json
+import logging
+import uuid
+import zlib
+from datetime import datetime
+from typing import AsyncIterator, Iterator, Optional
+import numpy as np
+from fastapi import HTTPException
+from sqlalchemy import delete, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.core.config import settings
+from app.core.database import Document, User, Workspace
+from app.services.vector_store import (
+    add_embeddings,
+    chunk_id,
+    chunk_metadata,
+    drop_collection,
+    hnsw_metadata,
+    iter_chunks,
+    stored_chunk_count,
+)
+
+logger = logging.getLogger(__name__)
+
+FORMAT_VERSION = 1
+IMPORTING = "importing"
+# zlib wbits for a gzip container
+_GZIP_WBITS = 31
+_FLOAT = np.dtype("<f4")
+# Longest JSON record accepted on import (a chunks header carries its batch's texts)
+_MAX_RECORD_BYTES = 256 * 1024 * 1024
+# Most decompressed bytes produced per step while reading an archive
+_DECOMPRESS_STEP = 16 * 1024 * 1024
+
+
+def _record(record: dict) -> bytes:
+    return json.dumps(record, separators=(",", ":")).encode() + b"\n"
+
+
+def _invalid(detail: str) -> HTTPException:
+    return HTTPException(status_code=400, detail=f"Invalid snapshot: {detail}")
+
+
+def _document_record(doc: Document) -> dict:
+    return {
+        "type": "document",
+        "id": doc.id,
+        "filename": doc.filename,
+        "file_type": doc.file_type,
+        "file_size": doc.file_size,
+        "content_hash": doc.content_hash,
+        "chunk_count": doc.chunk_count,
+        "created_at": doc.created_at.isoformat() if doc.created_at else None,
+    }
+
+
+def _export_blocks(ws: Workspace, documents: list[Document]) -> Iterator[bytes]:
+    compressor = zlib.compressobj(settings.SNAPSHOT_COMPRESS_LEVEL, zlib.DEFLATED, _GZIP_WBITS)
+    doc_ids = {doc.id for doc in documents}
+    batches = iter_chunks(ws.id, include=["embeddings", "documents", "metadatas"])
+    batch = next(batches, None)
+
+    header = _record({
+        "type": "manifest",
+        "format": FORMAT_VERSION,
+        "embedding_model": settings.EMBEDDING_MODEL,
+        "dim": len(batch["embeddings"][0]) if batch else 0,
+        "workspace": {
+            "name": ws.name,
+            "description": ws.description,
+            "hnsw_m": ws.hnsw_m,
+            "hnsw_ef_construction": ws.hnsw_ef_construction,
+            "hnsw_ef_search": ws.hnsw_ef_search,
+        },
+    })
+    header += b"".join(_record(_document_record(doc)) for doc in documents)
+    yield compressor.compress(header)
+
+    chunk_total = 0
+    while batch is not None:
+        metas = [meta or {} for meta in batch["metadatas"]]
+        # Chunks of documents that are not ready (or no longer exist) stay behind
+        keep = [i for i, meta in enumerate(metas) if meta.get("doc_id") in doc_ids]
+        if keep:
+            vectors = np.asarray(batch["embeddings"], dtype=_FLOAT)[keep]
+            block = _record({
+                "type": "chunks",
+                "count": len(keep),
+                "doc_ids": [metas[i]["doc_id"] for i in keep],
+                "chunk_index": [metas[i].get("chunk_index", 0) for i in keep],
+                "texts": [batch["documents"][i] for i in keep],
+            }) + vectors.tobytes()
+            chunk_total += len(keep)
+            data = compressor.compress(block)
+            if data:
+                yield data
+        batch = next(batches, None)
+
+    yield compressor.compress(_record({"type": "end", "documents": len(documents), "chunks": chunk_total}))
+    yield compressor.flush()
+
+
+async def export_snapshot(ws: Workspace, documents: list[Document]) -> AsyncIterator[bytes]:
+    """Stream a workspace's documents and chunks as a gzip archive.
+
+    Chroma reads and compression run in a worker thread, one batch at a time.
+    """
+    blocks = _export_blocks(ws, documents)
+    while True:
+        data = await asyncio.to_thread(next, blocks, None)
+        if data is None:
+            break
+        if data:
+            yield data
+
+
+class SnapshotReader:
+    """Incremental archive parser: feed() compressed bytes, get back complete records.
+
+    A chunks record is returned once its embeddings have arrived, with them
+    attached as a (count, dim) float32 array under "embeddings".
+    """
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.dim: Optional[int] = None
+        self.size = 0
+        self._decompressor = zlib.decompressobj(_GZIP_WBITS)
+        self._buffer = bytearray()
+        self._pending: Optional[dict] = None
+
+    def feed(self, data: bytes) -> list[dict]:
+        records = []
+        while True:
+            # Bounded output per step, and never past the size limit, so a
+            # small, highly compressed input cannot expand in one go
+            step = min(_DECOMPRESS_STEP, self.max_bytes - self.size + 1)
+            try:
+                out = self._decompressor.decompress(data, step)
+            except zlib.error:
+                raise _invalid("not a gzip archive")
+            self.size += len(out)
+            if self.size > self.max_bytes:
+                raise HTTPException(status_code=400, detail=f"Snapshot too large. Max {settings.SNAPSHOT_MAX_MB}MB")
+            self._buffer += out
+            records.extend(self._parse())
+            data = self._decompressor.unconsumed_tail
+            if not data and len(out) < step:
+                return records
+
+    def _parse(self) -> list[dict]:
+        records = []
+        while True:
+            if self._pending is not None:
+                needed = self._pending["count"] * self.dim * _FLOAT.itemsize
+                if len(self._buffer) < needed:
+                    break
+                record, self._pending = self._pending, None
+                record["embeddings"] = np.frombuffer(bytes(self._buffer[:needed]), dtype=_FLOAT).reshape(-1, self.dim)
+                del self._buffer[:needed]
+                records.append(record)
+                continue
+
+            newline = self._buffer.find(b"\n")
+            if newline < 0:
+                if len(self._buffer) > _MAX_RECORD_BYTES:
+                    raise _invalid("record too long")
+                break
+            try:
+                record = json.loads(self._buffer[:newline])
+            except ValueError:
+                raise _invalid("malformed record")
+            del self._buffer[:newline + 1]
+            if not isinstance(record, dict) or "type" not in record:
+                raise _invalid("malformed record")
+
+            if record["type"] == "manifest":
+                self.dim = record.get("dim")
+                if not isinstance(self.dim, int) or self.dim < 0:
+                    raise _invalid("bad embedding dimension")
+            elif record["type"] == "chunks":
+                if self.dim is None:
+                    raise _invalid("chunks before manifest")
+                count = record.get("count")
+                if not isinstance(count, int) or count <= 0 or self.dim == 0 or any(
+                    len(record.get(key) or []) != count for key in ("doc_ids", "chunk_index", "texts")
+                ):
+                    raise _invalid("inconsistent chunk batch")
+                self._pending = record
+                continue
+            records.append(record)
+        return records
+
+    def finish(self):
+        if not self._decompressor.eof or self._pending is not None or self._buffer:
+            raise _invalid("archive is truncated")
+
+
+class _Importer:
+    """Applies archive records to a new workspace.
+
+    The workspace row is committed (status "importing") before any vectors
+    are loaded, and document rows before their chunks, so vector GC never
+    sees the new collection or its chunks as orphans.
+    """
+
+    def __init__(self, user: User, db: AsyncSession, name: Optional[str]):
+        self.user = user
+        self.db = db
+        self.name = name
+        self.workspace: Optional[Workspace] = None
+        self.hnsw_params: Optional[dict] = None
+        self.documents: dict[str, Document] = {}  # archived doc id -> new row
+        self._unsaved: list[Document] = []
+        self.chunks = 0
+        self.ended = False
+
+    async def apply(self, record: dict):
+        kind = record["type"]
+        if self.ended:
+            raise _invalid("data after end record")
+        if self.workspace is None and kind != "manifest":
+            raise _invalid("missing manifest")
+        if kind == "manifest":
+            await self._manifest(record)
+        elif kind == "document":
+            self._document(record)
+        elif kind == "chunks":
+            await self._save_documents()
+            await self._chunks(record)
+        elif kind == "end":
+            if record.get("documents") != len(self.documents) or record.get("chunks") != self.chunks:
+                raise _invalid("record counts do not match the end record")
+            await self._save_documents()
+            self.ended = True
+        else:
+            raise _invalid(f"unknown record type {kind!r}")
+
+    async def _manifest(self, record: dict):
+        if self.workspace is not None:
+            raise _invalid("duplicate manifest")
+        if record.get("format") != FORMAT_VERSION:
+            raise _invalid(f"unsupported format {record.get('format')!r}")
+        model = record.get("embedding_model")
+        if model != settings.EMBEDDING_MODEL:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Snapshot was embedded with '{model}', this server uses '{settings.EMBEDDING_MODEL}'",
+            )
+        meta = record.get("workspace") or {}
+        ws = Workspace(
+            user_id=self.user.id,
+            name=self.name or meta.get("name") or "Imported workspace",
+            description=meta.get("description"),
+            hnsw_m=meta.get("hnsw_m"),
+            hnsw_ef_construction=meta.get("hnsw_ef_construction"),
+            hnsw_ef_search=meta.get("hnsw_ef_search"),
+            status=IMPORTING,
+        )
+        self.db.add(ws)
+        await self.db.commit()
+        self.workspace = ws
+        self.hnsw_params = hnsw_metadata(ws.hnsw_m, ws.hnsw_ef_construction, ws.hnsw_ef_search)
+
+    def _document(self, record: dict):
+        if self.chunks:
+            raise _invalid("document after chunks")
+        try:
+            created_at = datetime.fromisoformat(record["created_at"]) if record.get("created_at") else None
+            doc = Document(
+                id=str(uuid.uuid4()),
+                workspace_id=self.workspace.id,
+                user_id=self.user.id,
+                filename=str(record["filename"]),
+                file_type=str(record["file_type"]),
+                file_size=record.get("file_size"),
+                content_hash=record.get("content_hash"),
+                chunk_count=record.get("chunk_count") or 0,
+                status="processing",
+                created_at=created_at,
+            )
+        except (KeyError, TypeError, ValueError):
+            raise _invalid("malformed document record")
+        archived_id = str(record.get("id"))
+        if archived_id in self.documents:
+            raise _invalid(f"duplicate document {archived_id!r}")
+        self.documents[archived_id] = doc
+        self._unsaved.append(doc)
+
+    async def _save_documents(self):
+        if self._unsaved:
+            self.db.add_all(self._unsaved)
+            await self.db.commit()
+            self._unsaved = []
+
+    async def _chunks(self, record: dict):
+        ids, metadatas = [], []
+        for doc_id, index in zip(record["doc_ids"], record["chunk_index"]):
+            doc = self.documents.get(doc_id)
+            if doc is None:
+                raise _invalid(f"chunk of unknown document {doc_id!r}")
+            ids.append(chunk_id(doc.id, index))
+            metadatas.append({
+                **chunk_metadata(doc.id, doc.filename, doc.file_type, doc.created_at),
+                "chunk_index": index,
+            })
+        await asyncio.to_thread(
+            add_embeddings,
+            self.workspace.id, ids, record["embeddings"].tolist(), record["texts"], metadatas, self.hnsw_params,
+        )
+        self.chunks += len(ids)
+
+    async def finish(self):
+        stored = await asyncio.to_thread(stored_chunk_count, self.workspace.id)
+        if stored != self.chunks:
+            raise HTTPException(
+                status_code=500,
+                detail=f"Snapshot import stored {stored} of {self.chunks} chunks; try again",
+            )
+        await self.db.execute(
+            update(Document).where(Document.workspace_id == self.workspace.id).values(status="ready")
+        )
+        self.workspace.status = None
+        self.user.total_docs = (self.user.total_docs or 0) + len(self.documents)
+        await self.db.commit()
+
+
+async def _discard_workspace(db: AsyncSession, workspace_id: str):
+    """Remove a failed import: vectors first, then its rows."""
+    await asyncio.to_thread(drop_collection, workspace_id)
+    await db.execute(delete(Document).where(Document.workspace_id == workspace_id))
+    await db.execute(delete(Workspace).where(Workspace.id == workspace_id))
+    await db.commit()
+
+
+async def import_snapshot(
+    stream: AsyncIterator[bytes],
+    user: User,
+    db: AsyncSession,
+    name: Optional[str] = None,
+) -> tuple[Workspace, int, int]:
+    """Create a workspace from a streamed archive; returns (workspace, documents, chunks).
+
+    Chunks are loaded as their batches arrive. The workspace stays hidden
+    (status "importing") until the whole archive has been read and every
+    chunk is confirmed stored; a failed import removes it again.
+    """
+    reader = SnapshotReader(settings.SNAPSHOT_MAX_MB * 1024 * 1024)
+    importer = _Importer(user, db, name)
+    try:
+        async for data in stream:
+            for record in reader.feed(data):
+                await importer.apply(record)
+        reader.finish()
+        if not importer.ended:
+            raise _invalid("archive is truncated")
+        await importer.finish()
+    except BaseException:
+        if importer.workspace is not None:
+            await db.rollback()
+            await _discard_workspace(db, importer.workspace.id)
+        raise
+
+    logger.info(
+        f"Imported workspace {importer.workspace.id} "
+        f"({len(importer.documents)} documents, {importer.chunks} chunks)"
+    )
+    return importer.workspace, len(importer.documents), importer.chunks
+
+
+async def clear_failed_imports():
+    """Remove workspaces left half-imported by a previous process."""
+    from app.core.database import AsyncSessionLocal
+    async with AsyncSessionLocal() as db:
+        result = await db.execute(select(Workspace.id).where(Workspace.status == IMPORTING))
+        for workspace_id in result.scalars().all():
+            logger.warning(f"Removing interrupted snapshot import {workspace_id}")
+            await _discard_workspace(db, workspace_id)
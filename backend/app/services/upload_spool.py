@@ -0,0 +1,225 @@
+"""Stream multipart uploads straight to a spool file on disk.
+
+The request body is parsed incrementally as it arrives, so the file is never
+held in memory and an oversized upload is rejected as soon as it crosses
+MAX_FILE_SIZE_MB instead of after it has been received in full. Data is
+written in UPLOAD_SPOOL_CHUNK_KB blocks and hashed (SHA-256) on the way.
+
+Spool files belong to the caller, which must remove them with discard()
+once processing is done.
+"""
+import asyncio
+import hashlib
+import logging
+import os
+import time
+import uuid
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Optional
+from fastapi import HTTPException, Request
+from python_multipart.multipart import MultipartParser, parse_options_header
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+SPOOL_SUFFIX = ".upload"
+# Spool files this old cannot belong to an upload still being processed
+SPOOL_STALE_SECONDS = 3600
+# Allowance for multipart boundaries and part headers when checking Content-Length
+_MULTIPART_OVERHEAD = 64 * 1024
+
+
+@dataclass
+class SpooledFile:
+    path: Path
+    filename: str
+    size: int
+    sha256: str
+
+
+def file_extension(filename: str) -> str:
+    return filename.rsplit(".", 1)[-1].lower() if "." in filename else ""
+
+
+def _too_large() -> HTTPException:
+    return HTTPException(status_code=400, detail=f"File too large. Max {settings.MAX_FILE_SIZE_MB}MB")
+
+
+def _spool_dir() -> Path:
+    path = Path(settings.UPLOAD_SPOOL_DIR)
+    path.mkdir(parents=True, exist_ok=True)
+    return path
+
+
+def discard(path: Optional[Path]):
+    if path is None:
+        return
+    try:
+        os.unlink(path)
+    except FileNotFoundError:
+        pass
+    except OSError as e:
+        logger.warning(f"Could not remove spool file {path}: {e}")
+
+
+def clear_spool():
+    """Remove stale spool files left behind by a crashed process."""
+    spool = Path(settings.UPLOAD_SPOOL_DIR)
+    if not spool.is_dir():
+        return
+    cutoff = time.time() - SPOOL_STALE_SECONDS
+    for entry in spool.glob(f"*{SPOOL_SUFFIX}"):
+        try:
+            if entry.stat().st_mtime < cutoff:
+                discard(entry)
+        except FileNotFoundError:
+            pass
+
+
+class _Spooler:
+    """Receives multipart parser callbacks and writes the file part to disk."""
+
+    def __init__(self, field: str, max_bytes: int, allowed_extensions: Optional[list[str]]):
+        self.field = field
+        self.max_bytes = max_bytes
+        self.allowed_extensions = allowed_extensions
+        self.chunk_size = settings.UPLOAD_SPOOL_CHUNK_KB * 1024
+        self.events: list[tuple[str, bytes]] = []
+        self._header_field = b""
+        self._header_value = b""
+        self._disposition = b""
+
+        self.path: Optional[Path] = None
+        self.filename: Optional[str] = None
+        self.size = 0
+        self._hash = hashlib.sha256()
+        self._buffer = bytearray()
+        self._fh = None
+        self._in_file = False
+
+    def callbacks(self) -> dict:
+        return {
+            "on_part_begin": self._on_part_begin,
+            "on_header_field": self._on_header_field,
+            "on_header_value": self._on_header_value,
+            "on_header_end": self._on_header_end,
+            "on_headers_finished": self._on_headers_finished,
+            "on_part_data": self._on_part_data,
+            "on_part_end": self._on_part_end,
+        }
+
+    # Parser callbacks run synchronously inside parser.write(); they only
+    # record events, which are applied (with async disk writes) afterwards.
+    def _on_part_begin(self):
+        self._disposition = b""
+
+    def _on_header_field(self, data: bytes, start: int, end: int):
+        self._header_field += data[start:end]
+
+    def _on_header_value(self, data: bytes, start: int, end: int):
+        self._header_value += data[start:end]
+
+    def _on_header_end(self):
+        if self._header_field.lower() == b"content-disposition":
+            self._disposition = self._header_value
+        self._header_field = b""
+        self._header_value = b""
+
+    def _on_headers_finished(self):
+        self.events.append(("headers", self._disposition))
+
+    def _on_part_data(self, data: bytes, start: int, end: int):
+        self.events.append(("data", data[start:end]))
+
+    def _on_part_end(self):
+        self.events.append(("end", b""))
+
+    async def apply_events(self):
+        events, self.events = self.events, []
+        for kind, payload in events:
+            if kind == "headers":
+                _, options = parse_options_header(payload)
+                name = options.get(b"name", b"").decode("utf-8", errors="replace")
+                filename = options.get(b"filename")
+                self._in_file = name == self.field and filename is not None and self._fh is None
+                if self._in_file:
+                    self.filename = filename.decode("utf-8", errors="replace")
+                    ext = file_extension(self.filename)
+                    if self.allowed_extensions is not None and ext not in self.allowed_extensions:
+                        raise HTTPException(
+                            status_code=400,
+                            detail=f"File type .{ext} not allowed. Allowed: {self.allowed_extensions}",
+                        )
+                    self.path = _spool_dir() / f"{uuid.uuid4().hex}{SPOOL_SUFFIX}"
+                    self._fh = await asyncio.to_thread(open, self.path, "wb")
+            elif kind == "data" and self._in_file:
+                self.size += len(payload)
+                if self.size > self.max_bytes:
+                    raise _too_large()
+                self._hash.update(payload)
+                self._buffer += payload
+                if len(self._buffer) >= self.chunk_size:
+                    await self._flush()
+            elif kind == "end" and self._in_file:
+                await self._flush()
+                self._in_file = False
+
+    async def _flush(self):
+        if self._buffer:
+            block, self._buffer = bytes(self._buffer), bytearray()
+            await asyncio.to_thread(self._fh.write, block)
+
+    async def close(self):
+        if self._fh is not None:
+            await asyncio.to_thread(self._fh.close)
+            self._fh = None
+
+    @property
+    def sha256(self) -> str:
+        return self._hash.hexdigest()
+
+
+async def spool_upload(
+    request: Request,
+    field: str = "file",
+    allowed_extensions: Optional[list[str]] = None,
+) -> SpooledFile:
+    """Stream the `field` file part of a multipart request to the spool directory.
+
+    The extension is checked as soon as the part headers arrive, before any
+    file data is read.
+    """
+    max_bytes = settings.MAX_FILE_SIZE_MB * 1024 * 1024
+    content_length = request.headers.get("content-length")
+    if content_length and content_length.isdigit() and int(content_length) > max_bytes + _MULTIPART_OVERHEAD:
+        raise _too_large()
+
+    content_type, params = parse_options_header(request.headers.get("content-type", ""))
+    boundary = params.get(b"boundary")
+    if content_type != b"multipart/form-data" or not boundary:
+        raise HTTPException(status_code=400, detail="Expected a multipart/form-data upload")
+
+    spooler = _Spooler(field, max_bytes, allowed_extensions)
+    parser = MultipartParser(boundary, spooler.callbacks())
+    try:
+        async for chunk in request.stream():
+            if chunk:
+                parser.write(chunk)
+                await spooler.apply_events()
+        parser.finalize()
+        await spooler.apply_events()
+        await spooler.close()
+    except HTTPException:
+        await spooler.close()
+        discard(spooler.path)
+        raise
+    except Exception as e:
+        await spooler.close()
+        discard(spooler.path)
+        logger.warning(f"Malformed upload: {e}")
+        raise HTTPException(status_code=400, detail="Malformed multipart upload")
+
+    if spooler.path is None:
+        raise HTTPException(status_code=400, detail=f"No '{field}' file in upload")
+    return SpooledFile(path=spooler.path, filename=spooler.filename, size=spooler.size, sha256=spooler.sha256)
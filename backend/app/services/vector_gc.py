@@ -0,0 +1,355 @@
+"""Garbage collection and compaction for the Chroma vector store.
+
+Reconciles Chroma against the SQL catalog:
+  - drops collections whose workspace no longer exists (and leftover rebuilds)
+  - restores a workspace's collection from its rebuild copy if a rebuild died mid-swap
+  - deletes chunks whose Document row no longer exists
+  - deletes Document rows whose workspace no longer exists
+  - rebuilds collections with many deleted chunks, since HNSW only tombstones them
+  - removes segment directories Chroma no longer references
+  - backfills filter metadata (file_type, created_at) on chunks ingested before it existed
+    (also done once per workspace at startup and before its first filtered query)
+
+Runs on a schedule (GC_INTERVAL_MINUTES) or on demand:
+
+    python -m app.services.vector_gc [--dry-run] [--no-compact]
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import shutil
+import sqlite3
+import time
+from pathlib import Path
+from sqlalchemy import select, delete, update
+from app.core.config import settings
+from app.core.database import AsyncSessionLocal, Workspace, Document, init_db
+from app.core.metrics import (
+    GC_RUNS,
+    GC_RECLAIMED_BYTES,
+    GC_DROPPED_COLLECTIONS,
+    GC_DELETED_CHUNKS,
+    GC_COMPACTIONS,
+)
+from app.services.vector_store import (
+    COLLECTION_PREFIX,
+    REBUILD_SUFFIX,
+    RETIRED_SUFFIX,
+    _collection_name,
+    chunk_ids_by_doc,
+    chunk_metadata,
+    delete_chunk_ids,
+    drop_collection_by_name,
+    drop_leftover_collection,
+    get_chroma_client,
+    get_workspace_doc_count,
+    hnsw_metadata,
+    list_collection_names,
+    rebuild_collection,
+    restore_collection,
+    update_chunk_metadata,
+)
+
+logger = logging.getLogger(__name__)
+
+_gc_lock = asyncio.Lock()
+_backfill_locks: dict[str, asyncio.Lock] = {}
+
+
+def _dir_size(path: str) -> int:
+    total = 0
+    for root, _, files in os.walk(path):
+        for f in files:
+            try:
+                total += os.path.getsize(os.path.join(root, f))
+            except OSError:
+                pass
+    return total
+
+
+def _referenced_segment_ids() -> set[str]:
+    db_path = Path(settings.CHROMA_PERSIST_DIR) / "chroma.sqlite3"
+    if not db_path.exists():
+        return set()
+    conn = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
+    try:
+        return {row[0] for row in conn.execute("SELECT id FROM segments")}
+    finally:
+        conn.close()
+
+
+def _sweep_segment_dirs(dry_run: bool) -> list[str]:
+    """Remove HNSW segment directories that no collection references.
+
+    Chroma only deletes a segment's files if it is loaded in the current
+    process, so dropped collections can leave their index files behind.
+    """
+    get_chroma_client()  # make sure the sysdb exists before reading it
+    # Segment directories are named by their UUID. List them before reading
+    # the sysdb so a collection created mid-sweep is never seen as orphaned.
+    candidates = [
+        entry for entry in Path(settings.CHROMA_PERSIST_DIR).iterdir()
+        if entry.is_dir() and len(entry.name) == 36 and entry.name.count("-") == 4
+    ]
+    referenced = _referenced_segment_ids()
+    removed = []
+    for entry in candidates:
+        if entry.name in referenced:
+            continue
+        removed.append(entry.name)
+        if not dry_run:
+            shutil.rmtree(entry, ignore_errors=True)
+    return removed
+
+
+def _scan_vectors() -> dict[str, dict]:
+    """Map collection name -> {workspace_id, chunk ids by doc_id, chunks lacking filter metadata}.
+
+    Collections left by a rebuild (-rb, -old) are listed with workspace_id None
+    and leftover set to the name of the workspace collection they belong to.
+    """
+    scan = {}
+    for name in list_collection_names():
+        if not name.startswith(COLLECTION_PREFIX):
+            continue
+        suffix = next((s for s in (REBUILD_SUFFIX, RETIRED_SUFFIX) if name.endswith(s)), None)
+        if suffix:
+            scan[name] = {"workspace_id": None, "leftover": name[:-len(suffix)], "docs": {}, "legacy": {}}
+            continue
+        workspace_id = name[len(COLLECTION_PREFIX):]
+        docs, legacy = chunk_ids_by_doc(workspace_id, missing_key="file_type")
+        scan[name] = {"workspace_id": workspace_id, "leftover": None, "docs": docs, "legacy": legacy}
+    return scan
+
+
+def _apply_plan(plan: dict, compact_candidates: dict[str, dict], dry_run: bool) -> dict:
+    """Synchronous Chroma side of a GC run (executed in a worker thread)."""
+    restored = []
+    for workspace_id, name in plan["restore"]:
+        if dry_run or restore_collection(workspace_id, name):
+            restored.append(name)
+
+    removed = {ws: len(ids) for ws, ids in plan["stale"].items()}
+    if not dry_run:
+        for name in plan["drop"]:
+            if name in plan["leftovers"]:
+                drop_leftover_collection(name, plan["leftovers"][name])
+            else:
+                drop_collection_by_name(name, name[len(COLLECTION_PREFIX):])
+        for workspace_id, ids in plan["stale"].items():
+            removed[workspace_id] = delete_chunk_ids(workspace_id, ids)
+        for workspace_id, ids, metadata in plan["backfill"]:
+            update_chunk_metadata(workspace_id, ids, metadata)
+
+    compacted = []
+    for workspace_id, info in compact_candidates.items():
+        deleted = info["deleted"] + removed.get(workspace_id, 0)
+        live = get_workspace_doc_count(workspace_id)
+        if deleted < settings.GC_COMPACT_MIN_DELETED or live + deleted == 0:
+            continue
+        if deleted / (live + deleted) < settings.GC_COMPACT_RATIO:
+            continue
+        compacted.append(workspace_id)
+        if not dry_run:
+            rebuild_collection(workspace_id, info["metadata"])
+
+    return {
+        "dropped_collections": plan["drop"],
+        "restored_collections": restored,
+        "deleted_chunks": removed,
+        "compacted": compacted,
+        "backfilled_chunks": sum(len(ids) for _, ids, _ in plan["backfill"]),
+        "swept_segments": _sweep_segment_dirs(dry_run),
+    }
+
+
+async def run_gc(compact: bool = True, dry_run: bool = False) -> dict:
+    """Run one GC/compaction pass and return a report."""
+    async with _gc_lock:
+        start = time.perf_counter()
+        before = await asyncio.to_thread(_dir_size, settings.CHROMA_PERSIST_DIR)
+
+        # Scan Chroma before reading SQL: a workspace or document row always
+        # exists before its vectors do, so anything created during the run
+        # is visible in the catalog and never mistaken for an orphan.
+        scan = await asyncio.to_thread(_scan_vectors)
+
+        async with AsyncSessionLocal() as db:
+            workspaces = (await db.execute(select(Workspace))).scalars().all()
+            live_docs: dict[str, set[str]] = {ws.id: set() for ws in workspaces}
+            orphan_rows = 0
+            for doc_id, workspace_id in (await db.execute(select(Document.id, Document.workspace_id))).all():
+                if workspace_id in live_docs:
+                    live_docs[workspace_id].add(doc_id)
+                else:
+                    orphan_rows += 1
+            if orphan_rows and not dry_run:
+                await db.execute(delete(Document).where(Document.workspace_id.not_in(list(live_docs))))
+                await db.commit()
+
+            compact_candidates = {}
+            if compact:
+                compact_candidates = {
+                    ws.id: {
+                        "deleted": ws.deleted_chunks or 0,
+                        "metadata": hnsw_metadata(ws.hnsw_m, ws.hnsw_ef_construction, ws.hnsw_ef_search),
+                    }
+                    for ws in workspaces
+                }
+
+        plan = {"drop": [], "restore": [], "leftovers": {}, "stale": {}, "backfill": []}
+        # Leftover collections are named after a truncated workspace collection name
+        leftover_owner = {_collection_name(ws)[:59]: ws for ws in live_docs}
+        restorable: dict[str, list[str]] = {}
+        legacy_docs = {}
+        for name, entry in scan.items():
+            if entry["leftover"]:
+                workspace_id = leftover_owner.get(entry["leftover"])
+                if workspace_id is not None and _collection_name(workspace_id) not in scan:
+                    # A rebuild died mid-swap: this is the only copy of the workspace's vectors
+                    restorable.setdefault(workspace_id, []).append(name)
+                else:
+                    plan["drop"].append(name)
+                    plan["leftovers"][name] = workspace_id
+                continue
+            workspace_id = entry["workspace_id"]
+            if workspace_id is None or workspace_id not in live_docs or _collection_name(workspace_id) != name:
+                plan["drop"].append(name)
+                continue
+            stale = [
+                chunk_id
+                for doc_id, ids in entry["docs"].items()
+                if doc_id not in live_docs[workspace_id]
+                for chunk_id in ids
+            ]
+            if stale:
+                plan["stale"][workspace_id] = stale
+            for doc_id, ids in entry["legacy"].items():
+                if doc_id in live_docs[workspace_id]:
+                    legacy_docs[doc_id] = (workspace_id, ids)
+
+        for workspace_id, names in restorable.items():
+            # Prefer the rebuilt copy; the retired original is then redundant
+            names.sort(key=lambda name: not name.endswith(REBUILD_SUFFIX))
+            plan["restore"].append((workspace_id, names[0]))
+            for name in names[1:]:
+                plan["drop"].append(name)
+                plan["leftovers"][name] = workspace_id
+
+        if legacy_docs:
+            async with AsyncSessionLocal() as db:
+                result = await db.execute(select(Document).where(Document.id.in_(list(legacy_docs))))
+                for doc in result.scalars().all():
+                    workspace_id, ids = legacy_docs[doc.id]
+                    plan["backfill"].append(
+                        (workspace_id, ids, chunk_metadata(doc.id, doc.filename, doc.file_type, doc.created_at))
+                    )
+
+        report = await asyncio.to_thread(_apply_plan, plan, compact_candidates, dry_run)
+
+        if report["compacted"] and not dry_run:
+            async with AsyncSessionLocal() as db:
+                for workspace_id in report["compacted"]:
+                    # Subtract what was read before the rebuild, keeping deletes made since
+                    await db.execute(
+                        update(Workspace)
+                        .where(Workspace.id == workspace_id)
+                        .values(deleted_chunks=Workspace.deleted_chunks - compact_candidates[workspace_id]["deleted"])
+                    )
+                await db.commit()
+
+        after = await asyncio.to_thread(_dir_size, settings.CHROMA_PERSIST_DIR)
+        reclaimed = max(0, before - after)
+        report.update({
+            "dry_run": dry_run,
+            "orphan_document_rows": orphan_rows,
+            "bytes_before": before,
+            "bytes_after": after,
+            "reclaimed_bytes": reclaimed,
+            "duration_s": round(time.perf_counter() - start, 3),
+        })
+
+        if not dry_run:
+            GC_RUNS.inc()
+            GC_RECLAIMED_BYTES.inc(reclaimed)
+            GC_DROPPED_COLLECTIONS.inc(len(report["dropped_collections"]))
+            GC_DELETED_CHUNKS.inc(sum(report["deleted_chunks"].values()))
+            GC_COMPACTIONS.inc(len(report["compacted"]))
+        logger.info(
+            f"Vector GC: dropped {len(report['dropped_collections'])} collections, "
+            f"restored {len(report['restored_collections'])}, "
+            f"deleted {sum(report['deleted_chunks'].values())} chunks, "
+            f"compacted {len(report['compacted'])}, reclaimed {reclaimed} bytes"
+        )
+        return report
+
+
+async def backfill_filter_metadata(workspace_id: str) -> int:
+    """Add file_type/created_at to chunks a workspace stored before filters existed.
+
+    Runs once per workspace (the Workspace row records it) and returns the
+    number of chunks updated. Filtered queries call this first, so legacy
+    chunks are never silently left out of their results.
+    """
+    async with _backfill_locks.setdefault(workspace_id, asyncio.Lock()):
+        async with AsyncSessionLocal() as db:
+            ws = await db.get(Workspace, workspace_id)
+            if ws is None or ws.filters_backfilled:
+                return 0
+            _, legacy = await asyncio.to_thread(chunk_ids_by_doc, workspace_id, "file_type")
+            backfilled = 0
+            if legacy:
+                result = await db.execute(select(Document).where(Document.id.in_(list(legacy))))
+                for doc in result.scalars().all():
+                    metadata = chunk_metadata(doc.id, doc.filename, doc.file_type, doc.created_at)
+                    await asyncio.to_thread(update_chunk_metadata, workspace_id, legacy[doc.id], metadata)
+                    backfilled += len(legacy[doc.id])
+            ws.filters_backfilled = True
+            await db.commit()
+    if backfilled:
+        logger.info(f"Backfilled filter metadata on {backfilled} chunks in workspace {workspace_id}")
+    return backfilled
+
+
+async def backfill_all_filter_metadata():
+    """Startup task: backfill every workspace that predates filter metadata."""
+    async with AsyncSessionLocal() as db:
+        result = await db.execute(select(Workspace.id).where(Workspace.filters_backfilled.is_not(True)))
+        workspace_ids = result.scalars().all()
+    for workspace_id in workspace_ids:
+        try:
+            await backfill_filter_metadata(workspace_id)
+        except Exception as e:
+            logger.error(f"Filter metadata backfill failed for workspace {workspace_id}: {e}")
+
+
+async def gc_loop():
+    """Scheduled GC, started from the app lifespan when GC_INTERVAL_MINUTES > 0."""
+    interval = settings.GC_INTERVAL_MINUTES * 60
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            await run_gc()
+        except Exception as e:
+            logger.error(f"Vector GC failed: {e}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Vector-store garbage collection")
+    parser.add_argument("--dry-run", action="store_true", help="report what would be removed")
+    parser.add_argument("--no-compact", action="store_true", help="skip index rebuilds")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+
+    async def _run():
+        await init_db()
+        return await run_gc(compact=not args.no_compact, dry_run=args.dry_run)
+
+    report = asyncio.run(_run())
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
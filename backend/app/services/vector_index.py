@@ -0,0 +1,338 @@
+"""Search indexes behind the vector store.
+
+Chroma is the system of record for every workspace. Searching it goes through
+its SQLite-backed segment machinery on every call, which dominates latency
+for small collections. NumpyIndex is an in-process alternative: vectors live
+in one contiguous float32 matrix, and searches are batched matrix multiplies.
+The search is exact (flat) for small workspaces. Larger ones use an
+inverted-file (IVF) layout that probes only the clusters nearest the query.
+
+Both implement VectorIndex; vector_store picks one per workspace by size.
+"""
+import math
+import threading
+from abc import ABC, abstractmethod
+from typing import Optional
+import numpy as np
+
+
+class UnsupportedFilter(Exception):
+    """The where clause uses operators the native index does not evaluate."""
+
+
+def make_hit(text: str, meta: Optional[dict], score: float) -> dict:
+    meta = meta or {}
+    return {
+        "text": text,
+        "filename": meta.get("filename", "unknown"),
+        "doc_id": meta.get("doc_id", ""),
+        "chunk_index": meta.get("chunk_index", 0),
+        "score": round(score, 4),
+    }
+
+
+class VectorIndex(ABC):
+    """Nearest-neighbour index over one workspace's chunks (cosine similarity)."""
+
+    kind = "base"
+
+    @abstractmethod
+    def __len__(self) -> int:
+        ...
+
+    @abstractmethod
+    def add(self, ids: list[str], embeddings: list[list[float]], documents: list[str], metadatas: list[dict]):
+        ...
+
+    @abstractmethod
+    def delete(self, ids: list[str]):
+        ...
+
+    @abstractmethod
+    def search(
+        self,
+        query_embeddings: list[list[float]],
+        n_results: int,
+        where: Optional[dict] = None,
+    ) -> list[list[dict]]:
+        """Return one list of hits per query, best first."""
+
+
+class ChromaIndex(VectorIndex):
+    """HNSW search through a Chroma collection."""
+
+    kind = "chroma"
+
+    def __init__(self, collection):
+        self.collection = collection
+
+    def __len__(self) -> int:
+        return self.collection.count()
+
+    def add(self, ids, embeddings, documents, metadatas):
+        self.collection.add(ids=ids, embeddings=embeddings, documents=documents, metadatas=metadatas)
+
+    def delete(self, ids):
+        self.collection.delete(ids=ids)
+
+    def search(self, query_embeddings, n_results, where=None):
+        empty = [[] for _ in query_embeddings]
+        results = self.collection.query(
+            query_embeddings=query_embeddings,
+            n_results=n_results,
+            where=where,
+            include=["documents", "metadatas", "distances"],
+        )
+        return [
+            [make_hit(doc, meta, 1 - dist) for doc, meta, dist in zip(docs, metas, dists)]
+            for docs, metas, dists in zip(
+                results["documents"] or empty,
+                results["metadatas"] or empty,
+                results["distances"] or empty,
+            )
+        ]
+
+
+def _normalize(matrix: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+def _top_k(scores: np.ndarray, k: int) -> np.ndarray:
+    """Indices of the k largest scores, in descending order."""
+    if k >= scores.shape[0]:
+        return np.argsort(-scores)
+    part = np.argpartition(-scores, k - 1)[:k]
+    return part[np.argsort(-scores[part])]
+
+
+def _train_centroids(vectors: np.ndarray, n_lists: int, iterations: int = 10, seed: int = 0) -> np.ndarray:
+    """Spherical k-means on (a sample of) the unit-normalized vectors."""
+    rng = np.random.default_rng(seed)
+    sample = vectors
+    if len(vectors) > n_lists * 256:
+        sample = vectors[rng.choice(len(vectors), n_lists * 256, replace=False)]
+    centroids = sample[rng.choice(len(sample), n_lists, replace=False)].copy()
+    for _ in range(iterations):
+        assign = np.argmax(sample @ centroids.T, axis=1)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assign, sample)
+        empty = np.bincount(assign, minlength=n_lists) == 0
+        if empty.any():
+            # Re-seed empty lists so every list stays useful
+            sums[empty] = sample[rng.choice(len(sample), int(empty.sum()), replace=False)]
+        centroids = _normalize(sums)
+    return centroids.astype(np.float32)
+
+
+class NumpyIndex(VectorIndex):
+    """In-memory exact or IVF search over a contiguous float32 matrix.
+
+    Rows are unit-normalized on insert, so the inner product is the cosine
+    similarity and scores match Chroma's (1 - cosine distance). Metadata
+    filters built by vector_store.build_where are evaluated as boolean masks
+    before scoring; filtered searches are always exact.
+    """
+
+    def __init__(self, ivf_min_rows: int, nprobe: int, dim: int = 0):
+        self.dim = dim
+        self.ivf_min_rows = ivf_min_rows
+        self.nprobe = nprobe
+        self._lock = threading.Lock()
+        self._size = 0
+        self._vectors = np.empty((0, dim), dtype=np.float32)
+        # Per-row filter columns: doc_id / file_type as integer codes, created_at as epoch seconds
+        self._doc_codes = np.empty(0, dtype=np.int32)
+        self._type_codes = np.empty(0, dtype=np.int32)
+        self._created = np.empty(0, dtype=np.int64)
+        self._has_created = np.empty(0, dtype=bool)
+        self._codes: dict[str, int] = {}
+        self.ids: list[str] = []
+        self.documents: list[str] = []
+        self.metadatas: list[dict] = []
+        self._rows: dict[str, int] = {}
+        # IVF state
+        self._centroids: Optional[np.ndarray] = None
+        self._assign = np.empty(0, dtype=np.int32)
+        self._trained_rows = 0
+
+    @property
+    def kind(self) -> str:
+        return "ivf" if self._centroids is not None else "flat"
+
+    @property
+    def nbytes(self) -> int:
+        columns = (self._doc_codes, self._type_codes, self._created, self._has_created, self._assign)
+        text_bytes = sum(len(d) for d in self.documents)
+        return self._vectors.nbytes + sum(c.nbytes for c in columns) + text_bytes
+
+    def __len__(self) -> int:
+        return self._size
+
+    def _code(self, value) -> int:
+        if value is None:
+            return -1
+        return self._codes.setdefault(str(value), len(self._codes))
+
+    def _reserve(self, extra: int):
+        needed = self._size + extra
+        capacity = self._vectors.shape[0]
+        if needed <= capacity:
+            return
+        capacity = max(needed, capacity * 2, 256)
+        # Grow geometrically so appends stay amortized O(1) per row
+        vectors = np.empty((capacity, self.dim), dtype=np.float32)
+        vectors[:self._size] = self._vectors[:self._size]
+        self._vectors = vectors
+        for name, dtype in (
+            ("_doc_codes", np.int32), ("_type_codes", np.int32),
+            ("_created", np.int64), ("_has_created", bool), ("_assign", np.int32),
+        ):
+            column = np.empty(capacity, dtype=dtype)
+            column[:self._size] = getattr(self, name)[:self._size]
+            setattr(self, name, column)
+
+    def add(self, ids, embeddings, documents, metadatas, train: bool = True):
+        """Append rows. With train=False, IVF training is left to a later maybe_train()."""
+        if not ids:
+            return
+        vectors = _normalize(np.asarray(embeddings, dtype=np.float32))
+        with self._lock:
+            if self._size == 0 and self.dim != vectors.shape[1]:
+                self.dim = vectors.shape[1]
+                self._vectors = np.empty((0, self.dim), dtype=np.float32)
+            start = self._size
+            self._reserve(len(ids))
+            end = start + len(ids)
+            self._vectors[start:end] = vectors
+            for i, meta in enumerate(metadatas):
+                meta = meta or {}
+                row = start + i
+                self._doc_codes[row] = self._code(meta.get("doc_id"))
+                self._type_codes[row] = self._code(meta.get("file_type"))
+                created = meta.get("created_at")
+                self._has_created[row] = created is not None
+                self._created[row] = created if created is not None else 0
+            for i, chunk_id in enumerate(ids):
+                self._rows[chunk_id] = start + i
+            self.ids.extend(ids)
+            self.documents.extend(documents)
+            self.metadatas.extend(metadatas)
+            if self._centroids is not None:
+                self._assign[start:end] = np.argmax(vectors @ self._centroids.T, axis=1)
+            self._size = end
+            if train:
+                self._maybe_train()
+
+    def delete(self, ids):
+        with self._lock:
+            rows = [self._rows[i] for i in ids if i in self._rows]
+            if not rows:
+                return
+            keep = np.ones(self._size, dtype=bool)
+            keep[rows] = False
+            self._vectors = np.ascontiguousarray(self._vectors[:self._size][keep])
+            self._doc_codes = self._doc_codes[:self._size][keep]
+            self._type_codes = self._type_codes[:self._size][keep]
+            self._created = self._created[:self._size][keep]
+            self._has_created = self._has_created[:self._size][keep]
+            self._assign = self._assign[:self._size][keep]
+            kept = np.flatnonzero(keep)
+            self.ids = [self.ids[i] for i in kept]
+            self.documents = [self.documents[i] for i in kept]
+            self.metadatas = [self.metadatas[i] for i in kept]
+            self._rows = {chunk_id: row for row, chunk_id in enumerate(self.ids)}
+            self._size = len(self.ids)
+            if self._size < self.ivf_min_rows:
+                self._centroids = None
+
+    def maybe_train(self):
+        with self._lock:
+            self._maybe_train()
+
+    def _maybe_train(self):
+        # (Re)train when crossing the IVF threshold and whenever the index has
+        # doubled since the last training, so lists stay balanced as it grows.
+        if self._size < self.ivf_min_rows:
+            return
+        if self._centroids is not None and self._size < 2 * self._trained_rows:
+            return
+        vectors = self._vectors[:self._size]
+        n_lists = max(8, int(math.sqrt(self._size)))
+        centroids = _train_centroids(vectors, n_lists)
+        # New array rather than an in-place rewrite: searches running outside
+        # the lock hold the old centroids together with the old assignments.
+        assign = np.empty(self._assign.shape[0], dtype=np.int32)
+        assign[:self._size] = np.argmax(vectors @ centroids.T, axis=1)
+        self._centroids, self._assign = centroids, assign
+        self._trained_rows = self._size
+
+    def _mask(self, where: dict, n: int, cols: dict) -> np.ndarray:
+        if "$and" in where:
+            mask = np.ones(n, dtype=bool)
+            for clause in where["$and"]:
+                mask &= self._mask(clause, n, cols)
+            return mask
+        if len(where) != 1:
+            raise UnsupportedFilter(str(where))
+        key, cond = next(iter(where.items()))
+        if not isinstance(cond, dict) or len(cond) != 1:
+            raise UnsupportedFilter(str(where))
+        op, value = next(iter(cond.items()))
+        if key in ("doc_id", "file_type") and op == "$in":
+            codes = [self._codes[str(v)] for v in value if str(v) in self._codes]
+            return np.isin(cols[key], codes)
+        if key == "created_at" and op in ("$gte", "$lte"):
+            created, has = cols["created_at"], cols["has_created"]
+            return has & (created >= value if op == "$gte" else created <= value)
+        raise UnsupportedFilter(str(where))
+
+    def search(self, query_embeddings, n_results, where=None):
+        with self._lock:
+            # Snapshot: appends only write past n; deletes and retraining swap in new arrays
+            n = self._size
+            vectors = self._vectors[:n]
+            centroids = self._centroids
+            assign = self._assign[:n]
+            cols = {
+                "doc_id": self._doc_codes[:n],
+                "file_type": self._type_codes[:n],
+                "created_at": self._created[:n],
+                "has_created": self._has_created[:n],
+            }
+            documents, metadatas = self.documents, self.metadatas
+        if n == 0 or not query_embeddings:
+            return [[] for _ in query_embeddings]
+
+        queries = _normalize(np.asarray(query_embeddings, dtype=np.float32))
+        candidates = None
+        if where:
+            candidates = np.flatnonzero(self._mask(where, n, cols))
+            if candidates.size == 0:
+                return [[] for _ in query_embeddings]
+
+        hits: list[tuple[np.ndarray, np.ndarray]] = []  # (rows, scores) per query
+        if candidates is None and centroids is None:
+            # Flat: one (queries x rows) matrix multiply for the whole batch
+            for row_scores in queries @ vectors.T:
+                top = _top_k(row_scores, n_results)
+                hits.append((top, row_scores[top]))
+        elif candidates is not None:
+            for row_scores in queries @ vectors[candidates].T:
+                top = _top_k(row_scores, n_results)
+                hits.append((candidates[top], row_scores[top]))
+        else:
+            # IVF: score centroids for the whole batch, then only the probed lists
+            nprobe = min(self.nprobe, len(centroids))
+            probes = np.argsort(-(queries @ centroids.T), axis=1)[:, :nprobe]
+            for query, lists in zip(queries, probes):
+                rows = np.flatnonzero(np.isin(assign, lists))
+                row_scores = vectors[rows] @ query
+                top = _top_k(row_scores, n_results)
+                hits.append((rows[top], row_scores[top]))
+
+        return [
+            [make_hit(documents[r], metadatas[r], s) for r, s in zip(rows.tolist(), scores.tolist())]
+            for rows, scores in hits
+        ]
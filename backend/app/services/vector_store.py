@@ -1,14 +1,49 @@
 import chromadb
 from chromadb.config import Settings as ChromaSettings
+from collections import OrderedDict
+from datetime import datetime, timezone
+from typing import Optional
 from app.core.config import settings
+from app.core.metrics import VECTOR_SEARCHES
+from app.core.tracing import span
 from app.services.embeddings import embed_texts, embed_query
+from app.services.vector_index import VectorIndex, ChromaIndex, NumpyIndex, UnsupportedFilter
 import logging
 import re
+import threading
 
 logger = logging.getLogger(__name__)
 
 _client = None
 
+# Per-workspace collection handles and chunk counts. Counts are maintained on
+# add/delete so queries never hit Chroma's SQLite just to clamp n_results.
+# They are per-process: with several workers, each keeps its own view and
+# only reconciles on eviction (workspace deletion, rebuild, restart).
+_collections: dict = {}
+_counts: dict[str, int] = {}
+# Bumped whenever a workspace's chunks change; never reset, so a version is
+# only ever seen once per process.
+_versions: dict[str, int] = {}
+# Guards the caches above and is taken on every query, so it is only ever
+# held for in-memory updates, never across Chroma writes.
+_cache_lock = threading.RLock()
+# Serializes writes (add, delete, metadata update, rebuild, drop) per
+# workspace. Taken before _cache_lock, never while holding it.
+_workspace_locks: dict[str, threading.Lock] = {}
+
+# In-process search indexes for workspaces small enough to skip Chroma on
+# reads (least recently used first). Chroma stays the system of record: a
+# native index is loaded from it in a background thread and kept in step
+# with every add/delete; until it is ready, searches go to Chroma.
+_native: "OrderedDict[str, NumpyIndex]" = OrderedDict()
+_native_loading: set[str] = set()
+
+REBUILD_BATCH_SIZE = 1000
+COLLECTION_PREFIX = "ws-"
+REBUILD_SUFFIX = "-rb"
+RETIRED_SUFFIX = "-old"
+
 
 def get_chroma_client():
     global _client
@@ -23,67 +58,541 @@ def get_chroma_client():
 def _collection_name(workspace_id: str) -> str:
     # ChromaDB collection names must be alphanumeric + hyphens, 3-63 chars
     safe = re.sub(r"[^a-zA-Z0-9-]", "-", workspace_id)
-    return f"ws-{safe}"[:63]
+    return f"{COLLECTION_PREFIX}{safe}"[:63]
 
 
-def add_documents(workspace_id: str, chunks: list[str], doc_id: str, filename: str):
-    client = get_chroma_client()
-    collection = client.get_or_create_collection(
-        name=_collection_name(workspace_id),
-        metadata={"hnsw:space": "cosine"},
-    )
-    embeddings = embed_texts(chunks)
-    ids = [f"{doc_id}_chunk_{i}" for i in range(len(chunks))]
-    metadatas = [{"doc_id": doc_id, "filename": filename, "chunk_index": i} for i in range(len(chunks))]
-    collection.add(documents=chunks, embeddings=embeddings, ids=ids, metadatas=metadatas)
-    logger.info(f"Added {len(chunks)} chunks to workspace {workspace_id}")
+def rebuild_name(workspace_id: str) -> str:
+    """Collection a rebuild is written to before it is swapped in."""
+    return f"{_collection_name(workspace_id)[:59]}{REBUILD_SUFFIX}"
 
 
-def query_documents(workspace_id: str, query: str, n_results: int = 5) -> list[dict]:
-    client = get_chroma_client()
+def retired_name(workspace_id: str) -> str:
+    """Name the live collection is moved to while a rebuild is swapped in."""
+    return f"{_collection_name(workspace_id)[:59]}{RETIRED_SUFFIX}"
+
+
+def _workspace_lock(workspace_id: str) -> threading.Lock:
+    with _cache_lock:
+        return _workspace_locks.setdefault(workspace_id, threading.Lock())
+
+
+def hnsw_metadata(
+    m: Optional[int] = None,
+    ef_construction: Optional[int] = None,
+    ef_search: Optional[int] = None,
+) -> dict:
+    """Collection metadata for a workspace, falling back to the global HNSW defaults."""
+    return {
+        "hnsw:space": "cosine",
+        "hnsw:M": m or settings.HNSW_M,
+        "hnsw:construction_ef": ef_construction or settings.HNSW_EF_CONSTRUCTION,
+        "hnsw:search_ef": ef_search or settings.HNSW_EF_SEARCH,
+    }
+
+
+def _get_collection(workspace_id: str, create: bool = False, metadata: Optional[dict] = None):
+    """Return the cached collection handle, loading it from Chroma on a miss.
+
+    Returns None when the collection does not exist and create is False.
+    """
+    with _cache_lock:
+        collection = _collections.get(workspace_id)
+        if collection is not None:
+            return collection
+
+        client = get_chroma_client()
+        name = _collection_name(workspace_id)
+        if create:
+            collection = client.get_or_create_collection(name=name, metadata=metadata or hnsw_metadata())
+        else:
+            try:
+                collection = client.get_collection(name=name)
+            except Exception:
+                return None
+        _collections[workspace_id] = collection
+        _counts[workspace_id] = collection.count()
+        return collection
+
+
+def _bump_version(workspace_id: str):
+    with _cache_lock:
+        _versions[workspace_id] = _versions.get(workspace_id, 0) + 1
+
+
+def get_corpus_version(workspace_id: str) -> int:
+    """Counter that changes whenever chunks are added, deleted or re-tagged in a workspace."""
+    return _versions.get(workspace_id, 0)
+
+
+def evict_collection(workspace_id: str):
+    """Forget the cached handle, count and native index for a workspace."""
+    with _cache_lock:
+        _collections.pop(workspace_id, None)
+        _counts.pop(workspace_id, None)
+        _native.pop(workspace_id, None)
+
+
+def _use_native(count: int) -> bool:
+    backend = settings.VECTOR_SEARCH_BACKEND
+    if backend == "numpy":
+        return True
+    return backend == "auto" and count <= settings.NATIVE_INDEX_MAX_CHUNKS
+
+
+def _load_native_index(workspace_id: str, collection):
+    """Background thread: copy a workspace's vectors from Chroma into a NumpyIndex."""
     try:
-        collection = client.get_collection(name=_collection_name(workspace_id))
-    except Exception:
+        with _cache_lock:
+            version = get_corpus_version(workspace_id)
+        index = NumpyIndex(settings.NATIVE_IVF_MIN_CHUNKS, settings.NATIVE_IVF_NPROBE)
+        offset = 0
+        while True:
+            batch = collection.get(
+                limit=REBUILD_BATCH_SIZE,
+                offset=offset,
+                include=["embeddings", "documents", "metadatas"],
+            )
+            if not batch["ids"]:
+                break
+            index.add(batch["ids"], batch["embeddings"], batch["documents"], batch["metadatas"], train=False)
+            offset += len(batch["ids"])
+        index.maybe_train()
+
+        with _cache_lock:
+            # A write during the copy may be missing from it; the next search retries
+            if get_corpus_version(workspace_id) != version or _collections.get(workspace_id) is not collection:
+                return
+            _native[workspace_id] = index
+            budget = settings.NATIVE_INDEX_CACHE_MB * 1024 * 1024
+            while len(_native) > 1 and sum(i.nbytes for i in _native.values()) > budget:
+                _native.popitem(last=False)
+        logger.info(f"Loaded {index.kind} index for workspace {workspace_id} ({len(index)} chunks)")
+    except Exception as e:
+        logger.warning(f"Could not load native index for workspace {workspace_id}: {e}")
+    finally:
+        with _cache_lock:
+            _native_loading.discard(workspace_id)
+
+
+def _search_index(workspace_id: str, collection, count: int) -> VectorIndex:
+    if not _use_native(count):
+        return ChromaIndex(collection)
+    with _cache_lock:
+        index = _native.get(workspace_id)
+        if index is not None:
+            _native.move_to_end(workspace_id)
+            return index
+        if workspace_id not in _native_loading:
+            _native_loading.add(workspace_id)
+            threading.Thread(
+                target=_load_native_index, args=(workspace_id, collection), daemon=True
+            ).start()
+    return ChromaIndex(collection)
+
+
+def search_backend(workspace_id: str) -> str:
+    """Index type currently serving searches for a workspace: flat, ivf or chroma."""
+    count = get_workspace_doc_count(workspace_id)
+    with _cache_lock:
+        index = _native.get(workspace_id) if _use_native(count) else None
+        return index.kind if index is not None else "chroma"
+
+
+def to_epoch(dt: datetime) -> int:
+    # SQLite hands back naive datetimes; they are stored as UTC
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    return int(dt.timestamp())
+
+
+def chunk_id(doc_id: str, chunk_index: int) -> str:
+    return f"{doc_id}_chunk_{chunk_index}"
+
+
+def chunk_metadata(doc_id: str, filename: str, file_type: str, created_at: Optional[datetime]) -> dict:
+    """Document-level metadata stored on every chunk and used for pre-filtering."""
+    meta = {"doc_id": doc_id, "filename": filename, "file_type": file_type.lower()}
+    if created_at is not None:
+        meta["created_at"] = to_epoch(created_at)
+    return meta
+
+
+def build_where(
+    doc_ids: Optional[list[str]] = None,
+    file_types: Optional[list[str]] = None,
+    created_after: Optional[datetime] = None,
+    created_before: Optional[datetime] = None,
+) -> Optional[dict]:
+    """Translate retrieval filters into a Chroma where clause (None means no filter)."""
+    clauses = []
+    if doc_ids is not None:
+        clauses.append({"doc_id": {"$in": list(doc_ids)}})
+    if file_types:
+        clauses.append({"file_type": {"$in": [ft.lower().lstrip(".") for ft in file_types]}})
+    if created_after is not None:
+        clauses.append({"created_at": {"$gte": to_epoch(created_after)}})
+    if created_before is not None:
+        clauses.append({"created_at": {"$lte": to_epoch(created_before)}})
+    if not clauses:
+        return None
+    return clauses[0] if len(clauses) == 1 else {"$and": clauses}
+
+
+def add_documents(
+    workspace_id: str,
+    chunks: list[str],
+    doc_id: str,
+    filename: str,
+    hnsw_params: Optional[dict] = None,
+    file_type: str = "",
+    created_at: Optional[datetime] = None,
+):
+    with span("embed_chunks"):
+        embeddings = embed_texts(chunks)
+    ids = [chunk_id(doc_id, i) for i in range(len(chunks))]
+    base = chunk_metadata(doc_id, filename, file_type, created_at)
+    metadatas = [{**base, "chunk_index": i} for i in range(len(chunks))]
+    add_embeddings(workspace_id, ids, embeddings, chunks, metadatas, hnsw_params)
+    logger.info(f"Added {len(chunks)} chunks to workspace {workspace_id}")
+
+
+def add_embeddings(
+    workspace_id: str,
+    ids: list[str],
+    embeddings: list[list[float]],
+    chunks: list[str],
+    metadatas: list[dict],
+    hnsw_params: Optional[dict] = None,
+):
+    """Store chunks whose embeddings are already computed (nothing is embedded)."""
+    with _workspace_lock(workspace_id):
+        collection = _get_collection(workspace_id, create=True, metadata=hnsw_params)
+        with span("vector_add"):
+            collection.add(documents=chunks, embeddings=embeddings, ids=ids, metadatas=metadatas)
+        with _cache_lock:
+            _counts[workspace_id] = _counts.get(workspace_id, 0) + len(ids)
+            _bump_version(workspace_id)
+            native = _native.get(workspace_id)
+            if native is not None and not _use_native(_counts[workspace_id]):
+                # Outgrew the native index; Chroma serves it from now on
+                del _native[workspace_id]
+                native = None
+        if native is not None:
+            native.add(ids, embeddings, chunks, metadatas)
+
+
+def _is_empty_filter(where: Optional[dict]) -> bool:
+    # An empty doc_id set can never match
+    return bool(where) and {"doc_id": {"$in": []}} in where.get("$and", [where])
+
+
+def query_documents(
+    workspace_id: str,
+    query: str,
+    n_results: int = 5,
+    where: Optional[dict] = None,
+) -> list[dict]:
+    if get_workspace_doc_count(workspace_id) == 0 or _is_empty_filter(where):
         return []
+    with span("embed_query"):
+        query_embedding = embed_query(query)
+    with span("vector_search"):
+        return search_embedding(workspace_id, query_embedding, n_results, where)
 
-    query_embedding = embed_query(query)
-    results = collection.query(
-        query_embeddings=[query_embedding],
-        n_results=min(n_results, collection.count()),
-        include=["documents", "metadatas", "distances"],
-    )
-
-    chunks = []
-    if results["documents"] and results["documents"][0]:
-        for doc, meta, dist in zip(
-            results["documents"][0],
-            results["metadatas"][0],
-            results["distances"][0],
-        ):
-            chunks.append({
-                "text": doc,
-                "filename": meta.get("filename", "unknown"),
-                "doc_id": meta.get("doc_id", ""),
-                "chunk_index": meta.get("chunk_index", 0),
-                "score": round(1 - dist, 4),
-            })
-    return chunks
-
-
-def delete_document_chunks(workspace_id: str, doc_id: str):
-    client = get_chroma_client()
+
+def search_embedding(
+    workspace_id: str,
+    query_embedding: list[float],
+    n_results: int = 5,
+    where: Optional[dict] = None,
+    raise_errors: bool = False,
+) -> list[dict]:
+    """Nearest-neighbour search with a precomputed query embedding."""
+    return search_embeddings(workspace_id, [query_embedding], n_results, where, raise_errors)[0]
+
+
+def search_embeddings(
+    workspace_id: str,
+    query_embeddings: list[list[float]],
+    n_results: int = 5,
+    where: Optional[dict] = None,
+    raise_errors: bool = False,
+) -> list[list[dict]]:
+    """Search many query embeddings in one Chroma call; one result list per query.
+
+    A failed query returns empty results unless raise_errors is set, in which
+    case the exception propagates (after the cached handle is evicted).
+    """
+    empty = [[] for _ in query_embeddings]
+    collection = _get_collection(workspace_id)
+    count = _counts.get(workspace_id, 0)
+    if collection is None or count == 0 or _is_empty_filter(where) or not query_embeddings:
+        return empty
+
+    index = _search_index(workspace_id, collection, count)
+    try:
+        try:
+            results = index.search(query_embeddings, min(n_results, count), where)
+        except UnsupportedFilter:
+            index = ChromaIndex(collection)
+            results = index.search(query_embeddings, min(n_results, count), where)
+    except Exception as e:
+        # The cached handle may point at a collection dropped by another
+        # process; forget it so the next call reloads from Chroma.
+        logger.warning(f"Query failed for workspace {workspace_id}, evicting cached collection: {e}")
+        evict_collection(workspace_id)
+        if raise_errors:
+            raise
+        return empty
+    VECTOR_SEARCHES.labels(index.kind).inc()
+    return results
+
+
+def delete_document_chunks(workspace_id: str, doc_id: str) -> int:
+    """Delete a document's chunks and return how many were removed."""
     try:
-        collection = client.get_collection(name=_collection_name(workspace_id))
-        collection.delete(where={"doc_id": doc_id})
-        logger.info(f"Deleted chunks for doc {doc_id}")
+        with _workspace_lock(workspace_id):
+            collection = _get_collection(workspace_id)
+            if collection is None:
+                return 0
+            with span("vector_delete"):
+                ids = collection.get(where={"doc_id": doc_id}, include=[])["ids"]
+                if ids:
+                    collection.delete(ids=ids)
+            native = _forget_chunks(workspace_id, len(ids))
+            if ids and native is not None:
+                native.delete(ids)
+        logger.info(f"Deleted {len(ids)} chunks for doc {doc_id}")
+        return len(ids)
     except Exception as e:
         logger.warning(f"Could not delete chunks: {e}")
+        evict_collection(workspace_id)
+        return 0
 
 
-def get_workspace_doc_count(workspace_id: str) -> int:
-    client = get_chroma_client()
+def _forget_chunks(workspace_id: str, removed: int) -> Optional[NumpyIndex]:
+    """Account for deleted chunks; returns the native index to delete them from."""
+    with _cache_lock:
+        _counts[workspace_id] = max(0, _counts.get(workspace_id, 0) - removed)
+        _bump_version(workspace_id)
+        return _native.get(workspace_id)
+
+
+def delete_chunk_ids(workspace_id: str, ids: list[str]) -> int:
+    """Delete chunks by id and return how many still existed and were removed."""
+    if not ids:
+        return 0
+    with _workspace_lock(workspace_id):
+        collection = _get_collection(workspace_id)
+        if collection is None:
+            return 0
+        removed = []
+        for i in range(0, len(ids), REBUILD_BATCH_SIZE):
+            # Some ids may already be gone (e.g. GC's stale list); only count the rest
+            existing = collection.get(ids=ids[i:i + REBUILD_BATCH_SIZE], include=[])["ids"]
+            if existing:
+                collection.delete(ids=existing)
+                removed.extend(existing)
+        native = _forget_chunks(workspace_id, len(removed))
+        if removed and native is not None:
+            native.delete(removed)
+    return len(removed)
+
+
+def drop_collection(workspace_id: str) -> bool:
+    """Delete a workspace's collection entirely. Returns False if it did not exist."""
+    return drop_collection_by_name(_collection_name(workspace_id), workspace_id)
+
+
+def drop_collection_by_name(name: str, workspace_id: Optional[str] = None) -> bool:
+    if not workspace_id:
+        return _delete_collection(name)
+    with _workspace_lock(workspace_id):
+        dropped = _delete_collection(name)
+        with _cache_lock:
+            evict_collection(workspace_id)
+            _bump_version(workspace_id)
+    return dropped
+
+
+def _delete_collection(name: str) -> bool:
+    try:
+        get_chroma_client().delete_collection(name=name)
+    except Exception:
+        return False
+    logger.info(f"Dropped collection {name}")
+    return True
+
+
+def list_collection_names() -> list[str]:
+    # chromadb < 0.6 returns Collection objects, newer versions return names
+    return [getattr(c, "name", c) for c in get_chroma_client().list_collections()]
+
+
+def chunk_ids_by_doc(
+    workspace_id: str, missing_key: Optional[str] = None
+) -> tuple[dict[str, list[str]], dict[str, list[str]]]:
+    """Map doc_id -> chunk ids for every chunk stored in a workspace, in one pass.
+
+    The second map holds only the chunks whose metadata lacks missing_key
+    (empty when missing_key is None).
+    """
+    collection = _get_collection(workspace_id)
+    out: dict[str, list[str]] = {}
+    missing: dict[str, list[str]] = {}
+    if collection is None:
+        return out, missing
+    offset = 0
+    while True:
+        batch = collection.get(limit=REBUILD_BATCH_SIZE, offset=offset, include=["metadatas"])
+        if not batch["ids"]:
+            break
+        for chunk_id, meta in zip(batch["ids"], batch["metadatas"]):
+            meta = meta or {}
+            doc_id = meta.get("doc_id", "")
+            out.setdefault(doc_id, []).append(chunk_id)
+            if missing_key and missing_key not in meta:
+                missing.setdefault(doc_id, []).append(chunk_id)
+        offset += len(batch["ids"])
+    return out, missing
+
+
+def iter_chunks(workspace_id: str, include: list[str], batch_size: int = REBUILD_BATCH_SIZE):
+    """Yield a workspace's chunks as Chroma get() batches of at most batch_size.
+
+    Pages by id rather than offset, so writes made while the caller iterates
+    (without the workspace lock) cannot shift chunks out of the pages: the
+    chunks present when iteration starts are yielded unless deleted meanwhile.
+    """
+    collection = _get_collection(workspace_id)
+    if collection is None:
+        return
+    ids = collection.get(include=[])["ids"]
+    for i in range(0, len(ids), batch_size):
+        batch = collection.get(ids=ids[i:i + batch_size], include=include)
+        if batch["ids"]:
+            yield batch
+
+
+def update_chunk_metadata(workspace_id: str, ids: list[str], metadata: dict):
+    """Merge metadata into existing chunks (used to backfill filter fields)."""
+    if not ids:
+        return
+    with _workspace_lock(workspace_id):
+        collection = _get_collection(workspace_id)
+        if collection is None:
+            return
+        for i in range(0, len(ids), REBUILD_BATCH_SIZE):
+            batch = ids[i:i + REBUILD_BATCH_SIZE]
+            collection.update(ids=batch, metadatas=[metadata] * len(batch))
+        with _cache_lock:
+            _bump_version(workspace_id)
+            # Reloaded from Chroma with the new metadata on the next search
+            _native.pop(workspace_id, None)
+
+
+def stored_chunk_count(workspace_id: str) -> int:
+    """Chunk count read from Chroma itself rather than the per-process cache."""
     try:
-        collection = client.get_collection(name=_collection_name(workspace_id))
-        return collection.count()
+        return get_chroma_client().get_collection(name=_collection_name(workspace_id)).count()
     except Exception:
         return 0
+
+
+def get_workspace_doc_count(workspace_id: str) -> int:
+    if _get_collection(workspace_id) is None:
+        return 0
+    return _counts.get(workspace_id, 0)
+
+
+def rebuild_collection(workspace_id: str, metadata: dict) -> int:
+    """Copy a workspace's vectors into a freshly built collection.
+
+    HNSW construction parameters (M, construction_ef) are fixed when an index
+    is built, so changing them requires a rebuild. Stored embeddings are
+    copied as-is; nothing is re-embedded. Returns the number of chunks copied.
+
+    Searches keep using the current collection during the copy; writes to the
+    workspace wait for it. The copy is swapped in by renames (live -> -old,
+    -rb -> live), so the vectors always exist under some name: if the process
+    dies mid-swap, vector GC renames the -rb copy back.
+    """
+    client = get_chroma_client()
+    name = _collection_name(workspace_id)
+    tmp_name = rebuild_name(workspace_id)
+    old_name = retired_name(workspace_id)
+    with _workspace_lock(workspace_id):
+        try:
+            source = client.get_collection(name=name)
+        except Exception:
+            return 0
+        # Leftovers of an interrupted rebuild; the live collection exists, so they are redundant
+        for leftover in (tmp_name, old_name):
+            try:
+                client.delete_collection(name=leftover)
+            except Exception:
+                pass
+        target = client.create_collection(name=tmp_name, metadata=metadata)
+
+        copied = 0
+        while True:
+            batch = source.get(
+                limit=REBUILD_BATCH_SIZE,
+                offset=copied,
+                include=["embeddings", "documents", "metadatas"],
+            )
+            if not batch["ids"]:
+                break
+            target.add(
+                ids=batch["ids"],
+                embeddings=batch["embeddings"],
+                documents=batch["documents"],
+                metadatas=batch["metadatas"],
+            )
+            copied += len(batch["ids"])
+
+        # Renamed outside _cache_lock. Searches holding the cached handle keep
+        # reading the old collection (handles are bound by id, not name) until
+        # the cache entry is swapped below.
+        source.modify(name=old_name)
+        target.modify(name=name)
+        with _cache_lock:
+            _collections[workspace_id] = target
+            _counts[workspace_id] = copied
+        client.delete_collection(name=old_name)
+    logger.info(f"Rebuilt collection for workspace {workspace_id} with {copied} chunks")
+    return copied
+
+
+def restore_collection(workspace_id: str, name: str) -> bool:
+    """Rename a leftover rebuild collection back to the workspace's own name.
+
+    Does nothing if the workspace's collection exists, since the leftover is
+    then redundant. Returns True if the collection was restored.
+    """
+    client = get_chroma_client()
+    primary = _collection_name(workspace_id)
+    with _workspace_lock(workspace_id):
+        try:
+            client.get_collection(name=primary)
+            return False
+        except Exception:
+            pass
+        try:
+            client.get_collection(name=name).modify(name=primary)
+        except Exception as e:
+            logger.warning(f"Could not restore collection {name}: {e}")
+            return False
+        with _cache_lock:
+            evict_collection(workspace_id)
+            _bump_version(workspace_id)
+    logger.info(f"Restored collection {name} for workspace {workspace_id}")
+    return True
+
+
+def drop_leftover_collection(name: str, workspace_id: Optional[str] = None) -> bool:
+    """Drop an -rb/-old collection, waiting for any rebuild of its workspace to finish."""
+    if not workspace_id:
+        return _delete_collection(name)
+    with _workspace_lock(workspace_id):
+        return _delete_collection(name)
@@ -0,0 +1,68 @@
+"""Deterministic synthetic corpus for benchmarking ingestion and retrieval.
+
+Every document is built around a unique topic term so that queries can be
+aimed at a specific document and retrieval hits are checkable.
+"""
+import random
+from dataclasses import dataclass
+
+_SYLLABLES = ["ka", "lo", "mi", "ne", "ru", "sa", "to", "vi", "ze", "qua", "bri", "dro", "fen", "gol", "har"]
+_FILLER = (
+    "report analysis quarterly revenue contract clause policy customer service "
+    "infrastructure latency storage retention schedule budget forecast review "
+    "incident security compliance vendor agreement renewal metric dashboard"
+).split()
+
+
+@dataclass
+class SyntheticDoc:
+    filename: str
+    topic: str
+    content: bytes
+
+
+def _word(rng: random.Random) -> str:
+    return "".join(rng.choice(_SYLLABLES) for _ in range(rng.randint(2, 4)))
+
+
+def _paragraph(rng: random.Random, topic: str, words: int) -> str:
+    out = []
+    for i in range(words):
+        if i % 37 == 0:
+            out.append(topic)
+        elif rng.random() < 0.6:
+            out.append(rng.choice(_FILLER))
+        else:
+            out.append(_word(rng))
+    return " ".join(out) + "."
+
+
+def generate_corpus(n_docs: int, words_per_doc: int = 2000, seed: int = 42) -> list[SyntheticDoc]:
+    rng = random.Random(seed)
+    docs = []
+    for i in range(n_docs):
+        topic = f"{_word(rng)}{i}"
+        ext = "md" if i % 3 == 0 else "txt"
+        paragraphs = []
+        remaining = words_per_doc
+        while remaining > 0:
+            n = min(remaining, rng.randint(80, 200))
+            paragraphs.append(_paragraph(rng, topic, n))
+            remaining -= n
+        header = f"# Document {i}: {topic}\n\n" if ext == "md" else f"Document {i}: {topic}\n\n"
+        text = header + "\n\n".join(paragraphs)
+        docs.append(SyntheticDoc(filename=f"synthetic_{i:04d}.{ext}", topic=topic, content=text.encode("utf-8")))
+    return docs
+
+
+def generate_queries(docs: list[SyntheticDoc], n: int, seed: int = 7) -> list[str]:
+    rng = random.Random(seed)
+    templates = [
+        "What does the document say about {topic}?",
+        "Summarize the {filler} details for {topic}.",
+        "Which {filler} is mentioned alongside {topic}?",
+    ]
+    return [
+        rng.choice(templates).format(topic=rng.choice(docs).topic, filler=rng.choice(_FILLER))
+        for _ in range(n)
+    ]
@@ -0,0 +1,102 @@
+"""Local OpenAI-compatible chat completions stub for benchmarking.
+
+Simulates a provider with a fixed time-to-first-token plus a token rate, so
+end-to-end numbers are not dominated by (or billed against) a real LLM.
+
+    python -m benchmarks.llm_stub --port 9100 --latency-ms 200 --tokens-per-sec 400
+"""
+import argparse
+import asyncio
+import json
+import time
+import uuid
+from fastapi import FastAPI, Request
+from fastapi.responses import StreamingResponse
+import uvicorn
+
+app = FastAPI(title="LLM stub")
+
+LATENCY_MS = 200.0
+TOKENS_PER_SEC = 400.0
+COMPLETION_TOKENS = 128
+
+_WORDS = "the context indicates that this answer is synthesized from the provided sources".split()
+
+
+def _answer(n_tokens: int) -> str:
+    return " ".join(_WORDS[i % len(_WORDS)] for i in range(n_tokens))
+
+
+async def _stream(n_tokens: int, model: str):
+    """Server-sent events: first token after LATENCY_MS, then one per 1/TOKENS_PER_SEC."""
+    completion_id = f"chatcmpl-{uuid.uuid4().hex}"
+    await asyncio.sleep(LATENCY_MS / 1000)
+    for i, word in enumerate(_answer(n_tokens).split(" ")):
+        if i and TOKENS_PER_SEC > 0:
+            await asyncio.sleep(1 / TOKENS_PER_SEC)
+        chunk = {
+            "id": completion_id,
+            "object": "chat.completion.chunk",
+            "created": int(time.time()),
+            "model": model,
+            "choices": [{"index": 0, "delta": {"content": word if i == 0 else f" {word}"}, "finish_reason": None}],
+        }
+        yield f"data: {json.dumps(chunk)}\n\n"
+    yield "data: [DONE]\n\n"
+
+
+@app.post("/v1/chat/completions")
+async def chat_completions(request: Request):
+    body = await request.json()
+    n_tokens = min(int(body.get("max_tokens") or COMPLETION_TOKENS), COMPLETION_TOKENS)
+    if body.get("stream"):
+        return StreamingResponse(_stream(n_tokens, body.get("model", "stub")), media_type="text/event-stream")
+
+    delay = LATENCY_MS / 1000
+    if TOKENS_PER_SEC > 0:
+        delay += n_tokens / TOKENS_PER_SEC
+    await asyncio.sleep(delay)
+
+    prompt_tokens = sum(len(str(m.get("content", "")).split()) for m in body.get("messages", []))
+    return {
+        "id": f"chatcmpl-{uuid.uuid4().hex}",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": body.get("model", "stub"),
+        "choices": [
+            {
+                "index": 0,
+                "message": {"role": "assistant", "content": _answer(n_tokens)},
+                "finish_reason": "stop",
+            }
+        ],
+        "usage": {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": n_tokens,
+            "total_tokens": prompt_tokens + n_tokens,
+        },
+    }
+
+
+@app.get("/health")
+async def health():
+    return {"status": "ok"}
+
+
+def main():
+    global LATENCY_MS, TOKENS_PER_SEC, COMPLETION_TOKENS
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9100)
+    parser.add_argument("--latency-ms", type=float, default=LATENCY_MS)
+    parser.add_argument("--tokens-per-sec", type=float, default=TOKENS_PER_SEC)
+    parser.add_argument("--completion-tokens", type=int, default=COMPLETION_TOKENS)
+    args = parser.parse_args()
+    LATENCY_MS = args.latency_ms
+    TOKENS_PER_SEC = args.tokens_per_sec
+    COMPLETION_TOKENS = args.completion_tokens
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,389 @@
+"""End-to-end load test for the RAG Platform API.
+
+Starts the LLM stub and the API server as subprocesses against a throwaway
+database and Chroma directory, ingests a synthetic corpus, then drives mixed
+query/list/upload traffic at each concurrency level and writes a JSON report.
+
+    cd backend
+    python -m benchmarks.loadtest --concurrency 1 4 16 --duration 30 --out bench.json
+    python -m benchmarks.loadtest --baseline bench_main.json --out bench.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+from collections import defaultdict
+from datetime import datetime, timezone
+from pathlib import Path
+import httpx
+from benchmarks.corpus import generate_corpus, generate_queries
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+
+# Relative weights of each operation in the mixed-traffic phase
+DEFAULT_MIX = {"query": 70, "list_documents": 15, "history": 10, "upload": 5}
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _rss_mb(pid: int) -> float:
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return 0.0
+
+
+def _percentile(sorted_values: list[float], pct: float) -> float:
+    if not sorted_values:
+        return 0.0
+    k = max(0, min(len(sorted_values) - 1, round(pct / 100 * len(sorted_values) + 0.5) - 1))
+    return round(sorted_values[k], 2)
+
+
+def _summarize(latencies: list[float], errors: int) -> dict:
+    values = sorted(latencies)
+    return {
+        "count": len(values),
+        "errors": errors,
+        "mean_ms": round(sum(values) / len(values), 2) if values else 0.0,
+        "p50_ms": _percentile(values, 50),
+        "p95_ms": _percentile(values, 95),
+        "p99_ms": _percentile(values, 99),
+        "max_ms": round(values[-1], 2) if values else 0.0,
+    }
+
+
+def _git_sha() -> str:
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=BACKEND_DIR, text=True
+        ).strip()
+    except Exception:
+        return "unknown"
+
+
+class RssSampler:
+    """Samples the server's resident set size in the background."""
+
+    def __init__(self, pid: int, interval: float = 0.25):
+        self.pid = pid
+        self.interval = interval
+        self.peak = 0.0
+        self._task = None
+
+    async def _run(self):
+        while True:
+            self.peak = max(self.peak, _rss_mb(self.pid))
+            await asyncio.sleep(self.interval)
+
+    def reset(self):
+        self.peak = _rss_mb(self.pid)
+
+    def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+
+
+def _start_processes(args, workdir: Path):
+    stub_port = _free_port()
+    api_port = _free_port()
+    stub = subprocess.Popen(
+        [
+            sys.executable, "-m", "benchmarks.llm_stub",
+            "--port", str(stub_port),
+            "--latency-ms", str(args.llm_latency_ms),
+            "--tokens-per-sec", str(args.llm_tokens_per_sec),
+            "--completion-tokens", str(args.llm_completion_tokens),
+        ],
+        cwd=BACKEND_DIR,
+    )
+    env = dict(os.environ)
+    env.update({
+        "DATABASE_URL": f"sqlite+aiosqlite:///{workdir / 'bench.db'}",
+        "CHROMA_PERSIST_DIR": str(workdir / "chroma_db"),
+        "LLM_BASE_URL": f"http://127.0.0.1:{stub_port}/v1",
+        "GROQ_API_KEY": "stub",
+        "RATE_LIMIT_REQUESTS": str(10**9),
+        "APP_ENV": "benchmark",
+    })
+    api = subprocess.Popen(
+        [
+            sys.executable, "-m", "uvicorn", "app.main:app",
+            "--host", "127.0.0.1", "--port", str(api_port), "--log-level", "warning",
+        ],
+        cwd=BACKEND_DIR,
+        env=env,
+    )
+    return stub, api, f"http://127.0.0.1:{stub_port}", f"http://127.0.0.1:{api_port}"
+
+
+async def _wait_ready(client: httpx.AsyncClient, url: str, proc: subprocess.Popen, timeout: float):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if proc.poll() is not None:
+            raise RuntimeError(f"Process exited early with code {proc.returncode}")
+        try:
+            r = await client.get(url)
+            if r.status_code == 200:
+                return
+        except httpx.TransportError:
+            pass
+        await asyncio.sleep(0.5)
+    raise TimeoutError(f"{url} not ready after {timeout}s")
+
+
+async def _list_all_documents(client: httpx.AsyncClient, workspace_id: str) -> list[dict]:
+    docs, cursor = [], None
+    while True:
+        params = {"limit": 200}
+        if cursor:
+            params["cursor"] = cursor
+        r = await client.get(f"/api/documents/{workspace_id}", params=params)
+        r.raise_for_status()
+        docs.extend(r.json())
+        cursor = r.headers.get("X-Next-Cursor")
+        if not cursor:
+            return docs
+
+
+async def _ingest(client: httpx.AsyncClient, workspace_id: str, corpus, concurrency: int, timeout: float) -> dict:
+    sem = asyncio.Semaphore(concurrency)
+    upload_latencies = []
+
+    async def upload(doc):
+        async with sem:
+            t0 = time.perf_counter()
+            r = await client.post(
+                f"/api/documents/{workspace_id}/upload",
+                files={"file": (doc.filename, doc.content, "text/plain")},
+            )
+            upload_latencies.append((time.perf_counter() - t0) * 1000)
+            r.raise_for_status()
+
+    start = time.perf_counter()
+    await asyncio.gather(*(upload(d) for d in corpus))
+    deadline = time.monotonic() + timeout
+    while True:
+        docs = await _list_all_documents(client, workspace_id)
+        if not any(d["status"] == "processing" for d in docs):
+            break
+        if time.monotonic() > deadline:
+            raise TimeoutError("Ingestion did not finish in time")
+        await asyncio.sleep(0.5)
+    elapsed = time.perf_counter() - start
+
+    chunks = sum(d["chunk_count"] or 0 for d in docs)
+    return {
+        "documents": len(docs),
+        "failed": sum(1 for d in docs if d["status"] == "error"),
+        "bytes": sum(len(d.content) for d in corpus),
+        "chunks": chunks,
+        "seconds": round(elapsed, 3),
+        "chunks_per_sec": round(chunks / elapsed, 2) if elapsed else 0.0,
+        "upload": _summarize(upload_latencies, 0),
+    }
+
+
+async def _mixed_phase(client: httpx.AsyncClient, workspace_id: str, queries: list[str],
+                       upload_docs, concurrency: int, duration: float, mix: dict, seed: int) -> dict:
+    latencies = defaultdict(list)
+    errors = defaultdict(int)
+    ops, weights = zip(*mix.items())
+    stop_at = time.monotonic() + duration
+    upload_iter = iter(upload_docs)
+
+    async def one(op: str, rng: random.Random):
+        if op == "query":
+            return await client.post(f"/api/chat/{workspace_id}", json={"query": rng.choice(queries)})
+        if op == "list_documents":
+            return await client.get(f"/api/documents/{workspace_id}")
+        if op == "history":
+            return await client.get(f"/api/chat/{workspace_id}/history")
+        doc = next(upload_iter, None) or rng.choice(upload_docs)
+        return await client.post(
+            f"/api/documents/{workspace_id}/upload",
+            files={"file": (f"{uuid.uuid4().hex[:8]}_{doc.filename}", doc.content, "text/plain")},
+        )
+
+    async def worker(i: int):
+        rng = random.Random(seed + i)
+        while time.monotonic() < stop_at:
+            op = rng.choices(ops, weights)[0]
+            t0 = time.perf_counter()
+            try:
+                r = await one(op, rng)
+                ok = r.status_code < 400
+            except httpx.HTTPError:
+                ok = False
+            latency = (time.perf_counter() - t0) * 1000
+            if ok:
+                latencies[op].append(latency)
+            else:
+                errors[op] += 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker(i) for i in range(concurrency)))
+    elapsed = time.perf_counter() - start
+
+    total = sum(len(v) for v in latencies.values())
+    return {
+        "concurrency": concurrency,
+        "seconds": round(elapsed, 3),
+        "requests": total,
+        "errors": sum(errors.values()),
+        "throughput_rps": round(total / elapsed, 2) if elapsed else 0.0,
+        "endpoints": {op: _summarize(latencies[op], errors[op]) for op in ops},
+    }
+
+
+async def run(args) -> dict:
+    corpus = generate_corpus(args.docs, words_per_doc=args.words_per_doc, seed=args.seed)
+    upload_docs = generate_corpus(8, words_per_doc=300, seed=args.seed + 1)
+    queries = generate_queries(corpus, 500, seed=args.seed)
+    mix = dict(DEFAULT_MIX)
+    for item in args.mix or []:
+        op, weight = item.split("=", 1)
+        mix[op] = int(weight)
+    mix = {op: w for op, w in mix.items() if w > 0}
+
+    with tempfile.TemporaryDirectory(prefix="rag-bench-") as tmp:
+        stub, api, stub_url, api_url = _start_processes(args, Path(tmp))
+        try:
+            async with httpx.AsyncClient(base_url=api_url, timeout=args.request_timeout) as client:
+                await _wait_ready(client, f"{stub_url}/health", stub, 30)
+                await _wait_ready(client, f"{api_url}/api/health", api, args.startup_timeout)
+                startup_rss = _rss_mb(api.pid)
+
+                r = await client.post("/api/auth/register", json={
+                    "email": f"bench-{uuid.uuid4().hex[:8]}@example.com",
+                    "password": "benchmark",
+                })
+                r.raise_for_status()
+                client.headers["Authorization"] = f"Bearer {r.json()['access_token']}"
+                r = await client.post("/api/workspaces/", json={"name": "benchmark"})
+                r.raise_for_status()
+                workspace_id = r.json()["id"]
+
+                sampler = RssSampler(api.pid)
+                sampler.start()
+                try:
+                    ingest = await _ingest(client, workspace_id, corpus, args.ingest_concurrency, args.ingest_timeout)
+                    ingest["rss_peak_mb"] = round(sampler.peak, 1)
+
+                    levels = []
+                    for concurrency in args.concurrency:
+                        sampler.reset()
+                        result = await _mixed_phase(
+                            client, workspace_id, queries, upload_docs,
+                            concurrency, args.duration, mix, args.seed,
+                        )
+                        result["rss_peak_mb"] = round(sampler.peak, 1)
+                        levels.append(result)
+                        print(
+                            f"concurrency={concurrency} rps={result['throughput_rps']} "
+                            f"query_p95={result['endpoints'].get('query', {}).get('p95_ms')}ms",
+                            file=sys.stderr,
+                        )
+                finally:
+                    await sampler.stop()
+        finally:
+            for proc in (api, stub):
+                proc.terminate()
+                try:
+                    proc.wait(timeout=10)
+                except subprocess.TimeoutExpired:
+                    proc.kill()
+
+    return {
+        "meta": {
+            "git_sha": _git_sha(),
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "python": sys.version.split()[0],
+            "docs": args.docs,
+            "words_per_doc": args.words_per_doc,
+            "duration_s": args.duration,
+            "mix": mix,
+            "llm_stub": {
+                "latency_ms": args.llm_latency_ms,
+                "tokens_per_sec": args.llm_tokens_per_sec,
+                "completion_tokens": args.llm_completion_tokens,
+            },
+        },
+        "startup_rss_mb": round(startup_rss, 1),
+        "ingest": ingest,
+        "levels": levels,
+    }
+
+
+def compare(report: dict, baseline: dict) -> list[str]:
+    """Per-endpoint p95 and throughput deltas against a previous report."""
+    lines = [f"baseline {baseline['meta']['git_sha']} -> current {report['meta']['git_sha']}"]
+    b_ingest, c_ingest = baseline["ingest"]["chunks_per_sec"], report["ingest"]["chunks_per_sec"]
+    lines.append(f"ingest chunks/sec: {b_ingest} -> {c_ingest}")
+    base_levels = {lvl["concurrency"]: lvl for lvl in baseline["levels"]}
+    for lvl in report["levels"]:
+        base = base_levels.get(lvl["concurrency"])
+        if not base:
+            continue
+        lines.append(f"c={lvl['concurrency']} rps: {base['throughput_rps']} -> {lvl['throughput_rps']}")
+        for op, stats in lvl["endpoints"].items():
+            b = base["endpoints"].get(op)
+            if not b or not b["p95_ms"]:
+                continue
+            delta = (stats["p95_ms"] - b["p95_ms"]) / b["p95_ms"] * 100
+            lines.append(f"  {op:<15} p95 {b['p95_ms']:>9.2f} -> {stats['p95_ms']:>9.2f} ms ({delta:+.1f}%)")
+    return lines
+
+
+def main():
+    parser = argparse.ArgumentParser(description="RAG Platform end-to-end load test")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 16])
+    parser.add_argument("--duration", type=float, default=20, help="seconds per concurrency level")
+    parser.add_argument("--docs", type=int, default=20)
+    parser.add_argument("--words-per-doc", type=int, default=2000)
+    parser.add_argument("--ingest-concurrency", type=int, default=4)
+    parser.add_argument("--ingest-timeout", type=float, default=600)
+    parser.add_argument("--startup-timeout", type=float, default=300)
+    parser.add_argument("--request-timeout", type=float, default=120)
+    parser.add_argument("--mix", nargs="*", help="override op weights, e.g. query=80 upload=0")
+    parser.add_argument("--llm-latency-ms", type=float, default=200)
+    parser.add_argument("--llm-tokens-per-sec", type=float, default=400)
+    parser.add_argument("--llm-completion-tokens", type=int, default=128)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--out", default="bench_report.json")
+    parser.add_argument("--baseline", help="previous report to compare against")
+    args = parser.parse_args()
+
+    report = asyncio.run(run(args))
+    Path(args.out).write_text(json.dumps(report, indent=2, default=str))
+    print(f"Report written to {args.out}", file=sys.stderr)
+
+    if args.baseline:
+        baseline = json.loads(Path(args.baseline).read_text())
+        print("\n".join(compare(report, baseline)))
+
+
+if __name__ == "__main__":
+    main()
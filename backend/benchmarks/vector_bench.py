@@ -0,0 +1,158 @@
+"""Vector search micro-benchmark: Chroma HNSW vs the native NumPy index.
+
+Builds each backend over the same synthetic embeddings (a mixture of
+clusters, like sentence embeddings of a topical corpus) and reports per-query
+latency, batched throughput and recall@k against exact search. No embedding
+model or server is needed.
+
+    cd backend
+    python -m benchmarks.vector_bench --sizes 1000 5000 20000 --out vector_bench.json
+"""
+import argparse
+import json
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+import numpy as np
+from benchmarks.loadtest import _git_sha, _summarize
+from app.services.vector_index import ChromaIndex, NumpyIndex
+
+
+def generate_embeddings(n: int, dim: int, clusters: int, rng: np.random.Generator) -> np.ndarray:
+    centers = rng.standard_normal((clusters, dim)).astype(np.float32)
+    labels = rng.integers(0, clusters, n)
+    vectors = centers[labels] + 0.6 * rng.standard_normal((n, dim)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def generate_queries(vectors: np.ndarray, n: int, rng: np.random.Generator) -> np.ndarray:
+    """Perturbed copies of stored vectors, so every query has close neighbours."""
+    picks = vectors[rng.integers(0, len(vectors), n)]
+    queries = picks + 0.3 * rng.standard_normal(picks.shape).astype(np.float32) / np.sqrt(vectors.shape[1])
+    return queries / np.linalg.norm(queries, axis=1, keepdims=True)
+
+
+def _chroma_index(vectors: np.ndarray, ids: list[str], docs: list[str], metas: list[dict], workdir: str, args):
+    import chromadb
+    from chromadb.config import Settings as ChromaSettings
+    client = chromadb.PersistentClient(path=workdir, settings=ChromaSettings(anonymized_telemetry=False))
+    collection = client.create_collection(
+        name=f"bench-{len(ids)}",
+        metadata={
+            "hnsw:space": "cosine",
+            "hnsw:M": args.hnsw_m,
+            "hnsw:construction_ef": args.hnsw_ef_construction,
+            "hnsw:search_ef": args.hnsw_ef_search,
+        },
+    )
+    for i in range(0, len(ids), 1000):
+        collection.add(
+            ids=ids[i:i + 1000],
+            embeddings=vectors[i:i + 1000].tolist(),
+            documents=docs[i:i + 1000],
+            metadatas=metas[i:i + 1000],
+        )
+    return ChromaIndex(collection)
+
+
+def _bench_index(index, queries: np.ndarray, truth: list[set], k: int, batch: int) -> dict:
+    query_lists = queries.tolist()
+    latencies, recalls = [], []
+    for query, expected in zip(query_lists, truth):
+        start = time.perf_counter()
+        hits = index.search([query], k)[0]
+        latencies.append((time.perf_counter() - start) * 1000)
+        recalls.append(len({h["text"] for h in hits} & expected) / k)
+
+    start = time.perf_counter()
+    for i in range(0, len(query_lists), batch):
+        index.search(query_lists[i:i + batch], k)
+    batched_s = time.perf_counter() - start
+
+    summary = _summarize(latencies, 0)
+    summary["recall_at_k"] = round(float(np.mean(recalls)), 4)
+    summary["batched_qps"] = round(len(query_lists) / batched_s, 1) if batched_s else 0.0
+    return summary
+
+
+def run(args) -> dict:
+    rng = np.random.default_rng(args.seed)
+    results = []
+    for size in args.sizes:
+        vectors = generate_embeddings(size, args.dim, max(8, size // 200), rng)
+        queries = generate_queries(vectors, args.queries, rng)
+        ids = [f"c{i}" for i in range(size)]
+        docs = ids  # chunk text doubles as a unique key for recall
+        metas = [{"doc_id": f"d{i // 50}", "chunk_index": i % 50} for i in range(size)]
+
+        exact = queries @ vectors.T
+        truth = [{ids[j] for j in np.argsort(-row)[:args.k]} for row in exact]
+
+        backends = {}
+        start = time.perf_counter()
+        flat = NumpyIndex(ivf_min_rows=size + 1, nprobe=args.nprobe)
+        flat.add(ids, vectors, docs, metas)
+        backends["numpy_flat"] = (flat, time.perf_counter() - start)
+
+        start = time.perf_counter()
+        ivf = NumpyIndex(ivf_min_rows=0, nprobe=args.nprobe)
+        ivf.add(ids, vectors, docs, metas)
+        backends["numpy_ivf"] = (ivf, time.perf_counter() - start)
+
+        with tempfile.TemporaryDirectory(prefix="vector_bench_") as workdir:
+            start = time.perf_counter()
+            chroma = _chroma_index(vectors, ids, docs, metas, workdir, args)
+            backends["chroma_hnsw"] = (chroma, time.perf_counter() - start)
+
+            entry = {"size": size, "backends": {}}
+            for name, (index, build_s) in backends.items():
+                stats = _bench_index(index, queries, truth, args.k, args.batch)
+                stats["build_s"] = round(build_s, 3)
+                entry["backends"][name] = stats
+                print(
+                    f"size={size:<7} {name:<12} p50={stats['p50_ms']:>8.3f}ms p95={stats['p95_ms']:>8.3f}ms "
+                    f"recall@{args.k}={stats['recall_at_k']:.3f} batched={stats['batched_qps']} q/s",
+                    file=sys.stderr,
+                )
+        results.append(entry)
+
+    return {
+        "meta": {
+            "git_sha": _git_sha(),
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "python": sys.version.split()[0],
+            "dim": args.dim,
+            "queries": args.queries,
+            "k": args.k,
+            "batch": args.batch,
+            "nprobe": args.nprobe,
+            "hnsw": {"m": args.hnsw_m, "ef_construction": args.hnsw_ef_construction, "ef_search": args.hnsw_ef_search},
+        },
+        "results": results,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Vector search backend benchmark")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 5000, 20000])
+    parser.add_argument("--dim", type=int, default=384, help="all-MiniLM-L6-v2 produces 384 dims")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--batch", type=int, default=64, help="queries per call in the batched pass")
+    parser.add_argument("--nprobe", type=int, default=8)
+    parser.add_argument("--hnsw-m", type=int, default=16)
+    parser.add_argument("--hnsw-ef-construction", type=int, default=100)
+    parser.add_argument("--hnsw-ef-search", type=int, default=10)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--out", default="vector_bench.json")
+    args = parser.parse_args()
+
+    report = run(args)
+    Path(args.out).write_text(json.dumps(report, indent=2))
+    print(f"Report written to {args.out}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
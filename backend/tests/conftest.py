@@ -0,0 +1,30 @@
+import os
+import tempfile
+import uuid
+from typing import Optional
+import numpy as np
+import pytest
+
+# Settings are read at import time, so point storage at a scratch directory
+# before anything under app/ is imported.
+_tmp = tempfile.mkdtemp(prefix="rag-tests-")
+os.environ.setdefault("DATABASE_URL", f"sqlite+aiosqlite:///{_tmp}/test.db")
+os.environ.setdefault("CHROMA_PERSIST_DIR", os.path.join(_tmp, "chroma"))
+os.environ.setdefault("UPLOAD_SPOOL_DIR", os.path.join(_tmp, "spool"))
+os.environ.setdefault("GROQ_API_KEY", "test")
+
+
+@pytest.fixture
+def add_chunks():
+    """Store n random-vector chunks of one document; returns their embeddings."""
+    from app.services import vector_store as vs
+
+    def add(workspace_id: str, n: int, doc_id: Optional[str] = None, dim: int = 16, seed: int = 0):
+        embeddings = np.random.default_rng(seed).standard_normal((n, dim)).tolist()
+        doc_id = doc_id or str(uuid.uuid4())
+        ids = [vs.chunk_id(doc_id, i) for i in range(n)]
+        metadatas = [{**vs.chunk_metadata(doc_id, "a.txt", "txt", None), "chunk_index": i} for i in range(n)]
+        vs.add_embeddings(workspace_id, ids, embeddings, [f"chunk {i}" for i in range(n)], metadatas)
+        return embeddings
+
+    return add
@@ -0,0 +1,132 @@
+import asyncio
+import io
+import pytest
+from fastapi import HTTPException
+from sqlalchemy import select
+from app.api import batch as batch_api
+from app.core.config import settings
+from app.core.database import AsyncSessionLocal, BatchItem, BatchJob, Workspace, init_db
+from app.services import batch
+from app.services.rag import LLMError
+
+
+def test_llm_failure_is_recorded_as_item_error(monkeypatch):
+    recorded = []
+
+    async def fail(question, chunks, priority):
+        raise LLMError("500 Server Error")
+
+    async def record(job_id, idx, answer, sources, error, duration_ms):
+        recorded.append((idx, answer, error))
+
+    monkeypatch.setattr(batch, "generate_answer", fail)
+    monkeypatch.setattr(batch, "_record_answer", record)
+    chunks = [{"text": "t", "filename": "a.txt", "doc_id": "d", "chunk_index": 0, "score": 0.9}]
+    asyncio.run(batch._answer("job", 3, "q", chunks))
+
+    assert recorded == [(3, None, "LLM provider error: 500 Server Error")]
+
+
+def test_question_file_is_capped_while_reading(monkeypatch):
+    monkeypatch.setattr(settings, "BATCH_MAX_FILE_MB", 1)
+    monkeypatch.setattr(batch_api, "READ_CHUNK_BYTES", 4096)
+    read = []
+
+    class Upload:
+        def __init__(self, size):
+            self.data = io.BytesIO(b"q\n" * (size // 2))
+
+        async def read(self, n=-1):
+            read.append(n)
+            return self.data.read(n)
+
+    assert len(asyncio.run(batch_api._read_capped(Upload(1024 * 1024)))) == 1024 * 1024
+    read.clear()
+    with pytest.raises(HTTPException, match="too large"):
+        asyncio.run(batch_api._read_capped(Upload(64 * 1024 * 1024)))
+    # Rejected right after passing the limit, not after reading everything
+    assert len(read) == 1024 * 1024 // 4096 + 1
+
+
+def test_job_with_unrecorded_answers_is_failed(monkeypatch):
+    async def answer(job_id, idx, question, chunks):
+        if idx == 1:
+            raise RuntimeError("database is locked")
+
+    monkeypatch.setattr(batch, "embed_texts", lambda questions, batch_size: [[0.0]] * len(questions))
+    monkeypatch.setattr(batch, "search_embeddings", lambda ws, embeddings, n, raise_errors=False: [[] for _ in embeddings])
+    monkeypatch.setattr(batch, "_answer", answer)
+
+    async def run():
+        _, job_id = await _job_with_workspace(["a", "b", "c"])
+        await batch._run_job(job_id)
+        async with AsyncSessionLocal() as db:
+            return await db.get(BatchJob, job_id)
+
+    job = asyncio.run(run())
+    assert job.status == "failed"
+    assert job.error_message == "1 questions were not recorded: database is locked"
+
+
+async def _job_with_workspace(questions: list[str]) -> tuple[str, str]:
+    await init_db()
+    async with AsyncSessionLocal() as db:
+        ws = Workspace(user_id="user", name="batch")
+        db.add(ws)
+        await db.flush()
+        job = await batch.create_job(db, "user", ws.id, "q.txt", [(None, q) for q in questions], 5)
+        return ws.id, job.id
+
+
+async def _items(job_id: str) -> list[tuple]:
+    async with AsyncSessionLocal() as db:
+        result = await db.execute(
+            select(BatchItem.idx, BatchItem.answer, BatchItem.error).where(BatchItem.job_id == job_id).order_by(BatchItem.idx)
+        )
+        return [tuple(row) for row in result.all()]
+
+
+def test_failed_retrieval_is_recorded_instead_of_answered(monkeypatch):
+    monkeypatch.setattr(settings, "BATCH_EMBED_SIZE", 2)
+    monkeypatch.setattr(batch, "embed_texts", lambda questions, batch_size: [[float(len(q))] for q in questions])
+
+    def search(workspace_id, embeddings, n_results, raise_errors=False):
+        assert raise_errors
+        if embeddings[0] == [1.0]:
+            raise RuntimeError("collection vanished")
+        return [[] for _ in embeddings]
+
+    monkeypatch.setattr(batch, "search_embeddings", search)
+
+    async def run():
+        _, job_id = await _job_with_workspace(["a", "b", "cc", "dd"])
+        await batch._run_job(job_id)
+        async with AsyncSessionLocal() as db:
+            return await db.get(BatchJob, job_id), await _items(job_id)
+
+    job, items = asyncio.run(run())
+    assert (job.status, job.completed) == ("completed", 4)
+    assert items == [
+        (0, None, "Retrieval failed: collection vanished"),
+        (1, None, "Retrieval failed: collection vanished"),
+        (2, batch.NO_DOCUMENTS_ANSWER, None),
+        (3, batch.NO_DOCUMENTS_ANSWER, None),
+    ]
+
+
+def test_job_fails_when_its_workspace_is_deleted(monkeypatch):
+    monkeypatch.setattr(batch, "embed_texts", lambda questions, batch_size: [[0.0]] * len(questions))
+    monkeypatch.setattr(batch, "search_embeddings", lambda ws, embeddings, n, raise_errors=False: [[] for _ in embeddings])
+
+    async def run():
+        ws_id, job_id = await _job_with_workspace(["a", "b"])
+        async with AsyncSessionLocal() as db:
+            await db.delete(await db.get(Workspace, ws_id))
+            await db.commit()
+        await batch._run_job(job_id)
+        async with AsyncSessionLocal() as db:
+            return await db.get(BatchJob, job_id), await _items(job_id)
+
+    job, items = asyncio.run(run())
+    assert (job.status, job.error_message) == ("failed", "Workspace was deleted")
+    assert items == [(0, None, None), (1, None, None)]
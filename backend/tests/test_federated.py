@@ -0,0 +1,63 @@
+import asyncio
+import threading
+import time
+import pytest
+from app.core.config import settings
+from app.services import rag
+from app.services import vector_store as vs
+
+
+def test_search_errors_propagate_only_when_asked(add_chunks, monkeypatch):
+    embeddings = add_chunks("ws-failing", 5)
+
+    class Broken:
+        kind = "broken"
+
+        def search(self, query_embeddings, n_results, where=None):
+            raise RuntimeError("collection vanished")
+
+    monkeypatch.setattr(vs, "_search_index", lambda *args: Broken())
+    assert vs.search_embedding("ws-failing", embeddings[0], 3) == []
+    with pytest.raises(RuntimeError, match="vanished"):
+        vs.search_embedding("ws-failing", embeddings[0], 3, raise_errors=True)
+
+
+def test_federated_search_reports_failures_and_holds_slots_until_threads_finish(monkeypatch):
+    monkeypatch.setattr(settings, "FEDERATED_MAX_CONCURRENCY", 1)
+    monkeypatch.setattr(settings, "FEDERATED_TIMEOUT_SECONDS", 0.1)
+    monkeypatch.setattr(rag, "get_workspace_doc_count", lambda ws: 1)
+    monkeypatch.setattr(rag, "embed_query", lambda query: [0.0])
+    lock = threading.Lock()
+    active, peak = 0, 0
+
+    def search_embedding(workspace_id, query_embedding, n_results, where, raise_errors=False):
+        nonlocal active, peak
+        assert raise_errors
+        with lock:
+            active += 1
+            peak = max(peak, active)
+        try:
+            if workspace_id == "slow":
+                time.sleep(0.3)
+            if workspace_id == "broken":
+                raise RuntimeError("collection vanished")
+            return [{"text": workspace_id, "filename": "f.txt", "doc_id": "d", "chunk_index": 0, "score": 0.5}]
+        finally:
+            with lock:
+                active -= 1
+
+    async def generate_answer(query, chunks):
+        return {"answer": "ok", "sources": [c["workspace_id"] for c in chunks]}
+
+    monkeypatch.setattr(rag, "search_embedding", search_embedding)
+    monkeypatch.setattr(rag, "generate_answer", generate_answer)
+
+    result = asyncio.run(rag.run_federated_rag(["slow", "broken", "ok"], "q"))
+
+    assert result["skipped"] == [
+        {"workspace_id": "slow", "reason": "timeout"},
+        {"workspace_id": "broken", "reason": "collection vanished"},
+    ]
+    assert result["sources"] == ["ok"]
+    # The timed out thread kept its slot, so the others never overlapped it
+    assert peak == 1
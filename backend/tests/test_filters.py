@@ -0,0 +1,112 @@
+import asyncio
+from datetime import datetime, timezone
+import numpy as np
+from sqlalchemy import update
+from app.api.chat import QueryFilters, _glob_to_like, resolve_filters
+from app.core.database import AsyncSessionLocal, Document, Workspace, init_db
+from app.services import vector_store as vs
+from app.services.vector_gc import backfill_all_filter_metadata
+
+DIM = 16
+JAN = datetime(2025, 1, 10, tzinfo=timezone.utc)
+JUN = datetime(2025, 6, 10, tzinfo=timezone.utc)
+
+
+def test_glob_to_like_escapes_sql_wildcards():
+    assert _glob_to_like("*contract*2025*") == "%contract%2025%"
+    assert _glob_to_like("report_?.pdf") == "report\\__.pdf"
+    assert _glob_to_like("100%\\done") == "100\\%\\\\done"
+
+
+def test_build_where_combines_clauses():
+    assert vs.build_where() is None
+    assert vs.build_where(doc_ids=[]) == {"doc_id": {"$in": []}}
+    assert vs.build_where(file_types=["PDF", ".Docx"]) == {"file_type": {"$in": ["pdf", "docx"]}}
+    assert vs.build_where(doc_ids=["a"], created_after=JAN, created_before=datetime(2025, 6, 10)) == {
+        "$and": [
+            {"doc_id": {"$in": ["a"]}},
+            {"created_at": {"$gte": int(JAN.timestamp())}},
+            # Naive datetimes are taken as UTC
+            {"created_at": {"$lte": int(JUN.timestamp())}},
+        ]
+    }
+
+
+async def _legacy_workspace() -> tuple[str, dict[str, str]]:
+    """A workspace predating filter metadata: one current document, two legacy ones."""
+    await init_db()
+    async with AsyncSessionLocal() as db:
+        ws = Workspace(user_id="u1", name="filters")
+        db.add(ws)
+        await db.flush()
+        # As left by the migration that added the column
+        await db.execute(update(Workspace).where(Workspace.id == ws.id).values(filters_backfilled=None))
+        docs = {
+            "new": Document(workspace_id=ws.id, user_id="u1", filename="contract_2025.pdf", file_type="pdf",
+                            status="ready", created_at=JUN),
+            "old_pdf": Document(workspace_id=ws.id, user_id="u1", filename="contractX2025.pdf", file_type="pdf",
+                                status="ready", created_at=JAN),
+            "old_txt": Document(workspace_id=ws.id, user_id="u1", filename="notes.txt", file_type="txt",
+                                status="ready", created_at=JUN),
+        }
+        db.add_all(docs.values())
+        await db.commit()
+
+    rng = np.random.default_rng(0)
+    for key, doc in docs.items():
+        ids = [vs.chunk_id(doc.id, i) for i in range(3)]
+        if key == "new":
+            base = vs.chunk_metadata(doc.id, doc.filename, doc.file_type, doc.created_at)
+        else:
+            base = {"doc_id": doc.id, "filename": doc.filename}
+        metadatas = [{**base, "chunk_index": i} for i in range(3)]
+        vs.add_embeddings(ws.id, ids, rng.standard_normal((3, DIM)).tolist(), [key] * 3, metadatas)
+    return ws.id, {key: doc.id for key, doc in docs.items()}
+
+
+async def _search(workspace_id: str, filters: QueryFilters) -> set[str]:
+    async with AsyncSessionLocal() as db:
+        where = await resolve_filters(db, workspace_id, filters)
+    hits = vs.search_embedding(workspace_id, [1.0] * DIM, 20, where)
+    return {hit["text"] for hit in hits}
+
+
+def test_filters_match_legacy_chunks_after_backfill():
+    async def run():
+        workspace_id, _ = await _legacy_workspace()
+
+        # The first filtered query backfills the legacy chunks before searching
+        assert await _search(workspace_id, QueryFilters(file_types=["PDF"])) == {"new", "old_pdf"}
+        assert await _search(workspace_id, QueryFilters(uploaded_before=datetime(2025, 3, 1))) == {"old_pdf"}
+        assert await _search(workspace_id, QueryFilters(uploaded_after=datetime(2025, 3, 1))) == {"new", "old_txt"}
+        async with AsyncSessionLocal() as db:
+            assert (await db.get(Workspace, workspace_id)).filters_backfilled is True
+        _, legacy = vs.chunk_ids_by_doc(workspace_id, missing_key="file_type")
+        assert legacy == {}
+
+    asyncio.run(run())
+
+
+def test_filename_and_doc_id_filters_intersect():
+    async def run():
+        workspace_id, doc_ids = await _legacy_workspace()
+
+        # "_" is literal in the glob, so contractX2025.pdf does not match
+        assert await _search(workspace_id, QueryFilters(filename="contract_2025*")) == {"new"}
+        assert await _search(workspace_id, QueryFilters(filename="*2025*")) == {"new", "old_pdf"}
+        both = QueryFilters(filename="*2025*", doc_ids=[doc_ids["old_pdf"], doc_ids["old_txt"]])
+        assert await _search(workspace_id, both) == {"old_pdf"}
+        assert await _search(workspace_id, QueryFilters(filename="*.docx")) == set()
+
+    asyncio.run(run())
+
+
+def test_startup_backfill_covers_every_legacy_workspace():
+    async def run():
+        first, _ = await _legacy_workspace()
+        second, _ = await _legacy_workspace()
+        await backfill_all_filter_metadata()
+        async with AsyncSessionLocal() as db:
+            return [(await db.get(Workspace, ws)).filters_backfilled for ws in (first, second)]
+
+    assert asyncio.run(run()) == [True, True]
@@ -0,0 +1,208 @@
+import asyncio
+import httpx
+import pytest
+from app.core.config import settings
+from app.services import rag
+from app.services.llm_admission import AdmissionController, LLMOverloaded, INTERACTIVE, BATCH
+
+
+def _controller(max_in_flight=1, queue_size=8, breaker_failures=3, breaker_cooldown=0.2) -> AdmissionController:
+    return AdmissionController(max_in_flight, queue_size, breaker_failures, breaker_cooldown)
+
+
+async def _hold(controller: AdmissionController, release: asyncio.Event, priority: int = INTERACTIVE):
+    async with controller.slot(priority):
+        await release.wait()
+
+
+async def _settle():
+    for _ in range(5):
+        await asyncio.sleep(0)
+
+
+def test_interactive_waiters_are_served_before_batch(monkeypatch):
+    monkeypatch.setattr(settings, "LLM_QUEUE_DEADLINE_SECONDS", 5)
+
+    async def run():
+        controller = _controller()
+        release = asyncio.Event()
+        order = []
+
+        async def call(name, priority):
+            async with controller.slot(priority):
+                order.append(name)
+
+        holder = asyncio.create_task(_hold(controller, release))
+        await _settle()
+        waiters = [
+            asyncio.create_task(call("batch-1", BATCH)),
+            asyncio.create_task(call("batch-2", BATCH)),
+            asyncio.create_task(call("chat", INTERACTIVE)),
+        ]
+        await _settle()
+        release.set()
+        await asyncio.gather(holder, *waiters)
+        return order
+
+    assert asyncio.run(run()) == ["chat", "batch-1", "batch-2"]
+
+
+def test_full_queue_evicts_lowest_priority_waiter(monkeypatch):
+    monkeypatch.setattr(settings, "LLM_QUEUE_DEADLINE_SECONDS", 5)
+
+    async def run():
+        controller = _controller(queue_size=1)
+        release = asyncio.Event()
+        holder = asyncio.create_task(_hold(controller, release))
+        await _settle()
+
+        batch = asyncio.create_task(_hold(controller, asyncio.Event(), BATCH))
+        await _settle()
+        chat = asyncio.create_task(_hold(controller, release))
+        await _settle()
+        # The batch waiter made room for the interactive one
+        with pytest.raises(LLMOverloaded) as evicted:
+            await batch
+        assert evicted.value.reason == "queue_full"
+
+        # Nothing ranks below a newcomer batch call, so it is shed itself
+        with pytest.raises(LLMOverloaded) as shed:
+            async with controller.slot(BATCH):
+                pass
+        assert shed.value.reason == "queue_full"
+        assert shed.value.headers["Retry-After"] == str(shed.value.retry_after)
+
+        release.set()
+        await asyncio.gather(holder, chat)
+
+    asyncio.run(run())
+
+
+def test_interactive_call_is_shed_when_it_cannot_start_by_its_deadline(monkeypatch):
+    async def run():
+        controller = _controller()
+        release = asyncio.Event()
+        holder = asyncio.create_task(_hold(controller, release))
+        await _settle()
+
+        # Estimated wait (one average generation, 1s initially) exceeds the deadline: rejected up front
+        monkeypatch.setattr(settings, "LLM_QUEUE_DEADLINE_SECONDS", 0.5)
+        with pytest.raises(LLMOverloaded) as upfront:
+            async with controller.slot(INTERACTIVE):
+                pass
+        assert upfront.value.reason == "deadline"
+
+        # Estimate fits, but the slot is not freed in time: shed when the deadline passes
+        controller._avg_generation_s = 0.01
+        monkeypatch.setattr(settings, "LLM_QUEUE_DEADLINE_SECONDS", 0.05)
+        with pytest.raises(LLMOverloaded) as waited:
+            async with controller.slot(INTERACTIVE):
+                pass
+        assert waited.value.reason == "deadline"
+        assert controller._waiters == []
+
+        # Batch calls have no deadline and simply wait
+        batch = asyncio.create_task(_hold(controller, asyncio.Event(), BATCH))
+        await asyncio.sleep(0.1)
+        assert not batch.done()
+        batch.cancel()
+        release.set()
+        await holder
+        await asyncio.gather(batch, return_exceptions=True)
+        assert controller._in_flight == 0
+
+    asyncio.run(run())
+
+
+def test_circuit_breaker_opens_then_half_open_probe_decides(monkeypatch):
+    monkeypatch.setattr(settings, "LLM_QUEUE_DEADLINE_SECONDS", 5)
+
+    async def fail(controller):
+        with pytest.raises(RuntimeError):
+            async with controller.slot():
+                raise RuntimeError("provider down")
+
+    async def run():
+        controller = _controller(max_in_flight=2, breaker_failures=2, breaker_cooldown=0.1)
+        await fail(controller)
+        await fail(controller)
+        with pytest.raises(LLMOverloaded) as opened:
+            async with controller.slot():
+                pass
+        assert opened.value.reason == "circuit_open"
+
+        await asyncio.sleep(0.15)
+        # After the cooldown one probe goes through; others are still rejected while it runs
+        release = asyncio.Event()
+        probe = asyncio.create_task(_hold(controller, release))
+        await _settle()
+        with pytest.raises(LLMOverloaded):
+            async with controller.slot():
+                pass
+        release.set()
+        await probe
+        async with controller.slot():
+            pass  # closed again
+
+        # A failed probe re-opens the circuit straight away
+        await fail(controller)
+        await fail(controller)
+        await asyncio.sleep(0.15)
+        await fail(controller)
+        with pytest.raises(LLMOverloaded):
+            async with controller.slot():
+                pass
+
+    asyncio.run(run())
+
+
+def test_provider_errors_raise_instead_of_answering(monkeypatch):
+    monkeypatch.setattr(rag, "llm_admission", _controller(max_in_flight=2))
+    chunks = [{"text": "t", "filename": "a.txt", "doc_id": "d", "chunk_index": 0, "score": 0.9}]
+
+    async def boom(prompt):
+        raise httpx.HTTPStatusError("500 Server Error", request=None, response=None)
+
+    async def slow(prompt):
+        raise httpx.ReadTimeout("timed out")
+
+    monkeypatch.setattr(rag, "_call_llm", boom)
+    with pytest.raises(rag.LLMError) as failed:
+        asyncio.run(rag.generate_answer("q", chunks))
+    assert failed.value.status_code == 502
+
+    monkeypatch.setattr(rag, "_call_llm", slow)
+    with pytest.raises(rag.LLMError, match="timed out"):
+        asyncio.run(rag.generate_answer("q", chunks))
+    assert rag.llm_admission._failures == 2
+
+
+def test_slot_handed_over_as_the_deadline_fires_is_kept(monkeypatch):
+    monkeypatch.setattr(settings, "LLM_QUEUE_DEADLINE_SECONDS", 5)
+
+    async def wait_then_time_out(future, timeout):
+        # The holder releases in the same iteration the deadline fires
+        await asyncio.wait([future])
+        raise asyncio.TimeoutError
+
+    async def run():
+        controller = _controller()
+        release = asyncio.Event()
+        holder = asyncio.create_task(_hold(controller, release))
+        await _settle()
+
+        monkeypatch.setattr(asyncio, "wait_for", wait_then_time_out)
+        ran = []
+
+        async def call():
+            async with controller.slot():
+                ran.append(True)
+
+        waiter = asyncio.create_task(call())
+        await _settle()
+        release.set()
+        await asyncio.gather(holder, waiter)
+        assert ran == [True]
+        assert controller._in_flight == 0 and controller._waiters == []
+
+    asyncio.run(run())
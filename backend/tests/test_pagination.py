@@ -0,0 +1,86 @@
+import asyncio
+import uuid
+from datetime import datetime, timedelta
+import pytest
+from fastapi import HTTPException, Response
+from app.api.documents import list_documents
+from app.core.config import settings
+from app.core.database import AsyncSessionLocal, Document, User, Workspace, init_db
+from app.core.pagination import NEXT_CURSOR_HEADER, decode_cursor, encode_cursor
+
+
+def test_cursor_round_trip():
+    created_at = datetime(2026, 3, 1, 12, 30, 15, 123456)
+    cursor = encode_cursor(created_at, "row|with|pipes")
+    assert "=" not in cursor
+    assert decode_cursor(cursor) == (created_at, "row|with|pipes")
+
+
+@pytest.mark.parametrize("cursor", ["not base64!", encode_cursor(datetime(2026, 1, 1), "x")[:-4], "bm9waXBl"])
+def test_invalid_cursor_is_rejected(cursor):
+    with pytest.raises(HTTPException) as rejected:
+        decode_cursor(cursor)
+    assert rejected.value.status_code == 400
+
+
+async def _workspace_with_docs(created_at: list[datetime]) -> tuple[User, str, list[str]]:
+    await init_db()
+    async with AsyncSessionLocal() as db:
+        user = User(email=f"{uuid.uuid4()}@example.com", hashed_password="x", total_docs=0)
+        db.add(user)
+        await db.flush()
+        ws = Workspace(user_id=user.id, name="paged")
+        db.add(ws)
+        await db.flush()
+        docs = [
+            Document(workspace_id=ws.id, user_id=user.id, filename=f"f{i}.txt", file_type="txt", created_at=ts)
+            for i, ts in enumerate(created_at)
+        ]
+        db.add_all(docs)
+        await db.commit()
+        return user, ws.id, [d.id for d in docs]
+
+
+async def _list(user: User, workspace_id: str, limit=None, cursor=None) -> tuple[list[str], str]:
+    response = Response()
+    async with AsyncSessionLocal() as db:
+        rows = await list_documents(workspace_id, response, limit, cursor, user, db)
+    return [r["id"] for r in rows], response.headers.get(NEXT_CURSOR_HEADER)
+
+
+def test_pages_break_ties_on_equal_created_at_by_id():
+    async def run():
+        now = datetime(2026, 3, 1, 12, 0, 0)
+        # Five rows share one timestamp, so page boundaries fall inside the tie
+        stamps = [now] * 5 + [now - timedelta(seconds=1), now + timedelta(seconds=1)]
+        user, ws_id, ids = await _workspace_with_docs(stamps)
+        expected = [ids[6]] + sorted(ids[:5], reverse=True) + [ids[5]]
+
+        seen, cursor = [], None
+        while True:
+            page, cursor = await _list(user, ws_id, limit=2, cursor=cursor)
+            assert len(page) <= 2
+            seen += page
+            if cursor is None:
+                break
+        assert seen == expected
+
+    asyncio.run(run())
+
+
+def test_documents_are_unpaginated_without_limit_or_cursor(monkeypatch):
+    monkeypatch.setattr(settings, "DEFAULT_PAGE_SIZE", 3)
+
+    async def run():
+        start = datetime(2026, 3, 1)
+        user, ws_id, ids = await _workspace_with_docs([start + timedelta(minutes=i) for i in range(8)])
+
+        everything, cursor = await _list(user, ws_id)
+        assert everything == ids[::-1] and cursor is None
+
+        # A cursor alone pages with the default size
+        first, cursor = await _list(user, ws_id, limit=2)
+        rest, next_cursor = await _list(user, ws_id, cursor=cursor)
+        assert first == ids[:-3:-1] and rest == ids[-3:-6:-1] and next_cursor is not None
+
+    asyncio.run(run())
@@ -0,0 +1,150 @@
+import asyncio
+import uuid
+import pytest
+from app.services import singleflight
+from app.services import vector_store as vs
+from app.services.llm_admission import LLMOverloaded
+from app.services.singleflight import flight_key, join, run_coalesced
+
+RESULT = {"answer": "shared answer", "sources": [{"filename": "a.txt"}], "queue_ms": 1.0, "generation_ms": 2.0}
+
+
+@pytest.fixture(autouse=True)
+def _no_leftover_flights():
+    yield
+    singleflight._flights.clear()
+
+
+async def _drain(queue: asyncio.Queue) -> list[dict]:
+    events = []
+    while True:
+        event = await queue.get()
+        events.append(event)
+        if event["type"] in ("done", "error"):
+            return events
+
+
+def test_identical_concurrent_queries_share_one_execution():
+    calls = []
+
+    async def execute(flight):
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        return RESULT
+
+    async def run():
+        key = flight_key("ws-sf-1", "What is  the Term?", 5, None)
+        results = await asyncio.gather(*(run_coalesced(key, execute) for _ in range(5)))
+        # Normalized text matches; a different n_results does not
+        same = flight_key("ws-sf-1", "what is the term?", 5, None)
+        other = flight_key("ws-sf-1", "what is the term?", 3, None)
+        return results, same == key, other == key, singleflight._flights
+
+    results, same, other, flights = asyncio.run(run())
+    assert calls == [1]
+    assert [coalesced for _, coalesced in results] == [False, True, True, True, True]
+    assert all(result is RESULT for result, _ in results)
+    assert same and not other
+    assert flights == {}  # forgotten once finished
+
+
+def test_late_streaming_subscriber_gets_a_replay():
+    async def execute(flight):
+        flight.publish({"type": "sources", "sources": []})
+        for text in ("one ", "two ", "three"):
+            flight.publish({"type": "token", "text": text})
+            await asyncio.sleep(0.01)
+        return {**RESULT, "answer": "one two three"}
+
+    async def run():
+        key = flight_key("ws-sf-2", "q", 5, None)
+        leader, joined = join(key, execute, stream=True)
+        early = leader.subscribe()
+        await asyncio.sleep(0.015)  # some tokens already sent
+        follower, coalesced = join(key, execute, stream=True)
+        late = follower.subscribe()
+        return follower is leader, joined, coalesced, await _drain(early), await _drain(late)
+
+    same, joined, coalesced, early, late = asyncio.run(run())
+    assert same and not joined and coalesced
+    assert late == early
+    assert [e["type"] for e in late] == ["sources", "token", "token", "token", "done"]
+    assert "".join(e["text"] for e in late if e["type"] == "token") == "one two three"
+    assert late[-1]["answer"] == "one two three"
+
+
+def test_non_streamed_answer_is_published_as_one_token():
+    async def execute(flight):
+        return RESULT
+
+    async def run():
+        flight, _ = join(flight_key("ws-sf-3", "q", 5, None), execute, stream=True)
+        return await _drain(flight.subscribe())
+
+    events = asyncio.run(run())
+    assert [e["type"] for e in events] == ["token", "done"]
+    assert events[0]["text"] == "shared answer"
+
+
+def test_leader_failure_reaches_every_follower():
+    async def execute(flight):
+        await asyncio.sleep(0.02)
+        raise LLMOverloaded("circuit_open", 7)
+
+    async def run():
+        key = flight_key("ws-sf-4", "q", 5, None)
+        flight, _ = join(key, execute, stream=True)
+        queue = flight.subscribe()
+        results = await asyncio.gather(
+            run_coalesced(key, execute), run_coalesced(key, execute), return_exceptions=True
+        )
+        return results, await _drain(queue)
+
+    results, events = asyncio.run(run())
+    assert all(isinstance(r, LLMOverloaded) for r in results)
+    assert events[-1]["type"] == "error"
+    assert events[-1]["retry_after"] == 7
+    assert "circuit_open" in events[-1]["detail"]
+
+
+def test_ingest_mid_flight_starts_a_new_execution(add_chunks):
+    workspace_id = str(uuid.uuid4())
+    add_chunks(workspace_id, 3)
+    calls = []
+
+    async def execute(flight):
+        version = vs.get_corpus_version(workspace_id)
+        calls.append(version)
+        await asyncio.sleep(0.05)
+        return {**RESULT, "answer": f"version {version}"}
+
+    async def run():
+        first = asyncio.create_task(run_coalesced(flight_key(workspace_id, "q", 5, None), execute))
+        await asyncio.sleep(0.01)
+        # An upload lands while the first execution is running
+        await asyncio.to_thread(add_chunks, workspace_id, 2, None, 16, 1)
+        second = await run_coalesced(flight_key(workspace_id, "q", 5, None), execute)
+        return await first, second
+
+    (first, first_coalesced), (second, second_coalesced) = asyncio.run(run())
+    assert len(calls) == 2 and calls[0] != calls[1]
+    assert not first_coalesced and not second_coalesced
+    assert first["answer"] != second["answer"]
+
+
+def test_disabled_single_flight_runs_every_query(monkeypatch):
+    monkeypatch.setattr(singleflight.settings, "SINGLE_FLIGHT_ENABLED", False)
+    calls = []
+
+    async def execute(flight):
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return RESULT
+
+    async def run():
+        key = flight_key("ws-sf-5", "q", 5, None)
+        return await asyncio.gather(*(run_coalesced(key, execute) for _ in range(3)))
+
+    results = asyncio.run(run())
+    assert len(calls) == 3
+    assert not any(coalesced for _, coalesced in results)
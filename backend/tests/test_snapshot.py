@@ -0,0 +1,221 @@
+import asyncio
+import gzip
+import json
+import uuid
+import numpy as np
+import pytest
+from fastapi import HTTPException
+from sqlalchemy import select
+from app.core.config import settings
+from app.core.database import AsyncSessionLocal, Document, User, Workspace, init_db
+from app.services import snapshot
+from app.services import vector_store as vs
+from app.services.snapshot import SnapshotReader, export_snapshot, import_snapshot
+from app.services.vector_gc import run_gc
+
+DIM = 16
+
+
+def _line(record: dict) -> bytes:
+    return json.dumps(record).encode() + b"\n"
+
+
+def _manifest(**overrides) -> dict:
+    return {
+        "type": "manifest", "format": 1, "embedding_model": settings.EMBEDDING_MODEL,
+        "dim": DIM, "workspace": {"name": "w"}, **overrides,
+    }
+
+
+def _chunks(doc_id: str, n: int) -> bytes:
+    header = _line({
+        "type": "chunks", "count": n, "doc_ids": [doc_id] * n,
+        "chunk_index": list(range(n)), "texts": [f"chunk {i}" for i in range(n)],
+    })
+    return header + np.ones((n, DIM), dtype="<f4").tobytes()
+
+
+def _read(archive: bytes, max_bytes: int = 1 << 30, step: int = 0) -> list[dict]:
+    reader = SnapshotReader(max_bytes)
+    step = step or len(archive)
+    records = []
+    for i in range(0, len(archive), step):
+        records.extend(reader.feed(archive[i:i + step]))
+    reader.finish()
+    return records
+
+
+def test_reader_parses_records_fed_in_small_pieces():
+    archive = gzip.compress(
+        _line(_manifest()) + _line({"type": "document", "id": "d1"}) + _chunks("d1", 3)
+        + _line({"type": "end", "documents": 1, "chunks": 3})
+    )
+    records = _read(archive, step=7)
+    assert [r["type"] for r in records] == ["manifest", "document", "chunks", "end"]
+    assert records[2]["embeddings"].shape == (3, DIM)
+
+
+def test_reader_rejects_truncated_archive():
+    archive = gzip.compress(_line(_manifest()) + _chunks("d1", 50))
+    with pytest.raises(HTTPException, match="truncated"):
+        _read(archive[:len(archive) // 2])
+
+
+def test_reader_rejects_bad_dimension():
+    with pytest.raises(HTTPException, match="dimension"):
+        _read(gzip.compress(_line(_manifest(dim=-1))))
+    with pytest.raises(HTTPException, match="inconsistent"):
+        _read(gzip.compress(_line(_manifest(dim=0)) + _chunks("d1", 2)))
+
+
+def test_reader_rejects_oversized_archive():
+    archive = gzip.compress(_line(_manifest()) + _chunks("d1", 100))
+    with pytest.raises(HTTPException, match="too large"):
+        _read(archive, max_bytes=1024)
+
+
+def test_reader_rejects_non_gzip_input():
+    with pytest.raises(HTTPException, match="gzip"):
+        _read(b"not an archive")
+
+
+async def _stream(data: bytes, step: int = 4096, between=None):
+    for i in range(0, len(data), step):
+        yield data[i:i + step]
+        if between is not None:
+            await between()
+
+
+async def _user(db) -> User:
+    user = User(email=f"{uuid.uuid4()}@example.com", hashed_password="x", total_docs=0)
+    db.add(user)
+    await db.commit()
+    return user
+
+
+async def _source_workspace(add_chunks) -> tuple[str, str, list]:
+    await init_db()
+    async with AsyncSessionLocal() as db:
+        user = await _user(db)
+        ws = Workspace(user_id=user.id, name="source", hnsw_m=24)
+        db.add(ws)
+        await db.flush()
+        docs = [
+            Document(workspace_id=ws.id, user_id=user.id, filename=f"f{i}.txt", file_type="txt",
+                     status="ready", chunk_count=30)
+            for i in range(2)
+        ]
+        db.add_all(docs)
+        await db.commit()
+    embeddings = []
+    for i, doc in enumerate(docs):
+        embeddings += await asyncio.to_thread(add_chunks, ws.id, 30, doc.id, DIM, i)
+    return ws.id, user.id, embeddings
+
+
+async def _export(workspace_id: str) -> bytes:
+    async with AsyncSessionLocal() as db:
+        ws = await db.get(Workspace, workspace_id)
+        docs = (await db.execute(select(Document).where(Document.workspace_id == workspace_id))).scalars().all()
+    return b"".join([block async for block in export_snapshot(ws, list(docs))])
+
+
+def test_export_import_round_trip(add_chunks):
+    async def run():
+        source_id, user_id, embeddings = await _source_workspace(add_chunks)
+        archive = await _export(source_id)
+        async with AsyncSessionLocal() as db:
+            user = await db.get(User, user_id)
+            ws, doc_count, chunk_count = await import_snapshot(_stream(archive), user, db, name="clone")
+            assert (doc_count, chunk_count) == (2, 60)
+            assert ws.status is None and ws.name == "clone" and ws.hnsw_m == 24
+            docs = (await db.execute(select(Document).where(Document.workspace_id == ws.id))).scalars().all()
+            assert {d.status for d in docs} == {"ready"}
+            assert user.total_docs == 2
+        return source_id, ws.id, embeddings
+
+    source_id, clone_id, embeddings = asyncio.run(run())
+    assert vs.get_workspace_doc_count(clone_id) == 60
+    for query in embeddings[::10]:
+        original = vs.search_embedding(source_id, query, 5)
+        cloned = vs.search_embedding(clone_id, query, 5)
+        assert [(h["text"], h["score"]) for h in original] == [(h["text"], h["score"]) for h in cloned]
+        assert {h["doc_id"] for h in cloned}.isdisjoint({h["doc_id"] for h in original})
+
+
+def test_import_survives_gc_running_mid_import(add_chunks, monkeypatch):
+    monkeypatch.setattr(vs, "REBUILD_BATCH_SIZE", 10)  # export several chunk batches
+
+    async def run():
+        source_id, user_id, _ = await _source_workspace(add_chunks)
+        archive = await _export(source_id)
+
+        async def gc():
+            await run_gc(compact=False)
+
+        async with AsyncSessionLocal() as db:
+            user = await db.get(User, user_id)
+            ws, _, chunk_count = await import_snapshot(_stream(archive, step=512, between=gc), user, db)
+        return ws.id, chunk_count
+
+    clone_id, chunk_count = asyncio.run(run())
+    assert chunk_count == 60
+    assert vs.stored_chunk_count(clone_id) == 60
+
+
+def test_failed_import_leaves_nothing_behind(add_chunks):
+    async def run():
+        source_id, user_id, _ = await _source_workspace(add_chunks)
+        archive = await _export(source_id)
+        before = set(vs.list_collection_names())
+        async with AsyncSessionLocal() as db:
+            user = await db.get(User, user_id)
+            with pytest.raises(HTTPException, match="truncated"):
+                await import_snapshot(_stream(archive[:-40]), user, db)
+            importing = (await db.execute(select(Workspace).where(Workspace.status.is_not(None)))).scalars().all()
+            assert importing == []
+        assert set(vs.list_collection_names()) == before
+
+    asyncio.run(run())
+
+
+def test_import_rejects_other_embedding_model():
+    async def run():
+        await init_db()
+        archive = gzip.compress(_line(_manifest(embedding_model="other-model")))
+        async with AsyncSessionLocal() as db:
+            user = await _user(db)
+            with pytest.raises(HTTPException, match="other-model"):
+                await import_snapshot(_stream(archive), user, db)
+            owned = (await db.execute(select(Workspace).where(Workspace.user_id == user.id))).scalars().all()
+            assert owned == []
+
+    asyncio.run(run())
+
+
+def test_reader_stops_decompressing_at_the_size_limit(monkeypatch):
+    monkeypatch.setattr(snapshot, "_DECOMPRESS_STEP", 64 * 1024)
+    bomb = gzip.compress(_line(_manifest()) + b" " * (64 * 1024 * 1024))
+    assert len(bomb) < 128 * 1024
+
+    reader = SnapshotReader(1024 * 1024)
+    with pytest.raises(HTTPException, match="too large"):
+        reader.feed(bomb)
+    # Never expanded past the limit before rejecting
+    assert reader.size <= 1024 * 1024 + 1
+
+
+def test_iter_chunks_does_not_skip_when_chunks_are_deleted_mid_export(add_chunks):
+    workspace_id = str(uuid.uuid4())
+    doc_id = str(uuid.uuid4())
+    add_chunks(workspace_id, 80, doc_id=doc_id)
+
+    seen = []
+    for batch in vs.iter_chunks(workspace_id, include=[], batch_size=10):
+        if not seen:
+            # A concurrent delete of chunks already exported
+            vs.delete_chunk_ids(workspace_id, batch["ids"])
+        seen += batch["ids"]
+
+    assert sorted(seen) == sorted(vs.chunk_id(doc_id, i) for i in range(80))
+    vs.drop_collection(workspace_id)
@@ -0,0 +1,64 @@
+import json
+import logging
+import time
+import pytest
+from app.core import tracing
+from app.core.tracing import current_trace, query_attrs, span, trace
+
+
+def test_spans_nest_inside_the_active_trace():
+    with trace("chat", workspace_id="ws-1") as t:
+        with span("retrieve"):
+            with span("embed_query"):
+                time.sleep(0.01)
+            with span("vector_search"):
+                time.sleep(0.01)
+        with pytest.raises(ValueError):
+            with span("llm_generate"):
+                raise ValueError("boom")
+        with span("vector_search"):
+            pass
+    assert current_trace() is None
+
+    stages = t.stages
+    assert set(stages) == {"retrieve", "embed_query", "vector_search", "llm_generate"}
+    # The outer span covers both inner ones; repeated stages accumulate
+    assert stages["retrieve"] >= stages["embed_query"] + stages["vector_search"] - 1
+    assert stages["embed_query"] >= 10
+    assert t.duration_ms >= stages["retrieve"]
+
+
+def test_inner_trace_restores_the_outer_one():
+    with trace("outer") as outer:
+        with trace("inner") as inner:
+            with span("a"):
+                pass
+        assert current_trace() is outer
+        with span("b"):
+            pass
+    assert set(inner.stages) == {"a"}
+    assert set(outer.stages) == {"b"}
+
+
+def test_slow_trace_logs_its_stage_breakdown(monkeypatch, caplog):
+    monkeypatch.setattr(tracing.settings, "SLOW_QUERY_MS", 5)
+    with caplog.at_level(logging.WARNING, logger="app.slow_query"):
+        with trace("chat", workspace_id="ws-1", **query_attrs("secret question")):
+            with span("llm_generate"):
+                time.sleep(0.01)
+        with trace("fast"):
+            pass
+
+    [record] = caplog.records
+    message = record.getMessage()
+    assert message.startswith("Slow chat: ")
+    details = json.loads(message.split(" ", 3)[3])
+    assert details["workspace_id"] == "ws-1"
+    assert set(details["stages_ms"]) == {"llm_generate"}
+    assert "query" not in details and "secret" not in message
+
+
+def test_query_text_is_logged_only_when_opted_in(monkeypatch):
+    assert query_attrs("what is the term?") == {}
+    monkeypatch.setattr(tracing.settings, "SLOW_QUERY_LOG_TEXT", True)
+    assert query_attrs("x" * 300) == {"query": "x" * 200}
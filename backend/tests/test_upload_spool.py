@@ -0,0 +1,154 @@
+import asyncio
+import hashlib
+from pathlib import Path
+import pytest
+from fastapi import HTTPException
+from app.api import documents
+from app.core.database import AsyncSessionLocal, Document, Workspace, init_db
+from app.services import upload_spool
+from app.services.upload_spool import SPOOL_SUFFIX, spool_upload
+
+BOUNDARY = "test-boundary"
+
+
+class _Request:
+    """Just enough of a Starlette Request: headers plus a chunked body stream."""
+
+    def __init__(self, body: bytes, chunk_size: int = 64 * 1024, content_length: bool = False):
+        self.headers = {"content-type": f"multipart/form-data; boundary={BOUNDARY}"}
+        if content_length:
+            self.headers["content-length"] = str(len(body))
+        self.chunks = [body[i:i + chunk_size] for i in range(0, len(body), chunk_size)]
+        self.sent = 0
+
+    async def stream(self):
+        for chunk in self.chunks:
+            self.sent += 1
+            yield chunk
+
+
+def _multipart(filename: str, data: bytes, field: str = "file") -> bytes:
+    head = (
+        f"--{BOUNDARY}\r\n"
+        f'Content-Disposition: form-data; name="{field}"; filename="{filename}"\r\n'
+        "Content-Type: application/octet-stream\r\n\r\n"
+    ).encode()
+    return head + data + f"\r\n--{BOUNDARY}--\r\n".encode()
+
+
+def _spool_files() -> list[Path]:
+    return sorted(Path(upload_spool.settings.UPLOAD_SPOOL_DIR).glob(f"*{SPOOL_SUFFIX}"))
+
+
+@pytest.fixture(autouse=True)
+def _empty_spool():
+    for path in _spool_files():
+        path.unlink()
+    yield
+
+
+def test_upload_is_spooled_with_size_and_hash():
+    data = bytes(range(256)) * 5000
+    upload = asyncio.run(spool_upload(_Request(_multipart("report.PDF", data)), allowed_extensions=["pdf"]))
+
+    assert upload.filename == "report.PDF"
+    assert upload.size == len(data)
+    assert upload.sha256 == hashlib.sha256(data).hexdigest()
+    assert upload.path.read_bytes() == data
+    assert _spool_files() == [upload.path]
+
+
+def test_oversized_upload_is_cut_off_mid_stream(monkeypatch):
+    monkeypatch.setattr(upload_spool.settings, "MAX_FILE_SIZE_MB", 1)
+    # No Content-Length, so only the streamed byte count can stop it
+    request = _Request(_multipart("big.txt", b"x" * (4 * 1024 * 1024)))
+
+    with pytest.raises(HTTPException) as exc:
+        asyncio.run(spool_upload(request))
+
+    assert exc.value.status_code == 400
+    assert "too large" in exc.value.detail
+    assert request.sent < len(request.chunks) / 2
+    assert _spool_files() == []
+
+
+def test_oversized_content_length_is_rejected_up_front(monkeypatch):
+    monkeypatch.setattr(upload_spool.settings, "MAX_FILE_SIZE_MB", 1)
+    request = _Request(_multipart("big.txt", b"x" * (2 * 1024 * 1024)), content_length=True)
+
+    with pytest.raises(HTTPException):
+        asyncio.run(spool_upload(request))
+    assert request.sent == 0
+
+
+def test_disallowed_extension_is_rejected_before_file_data():
+    # The part headers arrive in the first chunk, the file data after it
+    request = _Request(_multipart("script.exe", b"x" * (256 * 1024)), chunk_size=200)
+
+    with pytest.raises(HTTPException) as exc:
+        asyncio.run(spool_upload(request, allowed_extensions=["pdf", "txt"]))
+
+    assert exc.value.status_code == 400
+    assert ".exe not allowed" in exc.value.detail
+    assert request.sent == 1
+    assert _spool_files() == []
+
+
+def test_upload_without_the_file_field_is_rejected():
+    with pytest.raises(HTTPException) as exc:
+        asyncio.run(spool_upload(_Request(_multipart("a.txt", b"hello", field="other"))))
+    assert "No 'file' file" in exc.value.detail
+    assert _spool_files() == []
+
+
+async def _spooled_document() -> tuple[str, str, Path]:
+    await init_db()
+    upload = await spool_upload(_Request(_multipart("notes.txt", b"some notes")))
+    async with AsyncSessionLocal() as db:
+        ws = Workspace(user_id="u1", name="spool")
+        db.add(ws)
+        await db.flush()
+        doc = Document(workspace_id=ws.id, user_id="u1", filename=upload.filename, file_type="txt",
+                       status="processing")
+        db.add(doc)
+        await db.commit()
+        return ws.id, doc.id, upload.path
+
+
+async def _status(doc_id: str) -> tuple[str, str]:
+    async with AsyncSessionLocal() as db:
+        doc = await db.get(Document, doc_id)
+        return doc.status, doc.error_message
+
+
+def test_processing_removes_the_spool_file_on_success(monkeypatch):
+    seen = []
+    monkeypatch.setattr(documents, "process_document", lambda path, file_type: seen.append(path.read_bytes()) or ["c"])
+    monkeypatch.setattr(documents, "add_documents", lambda *args, **kwargs: None)
+
+    async def run():
+        workspace_id, doc_id, path = await _spooled_document()
+        await documents._process_and_embed(doc_id, path, "txt", workspace_id, "notes.txt")
+        return path, await _status(doc_id)
+
+    path, (status, _) = asyncio.run(run())
+    assert seen == [b"some notes"]
+    assert status == "ready"
+    assert not path.exists()
+
+
+def test_processing_removes_the_spool_file_on_failure(monkeypatch):
+    def fail(path, file_type):
+        raise ValueError("unreadable document")
+
+    monkeypatch.setattr(documents, "process_document", fail)
+
+    async def run():
+        workspace_id, doc_id, path = await _spooled_document()
+        await documents._process_and_embed(doc_id, path, "txt", workspace_id, "notes.txt")
+        return path, await _status(doc_id)
+
+    path, (status, error) = asyncio.run(run())
+    assert status == "error"
+    assert error == "unreadable document"
+    assert not path.exists()
@@ -0,0 +1,110 @@
+import asyncio
+import sqlite3
+import uuid
+from app.api import workspaces
+from app.core.config import settings
+from app.core.database import AsyncSessionLocal, Document, Workspace, init_db
+from app.services import vector_store as vs
+from app.services.vector_gc import run_gc
+
+
+async def _create_workspace(doc_id: str) -> str:
+    await init_db()
+    async with AsyncSessionLocal() as db:
+        ws = Workspace(user_id="u1", name="w")
+        db.add(ws)
+        await db.flush()
+        db.add(Document(
+            id=doc_id, workspace_id=ws.id, user_id="u1",
+            filename="a.txt", file_type="txt", status="ready",
+        ))
+        await db.commit()
+        return ws.id
+
+
+def _setup(add_chunks, n: int = 40) -> str:
+    doc_id = str(uuid.uuid4())
+    workspace_id = asyncio.run(_create_workspace(doc_id))
+    add_chunks(workspace_id, n, doc_id=doc_id)
+    return workspace_id
+
+
+def test_gc_restores_collection_from_interrupted_rebuild(add_chunks):
+    workspace_id = _setup(add_chunks)
+    client = vs.get_chroma_client()
+    # A rebuild that died after retiring the live collection and before renaming its copy
+    client.get_collection(vs._collection_name(workspace_id)).modify(name=vs.rebuild_name(workspace_id))
+    client.create_collection(vs.retired_name(workspace_id))
+    vs.evict_collection(workspace_id)
+
+    report = asyncio.run(run_gc(compact=False))
+
+    assert report["restored_collections"] == [vs.rebuild_name(workspace_id)]
+    assert report["dropped_collections"] == [vs.retired_name(workspace_id)]
+    names = vs.list_collection_names()
+    assert vs._collection_name(workspace_id) in names
+    assert vs.rebuild_name(workspace_id) not in names
+    assert vs.retired_name(workspace_id) not in names
+    assert vs.get_workspace_doc_count(workspace_id) == 40
+
+
+def test_gc_drops_leftover_rebuild_when_collection_exists(add_chunks):
+    workspace_id = _setup(add_chunks)
+    vs.get_chroma_client().create_collection(vs.rebuild_name(workspace_id))
+
+    report = asyncio.run(run_gc(compact=False))
+
+    assert vs.rebuild_name(workspace_id) in report["dropped_collections"]
+    assert report["restored_collections"] == []
+    assert vs.get_workspace_doc_count(workspace_id) == 40
+
+
+def test_gc_dry_run_restores_nothing(add_chunks):
+    workspace_id = _setup(add_chunks)
+    vs.get_chroma_client().get_collection(vs._collection_name(workspace_id)).modify(
+        name=vs.rebuild_name(workspace_id)
+    )
+    vs.evict_collection(workspace_id)
+
+    report = asyncio.run(run_gc(compact=False, dry_run=True))
+
+    assert report["restored_collections"] == [vs.rebuild_name(workspace_id)]
+    assert vs._collection_name(workspace_id) not in vs.list_collection_names()
+    asyncio.run(run_gc(compact=False))
+    assert vs.get_workspace_doc_count(workspace_id) == 40
+
+
+def test_single_scan_pass_reports_legacy_chunks(add_chunks):
+    workspace_id = _setup(add_chunks, n=5)
+    vs.add_embeddings(workspace_id, ["legacy_chunk_0"], [[0.5] * 16], ["old"], [{"doc_id": "old", "chunk_index": 0}])
+
+    docs, legacy = vs.chunk_ids_by_doc(workspace_id, missing_key="file_type")
+
+    assert sum(len(ids) for ids in docs.values()) == 6
+    assert legacy == {"old": ["legacy_chunk_0"]}
+
+
+def test_rebuild_keeps_deletes_counted_while_it_ran(add_chunks, monkeypatch):
+    workspace_id = _setup(add_chunks)
+    db_path = settings.DATABASE_URL.split(":///", 1)[1]
+
+    async def tombstones(value=None):
+        async with AsyncSessionLocal() as db:
+            ws = await db.get(Workspace, workspace_id)
+            if value is not None:
+                ws.deleted_chunks = value
+                await db.commit()
+            return ws.deleted_chunks
+
+    def rebuild_with_concurrent_delete(ws_id, metadata):
+        conn = sqlite3.connect(db_path)
+        with conn:
+            conn.execute("UPDATE workspaces SET deleted_chunks = deleted_chunks + 3 WHERE id = ?", (ws_id,))
+        conn.close()
+        return 0
+
+    monkeypatch.setattr(workspaces, "rebuild_collection", rebuild_with_concurrent_delete)
+    asyncio.run(tombstones(10))
+    asyncio.run(workspaces._rebuild_index(workspace_id))
+
+    assert asyncio.run(tombstones()) == 3
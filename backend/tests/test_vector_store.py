@@ -0,0 +1,82 @@
+import threading
+import time
+import uuid
+from chromadb.api.models.Collection import Collection
+from app.services import vector_store as vs
+
+
+def test_rebuild_keeps_vectors_and_swaps_in_new_params(add_chunks):
+    workspace_id = str(uuid.uuid4())
+    embeddings = add_chunks(workspace_id, 250)
+    before = vs.search_embedding(workspace_id, embeddings[0], 5)
+
+    assert vs.rebuild_collection(workspace_id, vs.hnsw_metadata(m=32)) == 250
+
+    names = vs.list_collection_names()
+    assert vs.rebuild_name(workspace_id) not in names
+    assert vs.retired_name(workspace_id) not in names
+    collection = vs.get_chroma_client().get_collection(vs._collection_name(workspace_id))
+    assert collection.metadata["hnsw:M"] == 32
+    assert collection.count() == 250
+    assert vs.get_workspace_doc_count(workspace_id) == 250
+    after = vs.search_embedding(workspace_id, embeddings[0], 5)
+    assert after[0]["text"] == before[0]["text"] == "chunk 0"
+
+
+def test_rebuild_does_not_block_other_workspaces(monkeypatch, add_chunks):
+    slow, other = str(uuid.uuid4()), str(uuid.uuid4())
+    add_chunks(slow, 50)
+    add_chunks(other, 10)
+
+    copying = threading.Event()
+    original_get = Collection.get
+
+    def slow_get(self, *args, **kwargs):
+        if self.name == vs._collection_name(slow):
+            copying.set()
+            time.sleep(0.5)
+        return original_get(self, *args, **kwargs)
+
+    monkeypatch.setattr(Collection, "get", slow_get)
+    vs.evict_collection(other)
+    rebuild = threading.Thread(target=vs.rebuild_collection, args=(slow, vs.hnsw_metadata()))
+    rebuild.start()
+    assert copying.wait(5)
+
+    start = time.perf_counter()
+    assert vs.get_workspace_doc_count(other) == 10
+    assert time.perf_counter() - start < 0.25
+    rebuild.join()
+    assert vs.get_workspace_doc_count(slow) == 50
+
+
+def test_deleting_already_removed_ids_keeps_the_count(add_chunks):
+    workspace_id = str(uuid.uuid4())
+    doc_id = str(uuid.uuid4())
+    embeddings = add_chunks(workspace_id, 10, doc_id=doc_id)
+    ids = [vs.chunk_id(doc_id, i) for i in range(10)]
+    assert vs.delete_chunk_ids(workspace_id, ids[:4]) == 4
+
+    # A stale list that partly overlaps what is already gone
+    assert vs.delete_chunk_ids(workspace_id, ids[:6]) == 2
+    assert vs.delete_chunk_ids(workspace_id, ids[:6]) == 0
+
+    assert vs.get_workspace_doc_count(workspace_id) == 4
+    assert len(vs.search_embedding(workspace_id, embeddings[9], 10)) == 4
+
+
+def test_rebuild_renames_outside_the_cache_lock(monkeypatch, add_chunks):
+    workspace_id = str(uuid.uuid4())
+    embeddings = add_chunks(workspace_id, 20)
+    held = []
+    original_modify = Collection.modify
+
+    def modify(self, *args, **kwargs):
+        held.append(vs._cache_lock._is_owned())
+        return original_modify(self, *args, **kwargs)
+
+    monkeypatch.setattr(Collection, "modify", modify)
+    vs.rebuild_collection(workspace_id, vs.hnsw_metadata(m=24))
+
+    assert held == [False, False]
+    assert len(vs.search_embedding(workspace_id, embeddings[0], 5)) == 5